@@ -0,0 +1,1919 @@
+# arquivo: backend.py
+# Camada de serviço do sistema: banco de dados e regras de negócio, SEM
+# interface gráfica. Não importa tkinter, então pode ser usada em scripts,
+# importações em lote, testes de carga ou num servidor.
+# As funções devolvem resultados ou levantam exceções (ServiceError e filhas);
+# quem chama (a janela em crud.py, um script...) decide como avisar o usuário.
+
+# --- IMPORTAÇÕES ---
+# Importa bibliotecas essenciais:
+# os: para lidar com caminhos de arquivos e sistema operacional.
+# sys/argparse: para os comandos de manutenção pela linha de comando.
+# sqlite3: para o banco de dados local.
+# hashlib: para criptografar as senhas (segurança).
+# json: para mandar listas de itens ao SQLite numa consulta só (json_each).
+# re: para ajustar o CREATE TABLE guardado ao trocar o padrão de uma coluna.
+# math: para arredondar igual ao SQLite ao refazer o custo médio.
+# threading/time/contextlib: para reaproveitar conexões por thread e controlar transações.
+# datetime/decimal: para lidar com datas e cálculos monetários precisos.
+import os
+import sys
+import argparse
+import sqlite3
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# --- CONFIGURAÇÃO DO BANCO DE DADOS ---
+# Define onde o arquivo do banco de dados (bravus.db) será salvo.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Outro arquivo pode ser usado pela variável de ambiente BRAVUS_DB (ex.: um banco de teste).
+DB_PATH = os.environ.get("BRAVUS_DB", os.path.join(BASE_DIR, "bravus.db"))
+# As datas ficam no banco como INTEGER (segundos desde 1970, "epoch"), o que
+# deixa os filtros por período em comparações de inteiros sobre os índices.
+# DATA_FMT é o formato de exibição (e o das datas antigas, gravadas como texto).
+DATA_FMT = "%Y-%m-%d %H:%M:%S"
+_AGORA_EPOCH_SQL = "CAST(strftime('%s','now') AS INTEGER)"
+
+# --- DINHEIRO EM CENTAVOS ---
+# Valores em dinheiro são guardados como INTEGER em centavos (R$ 12,50 -> 1250),
+# então as somas são exatas e o SQLite soma inteiros. O custo médio dos insumos
+# precisa de mais casas (ex.: R$ 0,0325 por grama) e fica em milionésimos de real.
+CUSTO_ESCALA = 1_000_000
+MICROS_POR_CENTAVO = CUSTO_ESCALA // 100
+
+# Tipo dinheiro: um int em centavos que sabe ler o que o usuário digita.
+class Centavos(int):
+    # Aceita "12,50", "1.234,56", "R$ 9,90", Decimal, int ou float (em reais).
+    @classmethod
+    def de_reais(cls, valor):
+        if isinstance(valor, str):
+            txt = valor.replace("R$", "").strip()
+            if "," in txt:
+                txt = txt.replace(".", "").replace(",", ".")
+            valor = txt
+        try:
+            reais = Decimal(str(valor))
+        except InvalidOperation:
+            raise ValueError(f"Valor monetário inválido: {valor!r}")
+        if not reais.is_finite():
+            raise ValueError(f"Valor monetário inválido: {valor!r}")
+        return cls((reais * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+    # Texto para campos de edição, sem "R$" nem separador de milhar: "1234,56".
+    def em_texto(self):
+        sinal = "-" if self < 0 else ""
+        reais, cent = divmod(abs(int(self)), 100)
+        return f"{sinal}{reais},{cent:02d}"
+
+# Aplica uma fração (ex.: taxa de 0,12) a um valor em centavos, arredondando.
+def aplicar_fracao(centavos, fracao):
+    return int((Decimal(int(centavos)) * Decimal(str(fracao))).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+# Custo médio (milionésimos de real) -> centavos, para exibir e somar.
+def custo_para_centavos(custo):
+    return (int(custo or 0) + MICROS_POR_CENTAVO // 2) // MICROS_POR_CENTAVO
+
+# Reais (ex.: o vProd de uma NF-e dividido pela quantidade) -> milionésimos de real.
+def custo_de_reais(valor):
+    return int((Decimal(str(valor)) * CUSTO_ESCALA).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+# --- PERFIS DE PRAGMA ---
+# Ajustes do SQLite aplicados ao abrir cada conexão.
+# WAL permite que um relatório longo leia enquanto o caixa grava, e o busy_timeout
+# faz um segundo terminal esperar pelo lock em vez de falhar na hora.
+# "pos": caixa do dia a dia (escritas curtas e frequentes).
+# "reporting": leituras longas de relatório (mais cache e mmap, espera maior).
+PRAGMA_PROFILES = {
+    "pos": {
+        "busy_timeout": 5000,           # ms
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",        # seguro com WAL; FULL se a máquina desliga sem aviso
+        "cache_size": -8000,            # negativo = KiB (~8 MB)
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "reporting": {
+        "busy_timeout": 15000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,           # ~64 MB
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+# Perfil padrão; pode ser trocado pela variável de ambiente BRAVUS_PRAGMA_PROFILE.
+PRAGMA_PROFILE = os.environ.get("BRAVUS_PRAGMA_PROFILE", "pos")
+
+# Monta o perfil final: aceita o nome de um preset ou um dicionário próprio,
+# e 'overrides' troca valores individuais (ex.: synchronous="FULL").
+def resolve_pragmas(profile=None, **overrides):
+    if profile is None:
+        profile = PRAGMA_PROFILE
+    if isinstance(profile, str):
+        if profile not in PRAGMA_PROFILES:
+            raise ValueError(f"Perfil de PRAGMA desconhecido: {profile}")
+        profile = PRAGMA_PROFILES[profile]
+    pragmas = dict(profile)
+    pragmas.update(overrides)
+    return pragmas
+
+# Aplica o perfil na conexão. busy_timeout vem primeiro para que a troca do
+# journal_mode também espere caso outro terminal esteja usando o banco.
+def apply_pragmas(conn, pragmas):
+    conn.execute("PRAGMA foreign_keys = ON;")
+    if "busy_timeout" in pragmas:
+        conn.execute(f"PRAGMA busy_timeout = {int(pragmas['busy_timeout'])};")
+    for nome, valor in pragmas.items():
+        if nome == "busy_timeout":
+            continue
+        conn.execute(f"PRAGMA {nome} = {valor};")
+
+# --- FUNÇÕES DE BANCO DE DADOS (BACKEND) ---
+
+# Gerenciador de conexões: mantém UMA conexão aberta por thread e a reaproveita
+# em todas as chamadas, em vez de abrir e fechar o arquivo a cada operação.
+# Os PRAGMAs são aplicados uma única vez, quando a conexão é criada.
+# As conexões ficam em modo autocommit; escritas usam o bloco transaction().
+# 'factory' é a classe das conexões novas (diagnostico.py troca por uma que
+# cronometra cada comando).
+class ConnectionManager:
+    def __init__(self, path, profile=None, **overrides):
+        self.path = path
+        self.pragmas = resolve_pragmas(profile, **overrides)
+        self.factory = sqlite3.Connection
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []
+        self.opened = 0
+        self.reused = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, factory=self.factory)
+        apply_pragmas(conn, self.pragmas)
+        with self._lock:
+            self._conns.append(conn)
+            self.opened += 1
+        return conn
+
+    # Devolve a conexão da thread atual (criando na primeira vez). Não feche!
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        else:
+            with self._lock:
+                self.reused += 1
+        return conn
+
+    # Bloco transacional: faz COMMIT no final ou ROLLBACK se der erro.
+    # Se já houver uma transação aberta nesta thread, apenas participa dela.
+    @contextmanager
+    def transaction(self, immediate=False):
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn.cursor()
+            return
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn.cursor()
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    # Quantas conexões foram abertas e quantas vezes uma já aberta foi reaproveitada.
+    def stats(self):
+        with self._lock:
+            return {"opened": self.opened, "reused": self.reused, "active": len(self._conns)}
+
+    # Fecha todas as conexões (ex.: ao sair do programa).
+    def close_all(self):
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+db = ConnectionManager(DB_PATH)
+# Conexões separadas para os relatórios, com o perfil "reporting". Em WAL elas
+# leem um retrato consistente do banco sem segurar o caixa.
+report_db = ConnectionManager(DB_PATH, "reporting")
+
+# Troca o arquivo do banco (ex.: gerar_dados.py e benchmark.py trabalham em
+# outro arquivo). Fecha as conexões abertas; as próximas já abrem o novo.
+def usar_banco(caminho):
+    for manager in (db, report_db):
+        manager.close_all()
+        manager.path = caminho
+
+# Atalho mantido por compatibilidade: devolve a conexão reaproveitada da thread.
+def get_conn():
+    return db.connection()
+
+# Função de Segurança: Transforma a senha digitada em um código hash (SHA256).
+# Isso evita salvar a senha pura no banco de dados.
+def _hash_pwd(pwd: str) -> str:
+    return hashlib.sha256(pwd.encode("utf-8")).hexdigest()
+
+# --- ESQUEMA DO BANCO ---
+# CREATE TABLE de cada tabela. O nome fica como {nome} para que as migrações
+# possam criar uma cópia nova (ex.: vendas_novo) com a mesma estrutura.
+# Dinheiro é INTEGER em centavos; custo_medio em milionésimos de real (CUSTO_ESCALA).
+_DDL = {
+    # Tabela de Insumos: Guarda o estoque e custo médio de cada item.
+    "insumos": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL UNIQUE,
+            categoria TEXT,
+            unidade TEXT DEFAULT 'un',
+            estoque_qtd REAL DEFAULT 0,
+            custo_medio INTEGER DEFAULT 0
+        )''',
+    # Tabela de Receitas: Produtos que são vendidos (ex: X-Burguer).
+    # custo_unit: custo de uma unidade pela ficha técnica (milionésimos de real),
+    # mantido pelos gatilhos de custo; a venda só lê este número.
+    "receitas": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL UNIQUE,
+            preco_venda INTEGER NOT NULL DEFAULT 0,
+            custo_unit INTEGER NOT NULL DEFAULT 0
+        )''',
+    # Ficha técnica: quanto de cada insumo vai em uma unidade da receita.
+    # quantidade/unidade ficam como o usuário digitou (ex.: 150 g) e qtd_base é
+    # o mesmo valor na unidade do insumo (0,150 kg), pronto para o custo.
+    "receita_itens": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            receita_id INTEGER NOT NULL,
+            insumo_id INTEGER NOT NULL,
+            quantidade REAL NOT NULL,
+            unidade TEXT NOT NULL,
+            qtd_base REAL NOT NULL,
+            PRIMARY KEY (receita_id, insumo_id),
+            FOREIGN KEY (receita_id) REFERENCES receitas(id) ON DELETE CASCADE,
+            FOREIGN KEY (insumo_id) REFERENCES insumos(id)
+        ) WITHOUT ROWID''',
+    # Pedidos (tickets): agrupa as vendas de um mesmo pedido. origem diz de onde
+    # veio (ex.: 'ifood') e pedido_externo é o número do pedido lá, único por
+    # origem (índice único parcial), para a importação não gravar o mesmo pedido
+    # duas vezes. Os totais do ticket são mantidos pelos gatilhos de pedidos.
+    "pedidos": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origem TEXT NOT NULL DEFAULT 'balcao',
+            pedido_externo TEXT,
+            data INTEGER DEFAULT (CAST(strftime('%s','now') AS INTEGER)),
+            itens INTEGER NOT NULL DEFAULT 0,
+            total_bruto INTEGER NOT NULL DEFAULT 0,
+            custo_total INTEGER NOT NULL DEFAULT 0,
+            lucro_liquido INTEGER NOT NULL DEFAULT 0
+        )''',
+    # Apelidos das receitas nas plataformas: nome do item no aplicativo -> receita.
+    "receita_aliases": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            origem TEXT NOT NULL,
+            alias TEXT NOT NULL,
+            receita_id INTEGER NOT NULL,
+            PRIMARY KEY (origem, alias),
+            FOREIGN KEY (receita_id) REFERENCES receitas(id) ON DELETE CASCADE
+        ) WITHOUT ROWID''',
+    # Tabela de Vendas: Registro financeiro de cada venda.
+    # pedido_id: pedido ao qual a venda pertence (vazio nas vendas avulsas).
+    "vendas": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            receita_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            preco_unit INTEGER NOT NULL,
+            taxa_plataforma REAL NOT NULL DEFAULT 0,
+            total_bruto INTEGER NOT NULL,
+            custo_total INTEGER NOT NULL,
+            lucro_liquido INTEGER NOT NULL,
+            data INTEGER DEFAULT (CAST(strftime('%s','now') AS INTEGER)),
+            pedido_id INTEGER REFERENCES pedidos(id),
+            FOREIGN KEY (receita_id) REFERENCES receitas(id) ON DELETE CASCADE
+        )''',
+    # Tabela de Compras: Histórico de entrada de produtos.
+    # insumo_id liga a compra ao insumo; 'nome' fica como foi digitado na compra.
+    # custo_unit é o custo exato por unidade do insumo (milionésimos de real, ex.:
+    # R$ 0,0045 por grama numa NF-e) e 'preco' o mesmo valor em centavos, para exibir.
+    # Compras antigas não têm custo_unit: vale preco.
+    "compras": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            quantidade REAL NOT NULL,
+            preco INTEGER NOT NULL,
+            data INTEGER DEFAULT (CAST(strftime('%s','now') AS INTEGER)),
+            insumo_id INTEGER REFERENCES insumos(id) ON DELETE SET NULL,
+            custo_unit INTEGER
+        )''',
+    # Razão do estoque: cada entrada/saída de insumo, só acrescentada (correções
+    # refazem o final). quantidade tem sinal (+ entra, - sai); custo_unit
+    # (milionésimos de real) só nas compras, que mexem no custo médio.
+    # compra_id/venda_id apontam a origem, sem chave estrangeira de propósito:
+    # apagar a compra/venda é que decide o que fazer com o movimento.
+    "movimentos_estoque": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            insumo_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL CHECK (tipo IN ('compra', 'venda', 'ajuste', 'perda')),
+            quantidade REAL NOT NULL,
+            custo_unit INTEGER,
+            compra_id INTEGER,
+            venda_id INTEGER,
+            data INTEGER DEFAULT (CAST(strftime('%s','now') AS INTEGER)),
+            FOREIGN KEY (insumo_id) REFERENCES insumos(id) ON DELETE CASCADE
+        )''',
+    # Retratos do estoque: estado do insumo logo depois do movimento movimento_id.
+    # O estado atual = último retrato + os poucos movimentos depois dele.
+    "estoque_snapshots": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            insumo_id INTEGER NOT NULL,
+            movimento_id INTEGER NOT NULL,
+            estoque_qtd REAL NOT NULL,
+            custo_medio INTEGER NOT NULL,
+            PRIMARY KEY (insumo_id, movimento_id),
+            FOREIGN KEY (insumo_id) REFERENCES insumos(id) ON DELETE CASCADE
+        ) WITHOUT ROWID''',
+    # De-para dos produtos de NF-e: código do produto no fornecedor (CNPJ) ->
+    # insumo. fator converte a unidade da nota na do insumo (ex.: caixa com 12 -> 12).
+    "nfe_produtos": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            cnpj TEXT NOT NULL,
+            codigo TEXT NOT NULL,
+            insumo_id INTEGER NOT NULL,
+            fator REAL NOT NULL DEFAULT 1,
+            descricao TEXT,
+            PRIMARY KEY (cnpj, codigo),
+            FOREIGN KEY (insumo_id) REFERENCES insumos(id) ON DELETE CASCADE
+        ) WITHOUT ROWID''',
+    # Notas fiscais já importadas, pela chave de acesso (44 dígitos).
+    "nfe_importadas": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            chave TEXT PRIMARY KEY,
+            arquivo TEXT,
+            cnpj TEXT,
+            itens INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            data INTEGER DEFAULT (CAST(strftime('%s','now') AS INTEGER))
+        ) WITHOUT ROWID''',
+    # Tabela de Usuários: Para o sistema de Login.
+    "usuarios": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL
+        )''',
+    # Resumo diário de vendas (por dia e receita), mantido por gatilhos.
+    # Os relatórios leem poucas dezenas de linhas daqui em vez de todas as vendas.
+    "vendas_diario": '''
+        CREATE TABLE IF NOT EXISTS {nome} (
+            dia TEXT NOT NULL,
+            receita_id INTEGER NOT NULL,
+            qtd_vendas INTEGER NOT NULL DEFAULT 0,
+            qtd_itens INTEGER NOT NULL DEFAULT 0,
+            total_bruto INTEGER NOT NULL DEFAULT 0,
+            custo_total INTEGER NOT NULL DEFAULT 0,
+            lucro_liquido INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, receita_id)
+        ) WITHOUT ROWID''',
+}
+
+def _tabela_existe(cur, nome):
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (nome,))
+    return cur.fetchone() is not None
+
+# Tipo declarado de uma coluna (ex.: 'REAL'), ou None se ela não existir.
+def _tipo_coluna(cur, tabela, coluna):
+    for _, nome, tipo, *_ in cur.execute(f"PRAGMA table_info({tabela})").fetchall():
+        if nome == coluna:
+            return tipo.upper()
+    return None
+
+# Índices: as consultas por período comparam a coluna 'data' direto (sem
+# datetime() em volta), então o SQLite consegue usar o índice.
+def _criar_indices(cur):
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vendas_data ON vendas(data)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vendas_receita ON vendas(receita_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_compras_data ON compras(data)")
+
+# Visões de compatibilidade: mesmas colunas de antes, com 'data' em texto
+# (AAAA-MM-DD HH:MM:SS, hora local) para quem ainda lê o formato antigo.
+def _criar_visoes(cur):
+    cur.execute('''
+        CREATE VIEW IF NOT EXISTS vendas_texto AS
+        SELECT id, receita_id, quantidade, preco_unit, taxa_plataforma, total_bruto,
+               custo_total, lucro_liquido, datetime(data, 'unixepoch', 'localtime') AS data
+        FROM vendas
+    ''')
+    cur.execute('''
+        CREATE VIEW IF NOT EXISTS compras_texto AS
+        SELECT id, nome, quantidade, preco, datetime(data, 'unixepoch', 'localtime') AS data
+        FROM compras
+    ''')
+
+# --- MIGRAÇÃO PARA CENTAVOS ---
+# Colunas de dinheiro e o fator para sair de REAL (em reais) para INTEGER.
+_COLUNAS_DINHEIRO = {
+    "insumos": {"custo_medio": CUSTO_ESCALA},
+    "receitas": {"preco_venda": 100},
+    "vendas": {"preco_unit": 100, "total_bruto": 100, "custo_total": 100, "lucro_liquido": 100},
+    "compras": {"preco": 100},
+}
+
+# Coluna 'data' como está no _DDL (epoch) e como era nos bancos antigos (texto).
+_DATA_EPOCH_DDL = "data INTEGER DEFAULT (CAST(strftime('%s','now') AS INTEGER))"
+_DATA_TEXTO_DDL = "data TEXT DEFAULT (datetime('now','localtime'))"
+
+def _precisa_migrar_centavos(cur):
+    return _tipo_coluna(cur, "vendas", "preco_unit") == "REAL"
+
+# Reconstrói as tabelas com as colunas de dinheiro em INTEGER (o SQLite não
+# muda o tipo de uma coluna existente). Tudo numa transação: ou converte
+# tudo ou nada. O resumo diário é recriado depois, a partir das vendas.
+# Só muda o esquema e as unidades: datas em texto continuam em texto e são
+# convertidas depois por migrar_datas_epoch (v3), em lotes curtos.
+def migrar_para_centavos():
+    conn = get_conn()
+    # Chaves estrangeiras precisam ficar desligadas enquanto as tabelas são trocadas.
+    conn.execute("PRAGMA foreign_keys = OFF;")
+    try:
+        with db.transaction(immediate=True) as cur:
+            if not _precisa_migrar_centavos(cur):
+                return
+            for tabela, colunas in _COLUNAS_DINHEIRO.items():
+                info = cur.execute(f"PRAGMA table_info({tabela})").fetchall()
+                cols = [r[1] for r in info]
+                ddl = _DDL[tabela]
+                if _tipo_coluna(cur, tabela, "data") == "TEXT":
+                    ddl = ddl.replace(_DATA_EPOCH_DDL, _DATA_TEXTO_DDL)
+                select = ", ".join(
+                    f"CAST(ROUND({c} * {colunas[c]}) AS INTEGER)" if c in colunas else c for c in cols
+                )
+                cur.execute(ddl.format(nome=f"{tabela}_novo"))
+                cur.execute(f"INSERT INTO {tabela}_novo ({', '.join(cols)}) SELECT {select} FROM {tabela}")
+                cur.execute(f"DROP TABLE {tabela}")
+                cur.execute(f"ALTER TABLE {tabela}_novo RENAME TO {tabela}")
+            cur.execute("DROP TABLE IF EXISTS vendas_diario")
+            cur.execute(_DDL["vendas_diario"].format(nome="vendas_diario"))
+            cur.execute("PRAGMA foreign_key_check")
+            if cur.fetchone():
+                raise sqlite3.IntegrityError("Migração para centavos quebraria chaves estrangeiras.")
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON;")
+
+# --- MIGRAÇÃO DAS DATAS PARA EPOCH ---
+# Texto em hora local ('2024-05-01 12:30:00') -> segundos epoch. O modificador
+# 'utc' indica que o texto está na hora local e deve ser convertido.
+def _texto_para_epoch_sql(expr):
+    return f"COALESCE(CAST(strftime('%s', {expr}, 'utc') AS INTEGER), {_AGORA_EPOCH_SQL})"
+
+# Converte a coluna 'data' (TEXT) de vendas/compras para epoch sem travar o
+# caixa por minutos, mesmo com milhões de linhas:
+#   1. cria a coluna data_epoch e um gatilho que preenche as linhas novas;
+#   2. preenche as linhas antigas em lotes de 'lote' ids, cada lote na sua
+#      própria transação curta (entre um lote e outro os terminais gravam);
+#   3. numa transação curta final, renomeia: data -> data_texto (legado,
+#      não é mais lido) e data_epoch -> data, refaz o índice e passa o
+#      padrão da data para a coluna nova (_corrigir_padrao_data).
+# Se for interrompida, basta rodar de novo: continua de onde parou.
+def migrar_datas_epoch(tabela, lote=5000, progresso=None):
+    conn = get_conn()
+    gatilho = f"trg_{tabela}_data_epoch"
+    with db.transaction(immediate=True) as cur:
+        if _tipo_coluna(cur, tabela, "data") != "TEXT":
+            return
+        if _tipo_coluna(cur, tabela, "data_epoch") is None:
+            cur.execute(f"ALTER TABLE {tabela} ADD COLUMN data_epoch INTEGER")
+        if tabela == "vendas":
+            # Gatilhos do resumo que só reagem às colunas do resumo, para que o
+            # preenchimento de data_epoch não reprocesse cada venda no resumo.
+            _remover_gatilhos_resumo(cur)
+            _criar_gatilhos_resumo(cur, dia_sql=_dia_sql_texto)
+        cur.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {gatilho} AFTER INSERT ON {tabela}
+            WHEN NEW.data_epoch IS NULL
+            BEGIN
+                UPDATE {tabela} SET data_epoch = {_texto_para_epoch_sql("NEW.data")} WHERE id = NEW.id;
+            END
+        ''')
+        ultimo = cur.execute(f"SELECT MAX(id) FROM {tabela}").fetchone()[0] or 0
+
+    # Lotes curtos por faixa de id (busca pela chave primária, sem varrer a tabela)
+    for inicio in range(0, ultimo, lote):
+        with db.transaction(immediate=True) as cur:
+            cur.execute(f'''
+                UPDATE {tabela} SET data_epoch = {_texto_para_epoch_sql("data")}
+                WHERE id > ? AND id <= ? AND data_epoch IS NULL
+            ''', (inicio, inicio + lote))
+        if progresso:
+            progresso(tabela, min(inicio + lote, ultimo), ultimo)
+
+    with db.transaction(immediate=True) as cur:
+        # Linhas que chegaram depois do último lote já foram tratadas pelo gatilho
+        cur.execute(f"UPDATE {tabela} SET data_epoch = {_texto_para_epoch_sql('data')} "
+                    f"WHERE id > ? AND data_epoch IS NULL", (ultimo,))
+        cur.execute(f"DROP TRIGGER IF EXISTS {gatilho}")
+        cur.execute(f"DROP INDEX IF EXISTS idx_{tabela}_data")
+        # RENAME COLUMN reescreveria os gatilhos do resumo para 'data_texto';
+        # eles são removidos aqui e recriados pelo init_db com a expressão nova.
+        if tabela == "vendas":
+            _remover_gatilhos_resumo(cur)
+        cur.execute(f"DROP VIEW IF EXISTS {tabela}_texto")
+        cur.execute(f"ALTER TABLE {tabela} RENAME COLUMN data TO data_texto")
+        cur.execute(f"ALTER TABLE {tabela} RENAME COLUMN data_epoch TO data")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_data ON {tabela}(data)")
+        _corrigir_padrao_data(cur, tabela)
+        if tabela == "vendas":
+            _criar_gatilhos_resumo(cur)
+    conn.execute("PRAGMA optimize;")
+
+# Depois da troca acima, 'data' (a antiga data_epoch) fica sem DEFAULT: o SQLite
+# não aceita ADD COLUMN com padrão calculado numa tabela que já tem linhas. E
+# data_texto continuaria gravando a hora em texto em toda linha nova. Só o
+# padrão muda, não o formato das linhas, então basta corrigir o CREATE TABLE
+# guardado (o procedimento com writable_schema da documentação do SQLite para
+# trocar o padrão de uma coluna), sem reescrever a tabela.
+def _corrigir_padrao_data(cur, tabela):
+    if _tipo_coluna(cur, tabela, "data") != "INTEGER":
+        return
+    sql = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,)).fetchone()[0]
+    novo = sql.replace("data_texto" + _DATA_TEXTO_DDL[len("data"):], "data_texto TEXT")
+    novo = re.sub(r'([,(]\s*)"?data"?\s+INTEGER(\s*[,)])', lambda m: m[1] + _DATA_EPOCH_DDL + m[2], novo)
+    if novo == sql:
+        return
+    versao = cur.execute("PRAGMA schema_version").fetchone()[0]
+    cur.execute("PRAGMA writable_schema = ON")
+    try:
+        cur.execute("UPDATE sqlite_master SET sql = ? WHERE type = 'table' AND name = ?", (novo, tabela))
+        cur.execute(f"PRAGMA schema_version = {versao + 1}")
+    finally:
+        cur.execute("PRAGMA writable_schema = OFF")
+    padroes = {r[1]: r[4] for r in cur.execute(f"PRAGMA table_info({tabela})").fetchall()}
+    if padroes["data"] is None:
+        raise sqlite3.DatabaseError(f"Não foi possível pôr o padrão na data de {tabela}.")
+
+# --- MIGRAÇÃO DE compras.insumo_id ---
+# Liga cada compra antiga ao insumo pelo id (antes era só pelo nome, em texto)
+# sem travar o caixa, como na migração das datas: a coluna e o índice entram
+# numa transação curta e as linhas antigas são preenchidas em lotes por faixa
+# de id, achando o insumo pelo nome (índice UNIQUE de insumos.nome). Compras
+# novas já chegam com o id. Se for interrompida, basta rodar de novo.
+def migrar_compras_insumo(lote=5000, progresso=None):
+    with db.transaction(immediate=True) as cur:
+        if _tipo_coluna(cur, "compras", "insumo_id") is None:
+            cur.execute("ALTER TABLE compras ADD COLUMN insumo_id INTEGER REFERENCES insumos(id) ON DELETE SET NULL")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_compras_insumo ON compras(insumo_id, data)")
+        ultimo = cur.execute("SELECT MAX(id) FROM compras").fetchone()[0] or 0
+
+    for inicio in range(0, ultimo, lote):
+        with db.transaction(immediate=True) as cur:
+            cur.execute('''
+                UPDATE compras SET insumo_id = (SELECT i.id FROM insumos i WHERE i.nome = compras.nome)
+                WHERE id > ? AND id <= ? AND insumo_id IS NULL
+            ''', (inicio, inicio + lote))
+        if progresso:
+            progresso("compras", min(inicio + lote, ultimo), ultimo)
+
+# --- PEDIDOS PARA TODAS AS VENDAS ---
+_COLUNAS_TICKET = ("itens", "total_bruto", "custo_total", "lucro_liquido")
+
+# Gatilhos que mantêm os totais do pedido a cada INSERT/DELETE/UPDATE em vendas.
+def _criar_gatilhos_pedidos(cur):
+    soma = "UPDATE pedidos SET itens = itens + NEW.quantidade, total_bruto = total_bruto + NEW.total_bruto, " \
+           "custo_total = custo_total + NEW.custo_total, lucro_liquido = lucro_liquido + NEW.lucro_liquido " \
+           "WHERE id = NEW.pedido_id;"
+    subtrai = "UPDATE pedidos SET itens = itens - OLD.quantidade, total_bruto = total_bruto - OLD.total_bruto, " \
+              "custo_total = custo_total - OLD.custo_total, lucro_liquido = lucro_liquido - OLD.lucro_liquido " \
+              "WHERE id = OLD.pedido_id;"
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_pedidos_ins AFTER INSERT ON vendas BEGIN {soma} END")
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_pedidos_del AFTER DELETE ON vendas BEGIN {subtrai} END")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_pedidos_upd
+        AFTER UPDATE OF pedido_id, quantidade, total_bruto, custo_total, lucro_liquido ON vendas
+        BEGIN {subtrai} {soma} END""")
+
+# Liga as vendas sem pedido da faixa de ids (de, ate] a pedidos novos de balcão,
+# um por venda: numera os pedidos a partir do último id usado (ROW_NUMBER na
+# ordem das vendas), cria os pedidos e depois aponta as vendas para eles; o
+# gatilho trg_pedidos_upd preenche os totais de cada pedido.
+def _pedidos_para_vendas(cur, de, ate):
+    base = cur.execute('''
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'pedidos'), 0),
+                   COALESCE((SELECT MAX(id) FROM pedidos), 0))
+    ''').fetchone()[0]
+    numeradas = '''
+        SELECT id, data, ? + ROW_NUMBER() OVER (ORDER BY id) AS pedido_id
+        FROM vendas WHERE id > ? AND id <= ? AND pedido_id IS NULL
+    '''
+    cur.execute(f"INSERT INTO pedidos (id, origem, data) SELECT pedido_id, 'balcao', data FROM ({numeradas})",
+                (base, de, ate))
+    cur.execute(f"UPDATE vendas SET pedido_id = n.pedido_id FROM ({numeradas}) AS n WHERE vendas.id = n.id",
+                (base, de, ate))
+
+# Toda venda passa a ter pedido. Colunas dos totais, gatilhos e o índice por
+# data entram numa transação curta; as vendas antigas (uma receita por venda)
+# viram pedidos de um item em lotes por faixa de id, como nas outras migrações
+# longas. Se for interrompida, basta rodar de novo: continua de onde parou.
+def migrar_vendas_pedidos(lote=5000, progresso=None):
+    with db.transaction(immediate=True) as cur:
+        for coluna in _COLUNAS_TICKET:
+            if _tipo_coluna(cur, "pedidos", coluna) is None:
+                cur.execute(f"ALTER TABLE pedidos ADD COLUMN {coluna} INTEGER NOT NULL DEFAULT 0")
+        _criar_gatilhos_pedidos(cur)
+        # Índice de cobertura: os agregados por ticket num período não leem a tabela.
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pedidos_data ON pedidos(data, total_bruto, lucro_liquido, itens)")
+        # Pedidos importados antes dos totais existirem.
+        cur.execute('''
+            UPDATE pedidos SET (itens, total_bruto, custo_total, lucro_liquido) = (
+                SELECT COALESCE(SUM(quantidade), 0), COALESCE(SUM(total_bruto), 0),
+                       COALESCE(SUM(custo_total), 0), COALESCE(SUM(lucro_liquido), 0)
+                FROM vendas WHERE pedido_id = pedidos.id)
+            WHERE itens = 0
+        ''')
+        ultimo = cur.execute("SELECT MAX(id) FROM vendas").fetchone()[0] or 0
+
+    for inicio in range(0, ultimo, lote):
+        with db.transaction(immediate=True) as cur:
+            _pedidos_para_vendas(cur, inicio, inicio + lote)
+        if progresso:
+            progresso("pedidos", min(inicio + lote, ultimo), ultimo)
+    # Vendas que outro terminal (com a versão anterior) gravou durante os lotes.
+    with db.transaction(immediate=True) as cur:
+        _pedidos_para_vendas(cur, ultimo, sys.maxsize)
+
+# --- RESUMO DIÁRIO (vendas_diario) ---
+# Dia (AAAA-MM-DD) de uma linha de vendas, usado como chave do resumo.
+def _dia_sql(ref):
+    return f"date({ref}.data, 'unixepoch', 'localtime')"
+
+# O mesmo, para bancos que ainda estão com a data em texto (durante a migração).
+def _dia_sql_texto(ref):
+    return f"substr({ref}.data, 1, 10)"
+
+# Gatilhos que mantêm vendas_diario em dia a cada INSERT/DELETE/UPDATE em vendas.
+def _criar_gatilhos_resumo(cur, dia_sql=_dia_sql):
+    soma = '''
+        INSERT INTO vendas_diario (dia, receita_id, qtd_vendas, qtd_itens, total_bruto, custo_total, lucro_liquido)
+        VALUES ({dia}, NEW.receita_id, 1, NEW.quantidade, NEW.total_bruto, NEW.custo_total, NEW.lucro_liquido)
+        ON CONFLICT (dia, receita_id) DO UPDATE SET
+            qtd_vendas = qtd_vendas + 1,
+            qtd_itens = qtd_itens + excluded.qtd_itens,
+            total_bruto = total_bruto + excluded.total_bruto,
+            custo_total = custo_total + excluded.custo_total,
+            lucro_liquido = lucro_liquido + excluded.lucro_liquido;
+    '''.format(dia=dia_sql("NEW"))
+    subtrai = '''
+        UPDATE vendas_diario SET
+            qtd_vendas = qtd_vendas - 1,
+            qtd_itens = qtd_itens - OLD.quantidade,
+            total_bruto = total_bruto - OLD.total_bruto,
+            custo_total = custo_total - OLD.custo_total,
+            lucro_liquido = lucro_liquido - OLD.lucro_liquido
+        WHERE dia = {dia} AND receita_id = OLD.receita_id;
+        DELETE FROM vendas_diario
+        WHERE dia = {dia} AND receita_id = OLD.receita_id AND qtd_vendas <= 0;
+    '''.format(dia=dia_sql("OLD"))
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_vendas_diario_ins AFTER INSERT ON vendas BEGIN {soma} END")
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_vendas_diario_del AFTER DELETE ON vendas BEGIN {subtrai} END")
+    # Só colunas que entram no resumo: atualizar outra coluna não mexe no resumo.
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_vendas_diario_upd
+        AFTER UPDATE OF receita_id, quantidade, total_bruto, custo_total, lucro_liquido, data ON vendas
+        BEGIN {subtrai} {soma} END""")
+
+def _remover_gatilhos_resumo(cur):
+    for sufixo in ("ins", "del", "upd"):
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_vendas_diario_{sufixo}")
+
+def _preencher_resumo(cur):
+    cur.execute("DELETE FROM vendas_diario")
+    cur.execute(f'''
+        INSERT INTO vendas_diario (dia, receita_id, qtd_vendas, qtd_itens, total_bruto, custo_total, lucro_liquido)
+        SELECT {_dia_sql("vendas")}, receita_id, COUNT(*), SUM(quantidade),
+               SUM(total_bruto), SUM(custo_total), SUM(lucro_liquido)
+        FROM vendas
+        GROUP BY 1, 2
+    ''')
+
+# Recalcula o resumo inteiro a partir das vendas (para consertar divergências).
+# Também disponível pela linha de comando: python crud.py reconstruir-resumo
+def rebuild_vendas_diario():
+    with db.transaction(immediate=True) as cur:
+        _preencher_resumo(cur)
+        cur.execute("SELECT COUNT(*) FROM vendas_diario")
+        return cur.fetchone()[0]
+
+# --- CUSTO DAS RECEITAS (ficha técnica) ---
+# Custo de uma unidade da receita {ref}: soma de qtd_base x custo médio.
+def _custo_receita_sql(ref):
+    return f'''(SELECT CAST(ROUND(COALESCE(SUM(ri.qtd_base * i.custo_medio), 0)) AS INTEGER)
+               FROM receita_itens ri JOIN insumos i ON i.id = ri.insumo_id
+               WHERE ri.receita_id = {ref})'''
+
+# Gatilhos que mantêm receitas.custo_unit em dia. Só as receitas afetadas são
+# recalculadas: a compra que muda o custo médio de um insumo refaz as receitas
+# que usam aquele insumo (achadas pelo idx_receita_itens_insumo).
+def _criar_gatilhos_custo(cur):
+    custo = _custo_receita_sql("receitas.id")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_custo_insumo
+        AFTER UPDATE OF custo_medio ON insumos WHEN NEW.custo_medio IS NOT OLD.custo_medio
+        BEGIN
+            UPDATE receitas SET custo_unit = {custo}
+            WHERE id IN (SELECT receita_id FROM receita_itens WHERE insumo_id = NEW.id);
+        END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_custo_item_ins AFTER INSERT ON receita_itens
+        BEGIN UPDATE receitas SET custo_unit = {custo} WHERE id = NEW.receita_id; END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_custo_item_del AFTER DELETE ON receita_itens
+        BEGIN UPDATE receitas SET custo_unit = {custo} WHERE id = OLD.receita_id; END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_custo_item_upd
+        AFTER UPDATE OF receita_id, insumo_id, qtd_base ON receita_itens
+        BEGIN UPDATE receitas SET custo_unit = {custo} WHERE id IN (OLD.receita_id, NEW.receita_id); END""")
+
+# Recalcula o custo de todas as receitas (para consertar divergências).
+def recalcular_custos_receitas():
+    with db.transaction(immediate=True) as cur:
+        cur.execute(f"UPDATE receitas SET custo_unit = {_custo_receita_sql('receitas.id')}")
+        return cur.rowcount
+
+# --- VERSÕES DO ESQUEMA (PRAGMA user_version) ---
+# Cada migração leva o banco da versão N-1 para a versão N (N = posição na
+# lista). O número fica gravado no próprio arquivo em PRAGMA user_version, então
+# na inicialização basta ler um inteiro: se estiver em dia, nada é feito.
+# Mudanças de esquema novas entram SEMPRE no fim da lista.
+# transacional=True: roda dentro de uma transação junto com a troca de versão.
+# transacional=False: a migração controla as próprias transações (ex.: precisa
+# desligar foreign_keys ou trabalhar em lotes) e precisa poder ser repetida.
+
+# v1: tabelas (já no formato atual) e o usuário "admin" padrão.
+def _m001_tabelas(cur, progresso):
+    for nome, ddl in _DDL.items():
+        cur.execute(ddl.format(nome=nome))
+    # Cria um usuário padrão "admin" com senha "admin" se o banco estiver vazio.
+    cur.execute("SELECT COUNT(*) FROM usuarios")
+    if cur.fetchone()[0] == 0:
+        cur.execute("INSERT INTO usuarios (username, password_hash) VALUES (?, ?)",
+                    ("admin", _hash_pwd("admin")))
+
+# v2: bancos antigos guardavam dinheiro como REAL: converte para centavos.
+def _m002_centavos(progresso):
+    migrar_para_centavos()
+
+# v3: datas em texto viram epoch, em lotes curtos (o caixa continua gravando).
+def _m003_datas_epoch(progresso):
+    for tabela in ("vendas", "compras"):
+        migrar_datas_epoch(tabela, progresso=progresso)
+
+# v4: índices, visões de compatibilidade e o resumo diário (recalculado uma vez).
+def _m004_indices_resumo(cur, progresso):
+    _criar_indices(cur)
+    _criar_visoes(cur)
+    _criar_gatilhos_resumo(cur)
+    _preencher_resumo(cur)
+
+# v5: ficha técnica (receita_itens) e custo por receita mantido por gatilhos.
+def _m005_ficha_tecnica(cur, progresso):
+    cur.execute(_DDL["receita_itens"].format(nome="receita_itens"))
+    if _tipo_coluna(cur, "receitas", "custo_unit") is None:
+        cur.execute("ALTER TABLE receitas ADD COLUMN custo_unit INTEGER NOT NULL DEFAULT 0")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_receita_itens_insumo ON receita_itens(insumo_id)")
+    _criar_gatilhos_custo(cur)
+
+# v6: razão do estoque. O saldo atual de cada insumo vira o retrato inicial
+# (movimento 0), já que as compras antigas não têm movimento.
+def _m006_razao_estoque(cur, progresso):
+    for nome in ("movimentos_estoque", "estoque_snapshots"):
+        cur.execute(_DDL[nome].format(nome=nome))
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_movimentos_insumo ON movimentos_estoque(insumo_id, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_movimentos_compra ON movimentos_estoque(compra_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_movimentos_venda ON movimentos_estoque(venda_id)")
+    cur.execute('''
+        INSERT OR IGNORE INTO estoque_snapshots (insumo_id, movimento_id, estoque_qtd, custo_medio)
+        SELECT id, 0, COALESCE(estoque_qtd, 0), COALESCE(custo_medio, 0) FROM insumos
+    ''')
+
+# v7: compras.insumo_id (chave estrangeira), preenchida em lotes pelo nome.
+def _m007_compras_insumo(progresso):
+    migrar_compras_insumo(progresso=progresso)
+
+# v8: importação de NF-e (de-para de produtos e notas já importadas).
+def _m008_nfe(cur, progresso):
+    for nome in ("nfe_produtos", "nfe_importadas"):
+        cur.execute(_DDL[nome].format(nome=nome))
+
+# v9: pedidos (importação dos aplicativos de delivery) e apelidos das receitas.
+def _m009_pedidos(cur, progresso):
+    for nome in ("pedidos", "receita_aliases"):
+        cur.execute(_DDL[nome].format(nome=nome))
+    if _tipo_coluna(cur, "vendas", "pedido_id") is None:
+        cur.execute("ALTER TABLE vendas ADD COLUMN pedido_id INTEGER REFERENCES pedidos(id)")
+    cur.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_pedidos_externo ON pedidos(origem, pedido_externo)
+        WHERE pedido_externo IS NOT NULL
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vendas_pedido ON vendas(pedido_id)")
+
+# v10: toda venda pertence a um pedido, com os totais do ticket.
+def _m010_vendas_pedidos(progresso):
+    migrar_vendas_pedidos(progresso=progresso)
+
+# v11: custo exato de cada compra (compras.custo_unit), para preços abaixo de 1 centavo.
+def _m011_compras_custo(cur, progresso):
+    if _tipo_coluna(cur, "compras", "custo_unit") is None:
+        cur.execute("ALTER TABLE compras ADD COLUMN custo_unit INTEGER")
+
+# v12: bancos que já passaram pela v3 ficaram sem padrão na data (ver _corrigir_padrao_data).
+def _m012_padrao_data(cur, progresso):
+    for tabela in ("vendas", "compras"):
+        _corrigir_padrao_data(cur, tabela)
+
+MIGRACOES = [
+    (_m001_tabelas, True),
+    (_m002_centavos, False),
+    (_m003_datas_epoch, False),
+    (_m004_indices_resumo, True),
+    (_m005_ficha_tecnica, True),
+    (_m006_razao_estoque, True),
+    (_m007_compras_insumo, False),
+    (_m008_nfe, True),
+    (_m009_pedidos, True),
+    (_m010_vendas_pedidos, False),
+    (_m011_compras_custo, True),
+    (_m012_padrao_data, True),
+]
+SCHEMA_VERSION = len(MIGRACOES)
+
+def schema_version():
+    return get_conn().execute("PRAGMA user_version").fetchone()[0]
+
+# Inicializa o banco de dados: aplica, em ordem, as migrações que faltam.
+# A conexão já vem com o perfil de PRAGMA aplicado; o journal_mode=WAL fica
+# gravado no arquivo, então vale também para outros terminais.
+# 'progresso' (opcional) recebe (tabela, feitas, total) durante migrações longas.
+def init_db(progresso=None):
+    if schema_version() >= SCHEMA_VERSION:
+        return
+    for versao, (migracao, transacional) in enumerate(MIGRACOES, start=1):
+        # Outro terminal pode ter migrado enquanto isso: confere de novo.
+        if schema_version() >= versao:
+            continue
+        if not transacional:
+            migracao(progresso)
+        with db.transaction(immediate=True) as cur:
+            if cur.execute("PRAGMA user_version").fetchone()[0] >= versao:
+                continue
+            if transacional:
+                migracao(cur, progresso)
+            cur.execute(f"PRAGMA user_version = {versao}")
+
+# Verifica se usuário e senha batem com o banco de dados.
+def verify_user(username, password):
+    row = get_conn().execute("SELECT password_hash FROM usuarios WHERE username = ?", (username,)).fetchone()
+    if not row:
+        return False
+    return row[0] == _hash_pwd(password)
+
+# --- ERROS DA CAMADA DE SERVIÇO ---
+# A mensagem de cada exceção já vem pronta para mostrar ao usuário.
+class ServiceError(Exception):
+    pass
+
+# Já existe um registro com esse nome (insumo, receita...).
+class DuplicateName(ServiceError):
+    pass
+
+# O registro pedido não existe (ou já foi removido por outro terminal).
+class NotFound(ServiceError):
+    pass
+
+# Dados de entrada inválidos (quantidade zerada, preço negativo...).
+class InvalidData(ServiceError):
+    pass
+
+def _exigir(condicao, mensagem):
+    if not condicao:
+        raise InvalidData(mensagem)
+
+# --- OPERAÇÕES CRUD (CREATE, READ, UPDATE, DELETE) ---
+# As funções de escrita devolvem a(s) linha(s) afetada(s), no mesmo formato das
+# listagens, para a interface atualizar só aqueles itens da tabela.
+
+# Adiciona um novo insumo ao banco.
+def add_produto(nome, categoria, unidade='un'):
+    _exigir(nome, "Informe o nome do insumo.")
+    try:
+        with db.transaction() as cur:
+            cur.execute(
+                "INSERT INTO insumos (nome, categoria, unidade) VALUES (?, ?, ?)",
+                (nome, categoria, unidade)
+            )
+            insumo_id = cur.lastrowid
+    except sqlite3.IntegrityError:
+        raise DuplicateName("Este insumo já existe.")
+    return obter_insumo(insumo_id)
+
+# Atualiza dados de um insumo existente.
+def update_insumo_db(insumo_id, nome, categoria, unidade):
+    _exigir(nome, "Nome obrigatório.")
+    try:
+        with db.transaction() as cur:
+            row = cur.execute("SELECT unidade FROM insumos WHERE id = ?", (insumo_id,)).fetchone()
+            if row is None:
+                raise NotFound(f"Insumo {insumo_id} não encontrado.")
+            cur.execute("UPDATE insumos SET nome=?, categoria=?, unidade=? WHERE id=?",
+                        (nome, categoria, unidade, insumo_id))
+            # Trocar kg por g (ou l por ml) converte o estoque e o custo médio junto;
+            # entre grandezas diferentes os números ficam como estavam.
+            # A razão do estoque e os retratos são convertidos também.
+            if _mesma_grandeza(row[0], unidade) and converter_unidade(1, row[0], unidade) != 1:
+                fator_qtd = converter_unidade(1, row[0], unidade)
+                fator_custo = converter_unidade(1, unidade, row[0])
+                cur.execute("UPDATE insumos SET estoque_qtd = estoque_qtd * ?, "
+                            "custo_medio = CAST(ROUND(custo_medio * ?) AS INTEGER) WHERE id = ?",
+                            (fator_qtd, fator_custo, insumo_id))
+                cur.execute("UPDATE movimentos_estoque SET quantidade = quantidade * ?, "
+                            "custo_unit = CAST(ROUND(custo_unit * ?) AS INTEGER) WHERE insumo_id = ?",
+                            (fator_qtd, fator_custo, insumo_id))
+                cur.execute("UPDATE estoque_snapshots SET estoque_qtd = estoque_qtd * ?, "
+                            "custo_medio = CAST(ROUND(custo_medio * ?) AS INTEGER) WHERE insumo_id = ?",
+                            (fator_qtd, fator_custo, insumo_id))
+                # Retrato do estado já convertido: a conferência parte dele.
+                _retratar_insumos(cur, [insumo_id])
+            # As fichas técnicas que usam o insumo passam para a unidade nova.
+            itens = cur.execute("SELECT receita_id, quantidade, unidade, qtd_base FROM receita_itens WHERE insumo_id = ?",
+                                (insumo_id,)).fetchall()
+            for receita_id, qtd, un_item, qtd_base in itens:
+                nova = converter_unidade(qtd, un_item, unidade)
+                if nova != qtd_base:
+                    cur.execute("UPDATE receita_itens SET qtd_base = ? WHERE receita_id = ? AND insumo_id = ?",
+                                (nova, receita_id, insumo_id))
+    except sqlite3.IntegrityError:
+        raise DuplicateName("Já existe um insumo com esse nome.")
+    return obter_insumo(insumo_id)
+
+# Remove um insumo (não deixa remover se estiver na ficha técnica de uma receita).
+def delete_insumo_db(insumo_id):
+    try:
+        with db.transaction() as cur:
+            cur.execute("DELETE FROM insumos WHERE id = ?", (insumo_id,))
+            if cur.rowcount == 0:
+                raise NotFound(f"Insumo {insumo_id} não encontrado.")
+    except sqlite3.IntegrityError:
+        raise InvalidData("Este insumo está na ficha técnica de uma receita. Tire-o de lá antes.")
+
+# Lista todos os insumos para exibir na tabela.
+def listar_insumos():
+    return get_conn().execute("SELECT * FROM insumos ORDER BY nome").fetchall()
+
+def obter_insumo(insumo_id):
+    return get_conn().execute("SELECT * FROM insumos WHERE id = ?", (insumo_id,)).fetchone()
+
+def obter_insumo_por_nome(nome):
+    return get_conn().execute("SELECT * FROM insumos WHERE nome = ?", (nome,)).fetchone()
+
+# Entrada de insumo comprado: cria o insumo ou soma o estoque e refaz a média
+# ponderada do custo (estoque negativo pesa zero). Parâmetros: nome, quantidade,
+# custo unitário em milionésimos de real.
+_UPSERT_INSUMO_COMPRA = '''
+    INSERT INTO insumos (nome, categoria, unidade, estoque_qtd, custo_medio)
+    VALUES (?, '', 'un', ?, CAST(ROUND(?) AS INTEGER))
+    ON CONFLICT (nome) DO UPDATE SET
+        custo_medio = CAST(ROUND(
+            (MAX(estoque_qtd, 0) * custo_medio + excluded.estoque_qtd * excluded.custo_medio)
+            / (MAX(estoque_qtd, 0) + excluded.estoque_qtd)) AS INTEGER),
+        estoque_qtd = estoque_qtd + excluded.estoque_qtd
+'''
+
+# IMPORTANTE: Registra compra e calcula o CUSTO MÉDIO PONDERADO.
+# Se eu já tinha 10 itens a R$5 e compro 10 a R$10, o novo custo médio será R$7,50.
+# preco_unit vem em centavos; o custo médio é gravado em milionésimos de real.
+# A média é feita pelo próprio SQLite num único UPSERT, dentro de BEGIN
+# IMMEDIATE: dois terminais comprando o mesmo insumo não perdem atualização.
+# Estoque negativo (vendas sem entrada registrada) não pesa na média.
+# Retorna (compra, insumo) já atualizados.
+def registrar_compra_db(nome, quantidade, preco_unit):
+    _exigir(nome and quantidade > 0 and preco_unit > 0, "Preencha todos os campos corretamente.")
+    preco_unit = int(preco_unit)
+    custo_novo = preco_unit * MICROS_POR_CENTAVO
+    data = int(time.time())
+    with db.transaction(immediate=True) as cur:
+        # Se o insumo não existe é criado; se existe, soma o estoque e refaz a média.
+        cur.execute(_UPSERT_INSUMO_COMPRA + " RETURNING id", (nome, float(quantidade), custo_novo))
+        insumo_id = cur.fetchone()[0]
+        cur.execute(
+            "INSERT INTO compras (nome, quantidade, preco, custo_unit, insumo_id, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (nome, quantidade, preco_unit, custo_novo, insumo_id, data)
+        )
+        compra_id = cur.lastrowid
+        desde = _ultimo_movimento(cur)
+        cur.execute(
+            "INSERT INTO movimentos_estoque (insumo_id, tipo, quantidade, custo_unit, compra_id, data) "
+            "VALUES (?, 'compra', ?, ?, ?, ?)",
+            (insumo_id, float(quantidade), custo_novo, compra_id, data)
+        )
+        _retratar(cur, desde)
+    return obter_compra(compra_id), obter_insumo(insumo_id)
+
+# Corrige quantidade/preço de uma compra já registrada. O estoque e o custo
+# médio do insumo são refeitos a partir do retrato anterior à compra.
+# Se o preço em centavos não mudou (ou veio None), fica o custo exato gravado
+# (ex.: só a quantidade de uma linha de NF-e a R$ 0,0123/g foi corrigida);
+# 'custo' troca o custo já em milionésimos de real, como em _item_compra.
+def update_compra_db(compra_id, quantidade, preco_unit=None, custo=None):
+    _exigir(quantidade > 0, "Quantidade e preço devem ser maiores que zero.")
+    with db.transaction(immediate=True) as cur:
+        row = cur.execute(
+            "SELECT insumo_id, quantidade, preco, COALESCE(custo_unit, preco * ?) FROM compras WHERE id = ?",
+            (MICROS_POR_CENTAVO, compra_id)
+        ).fetchone()
+        if row is None:
+            raise NotFound(f"Compra {compra_id} não encontrada.")
+        if custo is None:
+            mesmo_preco = preco_unit is None or int(preco_unit) == row[2]
+            custo = row[3] if mesmo_preco else int(preco_unit) * MICROS_POR_CENTAVO
+        custo = int(custo)
+        _exigir(custo > 0, "Quantidade e preço devem ser maiores que zero.")
+        cur.execute("UPDATE compras SET quantidade = ?, preco = ?, custo_unit = ? WHERE id = ?",
+                    (float(quantidade), custo_para_centavos(custo), custo, compra_id))
+        movs = cur.execute(
+            "UPDATE movimentos_estoque SET quantidade = ?, custo_unit = ? WHERE compra_id = ? RETURNING insumo_id, id",
+            (float(quantidade), custo, compra_id)
+        ).fetchall()
+        if movs:
+            for insumo_id, mov_id in movs:
+                _refazer_estoque(cur, insumo_id, mov_id)
+        else:
+            # Compra de antes da razão do estoque: só a diferença de quantidade.
+            _ajuste_insumo(cur, row[0], float(quantidade) - float(row[1]))
+    return obter_compra(compra_id), obter_insumo(row[0]) if row[0] else None
+
+# Um item de compra em lote: (nome, quantidade, preco_unit em centavos) ou, com o
+# custo exato, (nome, quantidade, preco_unit, custo em milionésimos de real).
+# Retorna (nome, quantidade, custo).
+def _item_compra(item):
+    nome, qtd, preco, *custo = item
+    return nome, float(qtd), int(custo[0]) if custo else int(preco) * MICROS_POR_CENTAVO
+
+# Total em centavos de itens (nome, quantidade, custo), arredondado por item.
+def _total_compras(itens):
+    return sum(round(qtd * custo / MICROS_POR_CENTAVO) for _, qtd, custo in itens)
+
+# Registra muitas compras de uma vez (nota de fornecedor, planilha): tudo numa
+# transação só, com executemany. Cada linha passa pelo mesmo UPSERT de
+# registrar_compra_db, na ordem recebida, então o custo médio fica igual ao de
+# lançar as compras uma a uma (e ao da razão), mesmo com estoque negativo.
+# 'itens': iterável de (nome, quantidade, preco_unit em centavos[, custo]), ver
+# _item_compra; com o custo exato o preço só é arredondado para exibir.
+# 'data' (epoch, opcional) é a data das compras, por padrão agora.
+# Retorna {"compras": n, "insumos": n, "novos": n, "total": centavos}.
+def registrar_compras_lote(itens, data=None):
+    itens = [_item_compra(item) for item in itens]
+    for n, (nome, qtd, custo) in enumerate(itens, start=1):
+        _exigir(nome and qtd > 0 and custo > 0, f"Item {n} inválido: {nome!r}, {qtd}, {custo}.")
+    if not itens:
+        return {"compras": 0, "insumos": 0, "novos": 0, "total": 0}
+    grupos = dict.fromkeys(nome for nome, _, _ in itens)
+    nomes = json.dumps(list(grupos))
+    with db.transaction(immediate=True) as cur:
+        existentes = cur.execute("SELECT COUNT(*) FROM insumos WHERE nome IN (SELECT value FROM json_each(?))",
+                                 (nomes,)).fetchone()[0]
+        cur.executemany(_UPSERT_INSUMO_COMPRA, itens)
+        ids = dict(cur.execute("SELECT nome, id FROM insumos WHERE nome IN (SELECT value FROM json_each(?))",
+                               (nomes,)).fetchall())
+        ultima_compra = cur.execute("SELECT COALESCE(MAX(id), 0) FROM compras").fetchone()[0]
+        data = int(data if data is not None else time.time())
+        cur.executemany(
+            "INSERT INTO compras (nome, quantidade, preco, custo_unit, insumo_id, data) VALUES (?, ?, ?, ?, ?, ?)",
+            [(nome, qtd, custo_para_centavos(custo), custo, ids[nome], data) for nome, qtd, custo in itens]
+        )
+        # Um movimento por compra na razão e um retrato do estado final de cada insumo.
+        cur.execute('''
+            INSERT INTO movimentos_estoque (insumo_id, tipo, quantidade, custo_unit, compra_id, data)
+            SELECT insumo_id, 'compra', quantidade, custo_unit, id, data FROM compras WHERE id > ?
+        ''', (ultima_compra,))
+        _retratar_insumos(cur, ids.values())
+    return {"compras": len(itens), "insumos": len(grupos), "novos": len(grupos) - existentes,
+            "total": _total_compras(itens)}
+
+def listar_compras():
+    return get_conn().execute("SELECT * FROM compras_texto ORDER BY id DESC").fetchall()
+
+# --- NF-e (notas fiscais de compra) ---
+# A leitura do XML fica em importadores.py; aqui ficam o de-para de produtos,
+# o controle das notas já importadas e a gravação.
+
+# A nota já foi importada? Busca pela chave primária.
+def nfe_ja_importada(chave):
+    return get_conn().execute("SELECT 1 FROM nfe_importadas WHERE chave = ?", (chave,)).fetchone() is not None
+
+# De-para de um fornecedor: {codigo: (insumo_id, nome do insumo, fator)}.
+def mapa_produtos_nfe(cnpj):
+    return {codigo: (insumo_id, nome, fator) for codigo, insumo_id, nome, fator in get_conn().execute('''
+        SELECT p.codigo, p.insumo_id, i.nome, p.fator
+        FROM nfe_produtos p JOIN insumos i ON i.id = p.insumo_id
+        WHERE p.cnpj = ?
+    ''', (cnpj,))}
+
+# Liga (ou religa) o código de produto de um fornecedor a um insumo.
+def mapear_produto_nfe(cnpj, codigo, insumo_id, fator=1.0, descricao=None):
+    _exigir(cnpj and codigo and fator > 0, "Informe CNPJ, código e um fator maior que zero.")
+    try:
+        with db.transaction() as cur:
+            cur.execute('''
+                INSERT INTO nfe_produtos (cnpj, codigo, insumo_id, fator, descricao) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (cnpj, codigo) DO UPDATE SET
+                    insumo_id = excluded.insumo_id, fator = excluded.fator,
+                    descricao = COALESCE(excluded.descricao, descricao)
+            ''', (cnpj, codigo, insumo_id, float(fator), descricao))
+    except sqlite3.IntegrityError:
+        raise NotFound(f"Insumo {insumo_id} não encontrado.")
+
+# Grava várias notas numa transação só: as compras de todas (registrar_compras_lote)
+# e a chave de cada nota. 'notas': [(chave, arquivo, cnpj, [(insumo, qtd, preco, custo)])],
+# itens como em registrar_compras_lote.
+# Notas que outro terminal importou nesse meio-tempo são puladas.
+# Retorna (chaves gravadas, resumo de registrar_compras_lote).
+def registrar_notas_nfe(notas):
+    with db.transaction(immediate=True) as cur:
+        chaves = json.dumps([n[0] for n in notas])
+        ja = {r[0] for r in cur.execute(
+            "SELECT chave FROM nfe_importadas WHERE chave IN (SELECT value FROM json_each(?))", (chaves,))}
+        notas = [n for n in notas if n[0] not in ja]
+        resumo = registrar_compras_lote([item for n in notas for item in n[3]])
+        cur.executemany(
+            "INSERT INTO nfe_importadas (chave, arquivo, cnpj, itens, total) VALUES (?, ?, ?, ?, ?)",
+            [(chave, arquivo, cnpj, len(itens), _total_compras(_item_compra(i) for i in itens))
+             for chave, arquivo, cnpj, itens in notas]
+        )
+    return [n[0] for n in notas], resumo
+
+# Remove uma compra e desfaz o efeito dela no estoque e no custo médio.
+# Retorna o insumo atualizado (ou None se ele não existir mais).
+def delete_compra_db(compra_id):
+    with db.transaction(immediate=True) as cur:
+        row = cur.execute("DELETE FROM compras WHERE id=? RETURNING insumo_id, quantidade", (compra_id,)).fetchone()
+        if row is None:
+            raise NotFound(f"Compra {compra_id} não encontrada.")
+        if not _desfazer_movimentos(cur, "compra_id", compra_id):
+            # Compra de antes da razão do estoque: tira só a quantidade.
+            _ajuste_insumo(cur, row[0], -float(row[1]))
+    return obter_insumo(row[0]) if row[0] else None
+
+# --- PAGINAÇÃO (KEYSET) ---
+# Em vez de OFFSET (que relê tudo o que pula), cada página continua a partir
+# do último id já visto, usando a chave primária:
+#   antes_de  -> ids menores (rolando para baixo)
+#   depois_de -> ids maiores (rolando para cima)
+# A página sempre volta em ordem decrescente de id, como as listagens.
+def _pagina(select, alias, antes_de=None, depois_de=None, limite=200):
+    if depois_de is not None:
+        rows = get_conn().execute(
+            f"{select} WHERE {alias}.id > ? ORDER BY {alias}.id ASC LIMIT ?", (depois_de, limite)
+        ).fetchall()
+        rows.reverse()
+        return rows
+    if antes_de is not None:
+        return get_conn().execute(
+            f"{select} WHERE {alias}.id < ? ORDER BY {alias}.id DESC LIMIT ?", (antes_de, limite)
+        ).fetchall()
+    return get_conn().execute(f"{select} ORDER BY {alias}.id DESC LIMIT ?", (limite,)).fetchall()
+
+# O nome vem do insumo ligado (se ele foi renomeado, o histórico acompanha).
+_SELECT_COMPRAS = """
+    SELECT c.id, COALESCE(i.nome, c.nome), c.quantidade, c.preco,
+           datetime(c.data, 'unixepoch', 'localtime')
+    FROM compras c
+    LEFT JOIN insumos i ON i.id = c.insumo_id
+"""
+
+def obter_compra(compra_id):
+    return get_conn().execute(_SELECT_COMPRAS + " WHERE c.id = ?", (compra_id,)).fetchone()
+
+def listar_compras_pagina(antes_de=None, depois_de=None, limite=200):
+    return _pagina(_SELECT_COMPRAS, "c", antes_de, depois_de, limite)
+
+def contar_compras():
+    return get_conn().execute("SELECT COUNT(*) FROM compras").fetchone()[0]
+
+# Filtro de compras de um insumo num período [dt_ini, dt_fim): faixa do
+# idx_compras_insumo (insumo_id, data), sem varrer compras nem comparar nomes.
+def _filtro_compras_insumo(insumo_id, dt_ini=None, dt_fim=None):
+    where, params = ["c.insumo_id = ?"], [insumo_id]
+    if dt_ini is not None:
+        where.append("c.data >= ?")
+        params.append(_epoch(dt_ini))
+    if dt_fim is not None:
+        where.append("c.data < ?")
+        params.append(_epoch(dt_fim))
+    return " AND ".join(where), params
+
+# Histórico de compras de um insumo, da mais nova para a mais antiga.
+def listar_compras_insumo(insumo_id, dt_ini=None, dt_fim=None, limite=500):
+    where, params = _filtro_compras_insumo(insumo_id, dt_ini, dt_fim)
+    return get_conn().execute(
+        f"{_SELECT_COMPRAS} WHERE {where} ORDER BY c.data DESC, c.id DESC LIMIT ?", params + [limite]
+    ).fetchall()
+
+def _sql_resumo_compras_insumo(insumo_id, dt_ini=None, dt_fim=None):
+    where, params = _filtro_compras_insumo(insumo_id, dt_ini, dt_fim)
+    return (f"SELECT COUNT(*), COALESCE(SUM(c.quantidade), 0), "
+            f"CAST(ROUND(COALESCE(SUM(c.quantidade * COALESCE(c.custo_unit, c.preco * {MICROS_POR_CENTAVO})), 0) "
+            f"/ {MICROS_POR_CENTAVO}) AS INTEGER) FROM compras c WHERE {where}"), params
+
+# Resumo das compras de um insumo no período: (nº de compras, quantidade, total em centavos).
+def resumo_compras_insumo(insumo_id, dt_ini=None, dt_fim=None):
+    sql, params = _sql_resumo_compras_insumo(insumo_id, dt_ini, dt_fim)
+    return report_db.connection().execute(sql, params).fetchone()
+
+# --- CRUD RECEITAS ---
+def add_receita(nome, preco_venda):
+    _exigir(nome and preco_venda > 0, "Preencha o nome e um preço válido.")
+    try:
+        with db.transaction() as cur:
+            cur.execute(
+                "INSERT INTO receitas (nome, preco_venda) VALUES (?, ?)",
+                (nome, int(preco_venda))
+            )
+            receita_id = cur.lastrowid
+    except sqlite3.IntegrityError:
+        raise DuplicateName("Já existe uma receita com esse nome.")
+    return obter_receita(receita_id)
+
+def update_receita_db(receita_id, nome, preco_venda):
+    _exigir(nome and preco_venda > 0, "Nome e preço válidos necessários.")
+    try:
+        with db.transaction() as cur:
+            cur.execute("UPDATE receitas SET nome=?, preco_venda=? WHERE id=?",
+                        (nome, int(preco_venda), receita_id))
+            if cur.rowcount == 0:
+                raise NotFound(f"Receita {receita_id} não encontrada.")
+    except sqlite3.IntegrityError:
+        raise DuplicateName("Já existe uma receita com esse nome.")
+    return obter_receita(receita_id)
+
+# Remove a receita (e, em cascata, as vendas dela). Como em delete_venda_db,
+# a baixa de estoque dessas vendas é desfeita pela razão e os pedidos que
+# ficam sem nenhuma venda vão junto.
+def delete_receita_db(receita_id):
+    with db.transaction(immediate=True) as cur:
+        vendas = cur.execute("SELECT id, pedido_id FROM vendas WHERE receita_id = ?", (receita_id,)).fetchall()
+        pedidos = {pedido_id for _, pedido_id in vendas if pedido_id is not None}
+        cur.execute("DELETE FROM receitas WHERE id = ?", (receita_id,))
+        if cur.rowcount == 0:
+            raise NotFound(f"Receita {receita_id} não encontrada.")
+        if vendas:
+            _desfazer_movimentos(cur, "venda_id", *(venda_id for venda_id, _ in vendas))
+        cur.execute('''
+            DELETE FROM pedidos WHERE id IN (SELECT value FROM json_each(?))
+            AND NOT EXISTS (SELECT 1 FROM vendas WHERE vendas.pedido_id = pedidos.id)
+        ''', (json.dumps(list(pedidos)),))
+
+def listar_receitas():
+    return get_conn().execute("SELECT id, nome, preco_venda, custo_unit FROM receitas ORDER BY nome").fetchall()
+
+def obter_receita(receita_id):
+    return get_conn().execute("SELECT id, nome, preco_venda, custo_unit FROM receitas WHERE id = ?", (receita_id,)).fetchone()
+
+# --- FICHA TÉCNICA ---
+# Unidades conhecidas: grandeza e fator para a menor unidade dela.
+UNIDADES = {
+    "un": ("unidade", 1),
+    "g": ("massa", 1),
+    "kg": ("massa", 1000),
+    "ml": ("volume", 1),
+    "l": ("volume", 1000),
+}
+
+def _unidade(nome):
+    return (nome or "un").strip().lower()
+
+def _mesma_grandeza(de, para):
+    de, para = _unidade(de), _unidade(para)
+    return de in UNIDADES and para in UNIDADES and UNIDADES[de][0] == UNIDADES[para][0]
+
+# Converte uma quantidade entre unidades da mesma grandeza (ex.: 150 g -> 0,15 kg).
+def converter_unidade(qtd, de, para):
+    if _unidade(de) == _unidade(para):
+        return float(qtd)
+    if not _mesma_grandeza(de, para):
+        raise InvalidData(f"Não dá para converter '{_unidade(de)}' em '{_unidade(para)}'.")
+    return float(qtd) * UNIDADES[_unidade(de)][1] / UNIDADES[_unidade(para)][1]
+
+# Itens da ficha técnica: (insumo_id, insumo, quantidade, unidade, qtd_base,
+# unidade do insumo, custo da linha em milionésimos de real).
+def listar_itens_receita(receita_id):
+    return get_conn().execute('''
+        SELECT ri.insumo_id, i.nome, ri.quantidade, ri.unidade, ri.qtd_base, i.unidade,
+               CAST(ROUND(ri.qtd_base * i.custo_medio) AS INTEGER)
+        FROM receita_itens ri
+        JOIN insumos i ON i.id = ri.insumo_id
+        WHERE ri.receita_id = ?
+        ORDER BY i.nome
+    ''', (receita_id,)).fetchall()
+
+# Inclui ou atualiza um insumo na ficha técnica. 'unidade' é a da quantidade
+# digitada (padrão: a do insumo). Retorna a receita com o custo já recalculado.
+def salvar_item_receita(receita_id, insumo_id, quantidade, unidade=None):
+    _exigir(quantidade > 0, "Informe uma quantidade maior que zero.")
+    try:
+        with db.transaction() as cur:
+            row = cur.execute("SELECT unidade FROM insumos WHERE id = ?", (insumo_id,)).fetchone()
+            if row is None:
+                raise NotFound(f"Insumo {insumo_id} não encontrado.")
+            unidade = _unidade(unidade or row[0])
+            qtd_base = converter_unidade(quantidade, unidade, row[0])
+            cur.execute('''
+                INSERT INTO receita_itens (receita_id, insumo_id, quantidade, unidade, qtd_base)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (receita_id, insumo_id) DO UPDATE SET
+                    quantidade = excluded.quantidade,
+                    unidade = excluded.unidade,
+                    qtd_base = excluded.qtd_base
+            ''', (receita_id, insumo_id, float(quantidade), unidade, qtd_base))
+    except sqlite3.IntegrityError:
+        raise NotFound(f"Receita {receita_id} não encontrada.")
+    return obter_receita(receita_id)
+
+# Tira um insumo da ficha técnica. Retorna a receita com o custo recalculado.
+def remover_item_receita(receita_id, insumo_id):
+    with db.transaction() as cur:
+        cur.execute("DELETE FROM receita_itens WHERE receita_id = ? AND insumo_id = ?", (receita_id, insumo_id))
+        if cur.rowcount == 0:
+            raise NotFound("Este insumo não está na ficha técnica.")
+    return obter_receita(receita_id)
+
+# --- ESTOQUE (razão de movimentos e retratos) ---
+# Todo movimento de estoque vira uma linha em movimentos_estoque. A cada
+# SNAPSHOT_A_CADA movimentos de um insumo grava-se um retrato do estado dele,
+# então refazer o estoque (ao apagar ou corrigir uma compra antiga) só percorre
+# os movimentos depois do retrato mais próximo.
+SNAPSHOT_A_CADA = 200
+TIPOS_MOVIMENTO = ("compra", "venda", "ajuste", "perda")
+
+def _ultimo_movimento(cur):
+    return cur.execute("SELECT COALESCE(MAX(id), 0) FROM movimentos_estoque").fetchone()[0]
+
+# Aplica um movimento a (estoque, custo médio), com a mesma conta do UPSERT de
+# registrar_compra_db (ROUND do SQLite: metade para cima).
+def _aplicar_movimento(estoque, custo, tipo, quantidade, custo_unit):
+    if tipo == "compra":
+        peso = max(estoque, 0)
+        custo = math.floor((peso * custo + quantidade * custo_unit) / (peso + quantidade) + 0.5)
+    return estoque + quantidade, custo
+
+# Grava retrato dos insumos mexidos depois do movimento 'desde' que já
+# acumularam SNAPSHOT_A_CADA movimentos desde o último retrato.
+def _retratar(cur, desde):
+    cur.execute('''
+        INSERT OR REPLACE INTO estoque_snapshots (insumo_id, movimento_id, estoque_qtd, custo_medio)
+        SELECT i.id, (SELECT MAX(id) FROM movimentos_estoque WHERE insumo_id = i.id), i.estoque_qtd, i.custo_medio
+        FROM insumos i
+        WHERE i.id IN (SELECT insumo_id FROM movimentos_estoque WHERE id > ?)
+          AND (SELECT COUNT(*) FROM movimentos_estoque m
+               WHERE m.insumo_id = i.id
+                 AND m.id > COALESCE((SELECT MAX(movimento_id) FROM estoque_snapshots s
+                                      WHERE s.insumo_id = i.id), 0)) >= ?
+    ''', (desde, SNAPSHOT_A_CADA))
+
+# Retrato imediato do estado atual dos insumos dados (após uma mudança feita
+# fora da conta movimento a movimento, como troca de unidade ou compra em lote).
+def _retratar_insumos(cur, insumo_ids):
+    cur.execute('''
+        INSERT OR REPLACE INTO estoque_snapshots (insumo_id, movimento_id, estoque_qtd, custo_medio)
+        SELECT i.id, (SELECT COALESCE(MAX(id), 0) FROM movimentos_estoque WHERE insumo_id = i.id),
+               i.estoque_qtd, i.custo_medio
+        FROM insumos i WHERE i.id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(list(insumo_ids)),))
+
+# Estado do insumo recalculado pela razão: parte do último retrato anterior a
+# 'antes_de' (ou do zero) e aplica os movimentos seguintes.
+# Retorna (estoque, custo, retratos [(movimento_id, estoque, custo)] pelo caminho).
+def _estado_pela_razao(cur, insumo_id, antes_de=None):
+    snap = cur.execute('''
+        SELECT movimento_id, estoque_qtd, custo_medio FROM estoque_snapshots
+        WHERE insumo_id = ? AND movimento_id < ?
+        ORDER BY movimento_id DESC LIMIT 1
+    ''', (insumo_id, antes_de if antes_de is not None else 2**62)).fetchone()
+    inicio, estoque, custo = snap or (0, 0.0, 0)
+    retratos = []
+    movs = cur.execute(
+        "SELECT id, tipo, quantidade, custo_unit FROM movimentos_estoque WHERE insumo_id = ? AND id > ? ORDER BY id",
+        (insumo_id, inicio)
+    ).fetchall()
+    for n, (mov_id, tipo, quantidade, custo_unit) in enumerate(movs, start=1):
+        estoque, custo = _aplicar_movimento(estoque, custo, tipo, quantidade, custo_unit)
+        if n % SNAPSHOT_A_CADA == 0:
+            retratos.append((mov_id, estoque, custo))
+    return estoque, custo, retratos
+
+# Refaz estoque e custo médio de um insumo depois que os movimentos a partir
+# de 'desde_mov' mudaram: descarta os retratos dali em diante e recalcula.
+def _refazer_estoque(cur, insumo_id, desde_mov):
+    cur.execute("DELETE FROM estoque_snapshots WHERE insumo_id = ? AND movimento_id >= ?", (insumo_id, desde_mov))
+    estoque, custo, retratos = _estado_pela_razao(cur, insumo_id)
+    cur.executemany(
+        "INSERT INTO estoque_snapshots (insumo_id, movimento_id, estoque_qtd, custo_medio) VALUES (?, ?, ?, ?)",
+        [(insumo_id, *r) for r in retratos]
+    )
+    cur.execute("UPDATE insumos SET estoque_qtd = ?, custo_medio = ? WHERE id = ?", (estoque, custo, insumo_id))
+
+# Apaga os movimentos de uma ou mais compras ou vendas (coluna = 'compra_id'/
+# 'venda_id') e refaz os insumos afetados. Retorna quantos movimentos foram apagados.
+def _desfazer_movimentos(cur, coluna, *origem_ids):
+    apagados = cur.execute(
+        f"DELETE FROM movimentos_estoque WHERE {coluna} IN (SELECT value FROM json_each(?)) RETURNING insumo_id, id",
+        (json.dumps(origem_ids),)
+    ).fetchall()
+    primeiro = {}
+    for insumo_id, mov_id in apagados:
+        primeiro[insumo_id] = min(mov_id, primeiro.get(insumo_id, mov_id))
+    for insumo_id, mov_id in primeiro.items():
+        _refazer_estoque(cur, insumo_id, mov_id)
+    return len(apagados)
+
+# Soma ao estoque os movimentos gravados depois de 'desde' (que não sejam
+# compras, essas já atualizam o insumo no UPSERT) num único UPDATE ... FROM.
+def _aplicar_movimentos(cur, desde):
+    cur.execute('''
+        UPDATE insumos SET estoque_qtd = estoque_qtd + m.qtd
+        FROM (
+            SELECT insumo_id, SUM(quantidade) AS qtd FROM movimentos_estoque
+            WHERE id > ? AND tipo <> 'compra'
+            GROUP BY insumo_id
+        ) AS m
+        WHERE insumos.id = m.insumo_id
+    ''', (desde,))
+    _retratar(cur, desde)
+
+def _ajuste_insumo(cur, insumo_id, quantidade):
+    if insumo_id and quantidade:
+        desde = _ultimo_movimento(cur)
+        cur.execute("INSERT INTO movimentos_estoque (insumo_id, tipo, quantidade) VALUES (?, 'ajuste', ?)",
+                    (insumo_id, quantidade))
+        _aplicar_movimentos(cur, desde)
+
+# Ajuste de inventário ou perda (quebra, vencimento). 'quantidade' com sinal:
+# positiva entra, negativa sai (perda sempre sai). Retorna o insumo atualizado.
+def registrar_movimento(insumo_id, tipo, quantidade):
+    _exigir(tipo in ("ajuste", "perda"), "Tipo de movimento inválido.")
+    _exigir(quantidade, "Informe uma quantidade diferente de zero.")
+    if tipo == "perda":
+        quantidade = -abs(quantidade)
+    try:
+        with db.transaction(immediate=True) as cur:
+            desde = _ultimo_movimento(cur)
+            cur.execute("INSERT INTO movimentos_estoque (insumo_id, tipo, quantidade) VALUES (?, ?, ?)",
+                        (insumo_id, tipo, float(quantidade)))
+            _aplicar_movimentos(cur, desde)
+    except sqlite3.IntegrityError:
+        raise NotFound(f"Insumo {insumo_id} não encontrado.")
+    return obter_insumo(insumo_id)
+
+# Movimentos de um insumo, do mais novo para o mais antigo.
+def listar_movimentos(insumo_id, limite=200):
+    return get_conn().execute('''
+        SELECT id, tipo, quantidade, custo_unit, compra_id, venda_id,
+               datetime(data, 'unixepoch', 'localtime')
+        FROM movimentos_estoque WHERE insumo_id = ?
+        ORDER BY id DESC LIMIT ?
+    ''', (insumo_id, limite)).fetchall()
+
+# Confere cada insumo contra a razão (último retrato + movimentos seguintes).
+# Retorna [(insumo_id, nome, (estoque, custo) gravado, (estoque, custo) pela razão)]
+# dos que divergem; lista vazia = tudo certo.
+def conferir_estoque():
+    cur = get_conn().cursor()
+    divergentes = []
+    for insumo_id, nome, estoque, custo in cur.execute(
+            "SELECT id, nome, estoque_qtd, custo_medio FROM insumos").fetchall():
+        est_r, custo_r, _ = _estado_pela_razao(cur, insumo_id)
+        if abs((estoque or 0) - est_r) > 1e-6 or (custo or 0) != custo_r:
+            divergentes.append((insumo_id, nome, (estoque, custo), (est_r, custo_r)))
+    return divergentes
+
+# Tira do estoque os insumos das receitas vendidas. Os itens vão como JSON
+# [[venda_id, receita_id, quantidade], ...]; a ficha técnica é somada por
+# insumo dentro do SQLite (INSERT ... SELECT na razão) e cada insumo recebe
+# um único UPDATE ... FROM, seja uma venda de um lanche ou um pedido com vários.
+def _baixar_estoque(cur, itens):
+    desde = _ultimo_movimento(cur)
+    cur.execute('''
+        INSERT INTO movimentos_estoque (insumo_id, tipo, quantidade, venda_id)
+        SELECT ri.insumo_id, 'venda', -SUM(ri.qtd_base * json_extract(j.value, '$[2]')),
+               json_extract(j.value, '$[0]')
+        FROM json_each(?) j
+        JOIN receita_itens ri ON ri.receita_id = json_extract(j.value, '$[1]')
+        GROUP BY json_extract(j.value, '$[0]'), ri.insumo_id
+    ''', (json.dumps([[int(v), int(r), int(q)] for v, r, q in itens]),))
+    _aplicar_movimentos(cur, desde)
+
+# --- LÓGICA DE VENDAS ---
+# Toda venda pertence a um pedido: cada linha de vendas é um item do pedido
+# (uma receita, quantidade e preço) e o pedido guarda os totais do ticket,
+# mantidos pelos gatilhos de _criar_gatilhos_pedidos.
+
+# (total bruto, custo, lucro líquido) de uma linha de venda, em centavos.
+def _valores_venda(custo_unit, quantidade, preco_unit, taxa_plataforma):
+    total_bruto = int(preco_unit) * quantidade
+    custo_total = custo_para_centavos(custo_unit * quantidade)
+    return total_bruto, custo_total, total_bruto - aplicar_fracao(total_bruto, taxa_plataforma) - custo_total
+
+def _exigir_itens_pedido(itens, taxa_plataforma, nome="Pedido"):
+    _exigir(0 <= taxa_plataforma <= 1, "A taxa da plataforma deve ficar entre 0 e 100%.")
+    _exigir(itens and all(int(q) > 0 and p > 0 for _, q, p in itens),
+            f"{nome}: verifique quantidades e preços dos itens.")
+
+# Grava pedidos dentro da transação 'cur': um executemany para os pedidos, outro
+# para as vendas (uma por item) e uma baixa de estoque só para tudo. Os custos
+# vêm de receitas.custo_unit pela chave primária (não percorre a ficha técnica).
+# 'pedidos': [(pedido_externo ou None, data epoch, [(receita_id, quantidade, preco_unit)])].
+# Retorna os ids dos pedidos (na ordem recebida) e {"pedidos", "vendas", "total", "lucro"}.
+def _gravar_pedidos(cur, origem, pedidos, taxa_plataforma):
+    receitas = json.dumps(sorted({r for _, _, itens in pedidos for r, _, _ in itens}))
+    custos = dict(cur.execute("SELECT id, custo_unit FROM receitas WHERE id IN (SELECT value FROM json_each(?))",
+                              (receitas,)))
+    for _, _, itens in pedidos:
+        for receita_id, _, _ in itens:
+            if receita_id not in custos:
+                raise NotFound(f"Receita {receita_id} não encontrada.")
+
+    # AUTOINCREMENT: os ids gravados agora são todos maiores que o último de antes.
+    ultimo_pedido = cur.execute("SELECT COALESCE(MAX(id), 0) FROM pedidos").fetchone()[0]
+    cur.executemany("INSERT INTO pedidos (origem, pedido_externo, data) VALUES (?, ?, ?)",
+                    [(origem, externo, data) for externo, data, _ in pedidos])
+    ids = [r[0] for r in cur.execute("SELECT id FROM pedidos WHERE id > ? ORDER BY id", (ultimo_pedido,))]
+
+    resumo = {"pedidos": len(pedidos), "vendas": 0, "total": 0, "lucro": 0}
+    linhas = []
+    for pedido_id, (_, data, itens) in zip(ids, pedidos):
+        for receita_id, quantidade, preco_unit in itens:
+            quantidade = int(quantidade)
+            bruto, custo, lucro = _valores_venda(custos[receita_id], quantidade, preco_unit, taxa_plataforma)
+            linhas.append((receita_id, quantidade, int(preco_unit), float(taxa_plataforma),
+                           bruto, custo, lucro, data, pedido_id))
+            resumo["total"] += bruto
+            resumo["lucro"] += lucro
+    ultima_venda = cur.execute("SELECT COALESCE(MAX(id), 0) FROM vendas").fetchone()[0]
+    cur.executemany('''
+        INSERT INTO vendas (receita_id, quantidade, preco_unit, taxa_plataforma, total_bruto,
+                            custo_total, lucro_liquido, data, pedido_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', linhas)
+    resumo["vendas"] = len(linhas)
+    _baixar_estoque(cur, cur.execute("SELECT id, receita_id, quantidade FROM vendas WHERE id > ?",
+                                     (ultima_venda,)).fetchall())
+    return ids, resumo
+
+# Registra um pedido inteiro (vários itens) numa única transação de escrita.
+# Calcula o lucro líquido de cada item subtraindo a taxa da plataforma (iFood,
+# etc) e o custo dos insumos pela ficha técnica, e dá baixa no estoque.
+# 'itens': [(receita_id, quantidade, preco_unit em centavos)]; taxa_plataforma
+# é uma fração (0.12 = 12%). Retorna (pedido, [vendas do pedido]) nos formatos
+# de obter_pedido() e listar_vendas().
+def registrar_pedido(itens, taxa_plataforma=0.0, origem="balcao", pedido_externo=None):
+    itens = [(r, int(q), int(p)) for r, q, p in itens]
+    _exigir_itens_pedido(itens, taxa_plataforma)
+    with db.transaction(immediate=True) as cur:
+        ids, _ = _gravar_pedidos(cur, origem, [(pedido_externo, int(time.time()), itens)], taxa_plataforma)
+    return obter_pedido(ids[0]), listar_vendas_pedido(ids[0])
+
+# Vários pedidos de uma mesma origem numa única transação (cargas em lote,
+# gerar_dados.py). 'pedidos': [(pedido_externo ou None, data epoch, itens)].
+# Retorna (ids dos pedidos, {"pedidos", "vendas", "total", "lucro"}).
+def registrar_pedidos_lote(pedidos, taxa_plataforma=0.0, origem="balcao"):
+    pedidos = [(externo, int(data), [(r, int(q), int(p)) for r, q, p in itens]) for externo, data, itens in pedidos]
+    for externo, _, itens in pedidos:
+        _exigir_itens_pedido(itens, taxa_plataforma, f"Pedido {externo or ''}".strip())
+    if not pedidos:
+        return [], {"pedidos": 0, "vendas": 0, "total": 0, "lucro": 0}
+    with db.transaction(immediate=True) as cur:
+        return _gravar_pedidos(cur, origem, pedidos, taxa_plataforma)
+
+# Venda avulsa de uma receita: um pedido de um item só.
+# Retorna a venda gravada, no formato de listar_vendas().
+def registrar_venda(receita_id, quantidade, preco_unit, taxa_plataforma):
+    _exigir(int(quantidade) > 0 and preco_unit > 0 and 0 <= taxa_plataforma <= 1,
+            "Verifique quantidade, preço e taxa.")
+    _, vendas = registrar_pedido([(receita_id, quantidade, preco_unit)], taxa_plataforma)
+    return vendas[0]
+
+# Faz um JOIN para pegar o nome da receita através do ID salvo na venda
+_SELECT_VENDAS = """
+    SELECT v.id, r.nome, v.quantidade, v.preco_unit, v.taxa_plataforma,
+           v.total_bruto, v.custo_total, v.lucro_liquido,
+           datetime(v.data, 'unixepoch', 'localtime'), v.pedido_id
+    FROM vendas v
+    JOIN receitas r ON r.id = v.receita_id
+"""
+
+def listar_vendas():
+    return get_conn().execute(_SELECT_VENDAS + " ORDER BY v.id DESC").fetchall()
+
+def obter_venda(venda_id):
+    return get_conn().execute(_SELECT_VENDAS + " WHERE v.id = ?", (venda_id,)).fetchone()
+
+def listar_vendas_pedido(pedido_id):
+    return get_conn().execute(_SELECT_VENDAS + " WHERE v.pedido_id = ? ORDER BY v.id", (pedido_id,)).fetchall()
+
+def listar_vendas_pagina(antes_de=None, depois_de=None, limite=200):
+    return _pagina(_SELECT_VENDAS, "v", antes_de, depois_de, limite)
+
+# Total de vendas sem contar linha a linha: soma os contadores do resumo diário.
+def contar_vendas():
+    return get_conn().execute("SELECT COALESCE(SUM(qtd_vendas), 0) FROM vendas_diario").fetchone()[0]
+
+def obter_pedido(pedido_id):
+    return get_conn().execute('''
+        SELECT id, origem, pedido_externo, itens, total_bruto, custo_total, lucro_liquido,
+               datetime(data, 'unixepoch', 'localtime')
+        FROM pedidos WHERE id = ?
+    ''', (pedido_id,)).fetchone()
+
+# Remove uma venda e desfaz a baixa de estoque dela (pela razão do estoque).
+# O pedido vai junto com a última venda dele (e, se veio de um aplicativo,
+# pode ser importado de novo).
+def delete_venda_db(venda_id):
+    with db.transaction(immediate=True) as cur:
+        row = cur.execute("DELETE FROM vendas WHERE id=? RETURNING pedido_id", (venda_id,)).fetchone()
+        if row is None:
+            raise NotFound(f"Venda {venda_id} não encontrada.")
+        _desfazer_movimentos(cur, "venda_id", venda_id)
+        if row[0] is not None:
+            cur.execute("DELETE FROM pedidos WHERE id = ? AND NOT EXISTS (SELECT 1 FROM vendas WHERE pedido_id = ?)",
+                        (row[0], row[0]))
+
+# --- PEDIDOS DOS APLICATIVOS (delivery) ---
+# A leitura dos arquivos exportados fica em importadores.py; aqui ficam os
+# apelidos das receitas em cada plataforma e a gravação dos pedidos.
+
+# Apelidos de uma plataforma: {apelido: receita_id}.
+def mapa_aliases_receitas(origem):
+    return dict(get_conn().execute("SELECT alias, receita_id FROM receita_aliases WHERE origem = ?", (origem,)))
+
+# Liga (ou religa) o nome de um item na plataforma a uma receita.
+def mapear_alias_receita(origem, alias, receita_id):
+    _exigir(origem and alias, "Informe a plataforma e o nome do item.")
+    try:
+        with db.transaction() as cur:
+            cur.execute('''
+                INSERT INTO receita_aliases (origem, alias, receita_id) VALUES (?, ?, ?)
+                ON CONFLICT (origem, alias) DO UPDATE SET receita_id = excluded.receita_id
+            ''', (origem, alias, receita_id))
+    except sqlite3.IntegrityError:
+        raise NotFound(f"Receita {receita_id} não encontrada.")
+
+_SQL_PEDIDOS_IMPORTADOS = '''
+    SELECT pedido_externo FROM pedidos
+    WHERE origem = ? AND pedido_externo IN (SELECT value FROM json_each(?))
+'''
+
+# Quais destes números de pedido da plataforma já estão gravados (índice único).
+def pedidos_ja_importados(origem, externos):
+    return {r[0] for r in get_conn().execute(_SQL_PEDIDOS_IMPORTADOS, (origem, json.dumps(list(externos))))}
+
+# Grava pedidos de uma plataforma numa transação só (ver _gravar_pedidos).
+# 'pedidos': [(número do pedido, data epoch, [(receita_id, quantidade, preco_unit)])].
+# A taxa da plataforma (fração) vale para todos. Pedidos que já estão gravados
+# (ou que outro terminal importou nesse meio-tempo) são pulados.
+# Retorna (números gravados, {"pedidos", "vendas", "total", "lucro"}).
+def registrar_pedidos_importados(origem, pedidos, taxa_plataforma=0.0):
+    _exigir(origem, "Informe a plataforma.")
+    for externo, _, itens in pedidos:
+        _exigir(externo, "Pedido sem número.")
+        _exigir_itens_pedido(itens, taxa_plataforma, f"Pedido {externo!r}")
+    with db.transaction(immediate=True) as cur:
+        ja = {r[0] for r in cur.execute(_SQL_PEDIDOS_IMPORTADOS, (origem, json.dumps([p[0] for p in pedidos])))}
+        novos = {}
+        for externo, data, itens in pedidos:
+            if externo not in ja:
+                novos.setdefault(externo, (externo, data, itens))
+        if not novos:
+            return [], {"pedidos": 0, "vendas": 0, "total": 0, "lucro": 0}
+        _, resumo = _gravar_pedidos(cur, origem, list(novos.values()), taxa_plataforma)
+    return list(novos), resumo
+
+# --- CONSULTAS DE RELATÓRIO ---
+# Datetime (hora local) ou epoch -> epoch inteiro, para os parâmetros de data.
+def _epoch(dt):
+    if isinstance(dt, datetime):
+        return int(dt.timestamp())
+    return int(dt)
+
+# Monta o SQL de agregação de vendas num intervalo [dt_ini, dt_fim).
+# As datas podem ser datetime (hora local) ou epoch.
+def _sql_agg_vendas(dt_ini=None, dt_fim=None):
+    sql = "SELECT COUNT(*), SUM(quantidade), SUM(total_bruto), SUM(lucro_liquido) FROM vendas WHERE 1=1"
+    params = []
+    if dt_ini is not None:
+        sql += " AND data >= ?"
+        params.append(_epoch(dt_ini))
+    if dt_fim is not None:
+        sql += " AND data < ?"
+        params.append(_epoch(dt_fim))
+    return sql, params
+
+# Janelas padrão dos cartões de relatório: (título, início, fim) como datetime
+# em hora local. None deixa o lado do intervalo em aberto.
+def janelas_padrao(agora=None):
+    agora = agora or datetime.now()
+    hoje_ini = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+    amanha_ini = hoje_ini + timedelta(days=1)
+    d7_ini = hoje_ini - timedelta(days=6)
+    d30_ini = hoje_ini - timedelta(days=29)
+    return [
+        ("Hoje", hoje_ini, amanha_ini),
+        ("Últimos 7 dias", d7_ini, amanha_ini),
+        ("Últimos 30 dias", d30_ini, amanha_ini),
+        ("Geral", None, None),
+    ]
+
+# Janela que começa e termina à meia-noite pode ser respondida pelo resumo diário.
+def _alinhada_ao_dia(janela):
+    return all(dt is None or (isinstance(dt, datetime) and dt.time() == datetime.min.time())
+               for dt in janela[1:])
+
+# Monta UMA consulta que agrega várias janelas de uma vez, com SUM(CASE ...)
+# por janela. Se todas as janelas têm início, o WHERE limita a leitura à mais
+# antiga delas (usando o índice); se alguma é aberta, lê a tabela toda uma vez.
+# Com resumo=True a leitura é feita em vendas_diario (janelas em dias inteiros).
+def _sql_agg_vendas_janelas(janelas, resumo=False):
+    if resumo:
+        return _sql_janelas(janelas, "vendas_diario", "dia", ("qtd_vendas", "qtd_itens", "total_bruto", "lucro_liquido"),
+                            lambda dt: dt.strftime("%Y-%m-%d"))
+    return _sql_janelas(janelas, "vendas", "data", ("1", "quantidade", "total_bruto", "lucro_liquido"), _epoch)
+
+def _sql_janelas(janelas, tabela, col_data, exprs, corta, filtro=None):
+    colunas = []
+    params = []
+    for _, dt_ini, dt_fim in janelas:
+        conds = []
+        cond_params = []
+        if dt_ini is not None:
+            conds.append(f"{col_data} >= ?")
+            cond_params.append(corta(dt_ini))
+        if dt_fim is not None:
+            conds.append(f"{col_data} < ?")
+            cond_params.append(corta(dt_fim))
+        cond = " AND ".join(conds) or "1"
+        for expr in exprs:
+            colunas.append(f"SUM(CASE WHEN {cond} THEN {expr} ELSE 0 END)")
+            params.extend(cond_params)
+    sql = "SELECT " + ", ".join(colunas) + f" FROM {tabela}"
+    where = [filtro] if filtro else []
+    if janelas and all(j[1] is not None for j in janelas):
+        where.append(f"{col_data} >= ?")
+        params.append(corta(min(j[1] for j in janelas)))
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql, params
+
+# Agregados por ticket (pedido) das mesmas janelas, numa leitura de pedidos
+# pelo índice de cobertura idx_pedidos_data (data, total_bruto, lucro_liquido, itens).
+# Pedidos sem itens (sobras de bancos antigos) não contam como ticket.
+def _sql_agg_pedidos_janelas(janelas):
+    return _sql_janelas(janelas, "pedidos", "data", ("1", "itens", "total_bruto", "lucro_liquido"), _epoch,
+                        filtro="itens > 0")
+
+# Retorna {nome: (qtd_pedidos, qtd_itens, faturamento, lucro, ticket_medio)}.
+def agg_pedidos_janelas(janelas):
+    if not janelas:
+        return {}
+    sql, params = _sql_agg_pedidos_janelas(janelas)
+    row = report_db.connection().execute(sql, params).fetchone()
+    res = {}
+    for i, (nome, _, _) in enumerate(janelas):
+        qtd, itens, bruto, lucro = (v or 0 for v in row[i * 4:i * 4 + 4])
+        res[nome] = (qtd, itens, bruto, lucro, (bruto + qtd // 2) // qtd if qtd else 0)
+    return res
+
+# Agrega as vendas de um único intervalo [dt_ini, dt_fim) direto da tabela.
+# Retorna (qtd_vendas, qtd_itens, faturamento, lucro).
+def agg_vendas(dt_ini=None, dt_fim=None):
+    sql, params = _sql_agg_vendas(dt_ini, dt_fim)
+    row = report_db.connection().execute(sql, params).fetchone()
+    if not row or row[0] is None:
+        return 0, 0, 0, 0
+    return row[0] or 0, row[1] or 0, row[2] or 0, row[3] or 0
+
+# Agrega qualquer lista de janelas nomeadas numa única leitura.
+# Retorna {nome: (qtd_vendas, qtd_itens, faturamento, lucro)} na ordem recebida.
+# Janelas em dias inteiros (o caso dos cartões) leem o resumo vendas_diario;
+# qualquer outra cai na tabela de vendas.
+def agg_vendas_janelas(janelas):
+    if not janelas:
+        return {}
+    sql, params = _sql_agg_vendas_janelas(janelas, resumo=all(_alinhada_ao_dia(j) for j in janelas))
+    row = report_db.connection().execute(sql, params).fetchone()
+    res = {}
+    for i, (nome, _, _) in enumerate(janelas):
+        qtd, itens, bruto, lucro = row[i * 4:i * 4 + 4]
+        res[nome] = (qtd or 0, itens or 0, bruto or 0, lucro or 0)
+    return res
+
+# Cartões de relatório: vendas e tickets das mesmas janelas.
+# Retorna {nome: (qtd_vendas, qtd_itens, faturamento, lucro, qtd_pedidos, ticket_medio)}.
+def agg_relatorio_janelas(janelas):
+    vendas, pedidos = agg_vendas_janelas(janelas), agg_pedidos_janelas(janelas)
+    return {nome: vendas[nome] + (pedidos[nome][0], pedidos[nome][4]) for nome in vendas}
+
+# Consultas que precisam usar índice, com o índice esperado em cada uma.
+def _consultas_indexadas():
+    ini, fim = datetime(2000, 1, 1), datetime(2000, 1, 2)
+    return [
+        ("vendas por período", *_sql_agg_vendas(ini, fim), "idx_vendas_data"),
+        ("relatório multi-janela", *_sql_agg_vendas_janelas(janelas_padrao()[:3]), "idx_vendas_data"),
+        ("resumo diário", *_sql_agg_vendas_janelas(janelas_padrao()[:3], resumo=True), "PRIMARY KEY"),
+        ("vendas por receita", "SELECT COUNT(*) FROM vendas WHERE receita_id = ?", [1], "idx_vendas_receita"),
+        ("compras de um insumo", *_sql_resumo_compras_insumo(1, ini, fim), "idx_compras_insumo"),
+        ("movimentos de um insumo", "SELECT quantidade FROM movimentos_estoque WHERE insumo_id = ? AND id > ?",
+         [1, 0], "idx_movimentos_insumo"),
+        ("custo da receita na venda", "SELECT custo_unit FROM receitas WHERE id = ?", [1], "PRIMARY KEY"),
+        ("receitas que usam um insumo", "SELECT receita_id FROM receita_itens WHERE insumo_id = ?", [1],
+         "idx_receita_itens_insumo"),
+        ("pedido já importado", _SQL_PEDIDOS_IMPORTADOS, ["ifood", '["1"]'], "idx_pedidos_externo"),
+        ("vendas de um pedido", "SELECT id FROM vendas WHERE pedido_id = ?", [1], "idx_vendas_pedido"),
+        ("tickets por período", *_sql_agg_pedidos_janelas(janelas_padrao()[:3]), "COVERING INDEX idx_pedidos_data"),
+        ("compras por período", "SELECT COUNT(*), SUM(quantidade * preco) FROM compras WHERE data >= ? AND data < ?",
+         [_epoch(ini), _epoch(fim)], "idx_compras_data"),
+    ]
+
+# Roda EXPLAIN QUERY PLAN nas consultas acima e devolve as que NÃO usam o
+# índice esperado (lista vazia = tudo certo). Serve para pegar regressões,
+# por exemplo alguém voltar a escrever datetime(data) no WHERE.
+def verificar_planos():
+    conn = get_conn()
+    falhas = []
+    for nome, sql, params, indice in _consultas_indexadas():
+        plano = [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        if not any(indice in linha for linha in plano):
+            falhas.append((nome, plano))
+    return falhas
+
+# --- FUNÇÕES UTILITÁRIAS ---
+# Formata centavos (inteiro) no padrão brasileiro: 123456 -> "R$ 1.234,56"
+def fmt_money(centavos):
+    try:
+        centavos = int(centavos)
+    except (TypeError, ValueError):
+        return f"R$ {centavos}"
+    sinal = "-" if centavos < 0 else ""
+    reais, cent = divmod(abs(centavos), 100)
+    return f"R$ {sinal}{reais:,}".replace(",", ".") + f",{cent:02d}"
+
+def fmt_qty(val):
+    try:
+        return f"{float(val):.3f}".replace(".", ",")
+    except Exception:
+        return f"{val}"
+
+# --- LINHA DE COMANDO ---
+# Tarefas de manutenção, sem abrir a janela:
+#   python backend.py verificar-planos   -> confere se as consultas usam os índices
+#   python backend.py reconstruir-resumo -> recalcula vendas_diario a partir das vendas
+#   python backend.py migrar             -> só prepara/migra o banco, mostrando o progresso
+#   python backend.py conferir-estoque   -> compara o estoque de cada insumo com a razão
+COMANDOS = ["verificar-planos", "reconstruir-resumo", "migrar", "conferir-estoque"]
+
+# Mostra no terminal o andamento das migrações em lotes.
+def progresso_migracao(tabela, feitas, total):
+    print(f"Migrando datas de {tabela}: {feitas}/{total}", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BRAV'US BURGUER - manutenção do banco")
+    parser.add_argument("comando", choices=COMANDOS)
+    args = parser.parse_args(argv)
+
+    init_db(progresso=progresso_migracao) # Garante que o banco existe
+    try:
+        if args.comando == "verificar-planos":
+            falhas = verificar_planos()
+            for nome, plano in falhas:
+                print(f"[FALHA] {nome}: " + " | ".join(plano))
+            print("Planos OK." if not falhas else f"{len(falhas)} consulta(s) sem índice.")
+            return 1 if falhas else 0
+        if args.comando == "migrar":
+            print(f"Banco atualizado (esquema versão {schema_version()}).")
+            return 0
+        if args.comando == "conferir-estoque":
+            divergentes = conferir_estoque()
+            for insumo_id, nome, gravado, razao in divergentes:
+                print(f"[DIVERGE] {insumo_id} {nome}: gravado {gravado}, pela razão {razao}")
+            print("Estoque OK." if not divergentes else f"{len(divergentes)} insumo(s) divergente(s).")
+            return 1 if divergentes else 0
+        if args.comando == "reconstruir-resumo":
+            print(f"Resumo diário reconstruído: {rebuild_vendas_diario()} linha(s).")
+            return 0
+    finally:
+        db.close_all()
+        report_db.close_all()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# arquivo: benchmark.py
+# Mede as operações principais do sistema num banco grande (de preferência
+# gerado por gerar_dados.py): listagens, relatórios e a vazão de vendas e
+# compras. Roda numa cópia do banco (as medidas de escrita gravam vendas e
+# compras de verdade), grava o resultado em JSON e compara com uma medição
+# anterior salva como referência para pegar regressões.
+#   python benchmark.py bravus_teste.db --salvar-base base.json
+#   python benchmark.py bravus_teste.db --comparar base.json [--tolerancia 0.2] [--saida atual.json]
+
+# --- IMPORTAÇÕES ---
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import platform
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import backend
+from backend import (
+    usar_banco, init_db, db, report_db,
+    listar_vendas, listar_vendas_pagina, listar_compras, listar_compras_pagina,
+    agg_vendas, agg_vendas_janelas, agg_relatorio_janelas, janelas_padrao,
+    registrar_venda, registrar_pedido, registrar_compra_db,
+)
+
+# --- MEDIÇÃO ---
+# Percentil pelo método do posto mais próximo (amostras já ordenadas).
+def percentil(ordenadas, p):
+    return ordenadas[max(0, min(len(ordenadas) - 1, round(p / 100 * len(ordenadas) + 0.5) - 1))]
+
+def _estatisticas(tempos):
+    ordenadas = sorted(tempos)
+    return {
+        "repeticoes": len(ordenadas),
+        "min_ms": ordenadas[0] * 1000,
+        "mediana_ms": percentil(ordenadas, 50) * 1000,
+        "p95_ms": percentil(ordenadas, 95) * 1000,
+        "media_ms": sum(ordenadas) / len(ordenadas) * 1000,
+    }
+
+# Roda fn 'repeticoes' vezes (depois de uma rodada de aquecimento), parando
+# antes se já passou de 'tempo_max' segundos (listagens enormes).
+def medir_leitura(fn, repeticoes=5, tempo_max=20.0):
+    resultado = fn()
+    tempos = []
+    inicio = time.perf_counter()
+    while len(tempos) < repeticoes and (len(tempos) < 3 or time.perf_counter() - inicio < tempo_max):
+        t = time.perf_counter()
+        resultado = fn()
+        tempos.append(time.perf_counter() - t)
+    medida = _estatisticas(tempos)
+    medida["linhas"] = len(resultado) if isinstance(resultado, (list, dict)) else 1
+    return medida
+
+# Chama fn(i) n vezes seguidas, cada uma é uma operação completa (com commit).
+def medir_vazao(fn, n):
+    tempos = []
+    inicio = time.perf_counter()
+    for i in range(n):
+        t = time.perf_counter()
+        fn(i)
+        tempos.append(time.perf_counter() - t)
+    medida = _estatisticas(tempos)
+    medida["ops_por_s"] = n / (time.perf_counter() - inicio)
+    return medida
+
+# Copia o banco com a API de backup do SQLite (cópia consistente mesmo em WAL).
+def copiar_banco(origem, destino):
+    fonte, copia = sqlite3.connect(origem), sqlite3.connect(destino)
+    try:
+        fonte.backup(copia)
+    finally:
+        copia.close()
+        fonte.close()
+
+def _contagens():
+    conn = backend.get_conn()
+    return {tabela: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabela}").fetchone()[0]
+            for tabela in ("vendas", "pedidos", "compras", "insumos", "receitas")}
+
+# --- SUÍTE ---
+def rodar(caminho, repeticoes=5, n_escritas=300, progresso=print):
+    pasta = tempfile.mkdtemp(prefix="bravus_bench_")
+    copia = os.path.join(pasta, "bench.db")
+    try:
+        copiar_banco(caminho, copia)
+        usar_banco(copia)
+        init_db()
+        conn = backend.get_conn()
+        # Receita com ficha técnica (a venda dá baixa no estoque) e insumo mais comprado
+        receita = conn.execute('''
+            SELECT r.id, r.preco_venda FROM receitas r
+            WHERE EXISTS (SELECT 1 FROM receita_itens ri WHERE ri.receita_id = r.id)
+            ORDER BY r.id LIMIT 1
+        ''').fetchone() or conn.execute("SELECT id, preco_venda FROM receitas ORDER BY id LIMIT 1").fetchone()
+        if receita is None:
+            raise backend.InvalidData("O banco não tem receitas (crie um com gerar_dados.py).")
+        receita_id, preco = receita
+        insumo = conn.execute("SELECT nome, MAX(custo_medio, 100) FROM insumos ORDER BY id LIMIT 1").fetchone()
+        receitas = [r[0] for r in conn.execute("SELECT id FROM receitas ORDER BY id LIMIT 3")]
+
+        resultado = {
+            "versao": 1,
+            "quando": datetime.now().isoformat(timespec="seconds"),
+            "banco": os.path.abspath(caminho),
+            "linhas": _contagens(),
+            "ambiente": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                         "sistema": platform.platform(), "perfil_pragma": backend.PRAGMA_PROFILE},
+            "medidas": {},
+        }
+        agora = datetime.now()
+        ini_30 = agora.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=29)
+        leituras = [
+            ("listar_vendas", listar_vendas),
+            ("listar_vendas_pagina", lambda: listar_vendas_pagina(limite=200)),
+            ("listar_compras", listar_compras),
+            ("listar_compras_pagina", lambda: listar_compras_pagina(limite=200)),
+            ("agg_vendas_30_dias", lambda: agg_vendas(ini_30, agora)),
+            ("agg_vendas_geral", agg_vendas),
+            ("agg_vendas_janelas", lambda: agg_vendas_janelas(janelas_padrao())),
+            # O que a aba de relatórios busca em load_relatorios_data
+            ("load_relatorios_data", lambda: agg_relatorio_janelas(janelas_padrao())),
+        ]
+        for nome, fn in leituras:
+            resultado["medidas"][nome] = medir_leitura(fn, repeticoes)
+            progresso(_linha(nome, resultado["medidas"][nome]))
+
+        if receita_id and n_escritas:
+            escritas = [
+                ("registrar_venda", lambda i: registrar_venda(receita_id, 1, preco, 0.0)),
+                ("registrar_pedido_3_itens", lambda i: registrar_pedido([(r, 1, preco) for r in receitas], 0.12)),
+            ]
+            if insumo:
+                escritas.append(("registrar_compra_db",
+                                 lambda i: registrar_compra_db(insumo[0], 10, max(1, insumo[1] // 10_000))))
+            for nome, fn in escritas:
+                resultado["medidas"][nome] = medir_vazao(fn, n_escritas)
+                progresso(_linha(nome, resultado["medidas"][nome]))
+        return resultado
+    finally:
+        db.close_all()
+        report_db.close_all()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+def _linha(nome, medida):
+    extra = f"  {medida['ops_por_s']:.0f} ops/s" if "ops_por_s" in medida else f"  {medida['linhas']} linhas"
+    return (f"  {nome:<26} mediana {medida['mediana_ms']:10.3f} ms  p95 {medida['p95_ms']:10.3f} ms"
+            f"  ({medida['repeticoes']}x){extra}")
+
+# --- COMPARAÇÃO COM A REFERÊNCIA ---
+# Compara as medianas. Regressão = ficou mais lento que a referência além da
+# tolerância (0.2 = 20%). Retorna (linhas de texto, nomes que regrediram).
+def comparar(atual, base, tolerancia=0.2):
+    linhas = []
+    regressoes = []
+    if atual.get("linhas") != base.get("linhas"):
+        linhas.append(f"Atenção: tamanho do banco diferente da referência ({base.get('linhas')} -> {atual.get('linhas')}).")
+    linhas.append(f"  {'medida':<26} {'referência':>12} {'atual':>12} {'variação':>9}")
+    for nome, medida in atual["medidas"].items():
+        anterior = base.get("medidas", {}).get(nome)
+        if anterior is None:
+            linhas.append(f"  {nome:<26} {'-':>12} {medida['mediana_ms']:10.3f}ms {'nova':>9}")
+            continue
+        variacao = medida["mediana_ms"] / anterior["mediana_ms"] - 1 if anterior["mediana_ms"] else 0.0
+        marca = ""
+        if variacao > tolerancia:
+            marca = "  <-- REGRESSÃO"
+            regressoes.append(nome)
+        linhas.append(f"  {nome:<26} {anterior['mediana_ms']:10.3f}ms {medida['mediana_ms']:10.3f}ms "
+                      f"{variacao * 100:+8.1f}%{marca}")
+    return linhas, regressoes
+
+# --- LINHA DE COMANDO ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BRAV'US BURGUER - benchmark do banco de dados")
+    parser.add_argument("arquivo", help="banco a medir (não é alterado: as medidas rodam numa cópia)")
+    parser.add_argument("--repeticoes", type=int, default=5, help="repetições de cada leitura")
+    parser.add_argument("--escritas", type=int, default=300, help="operações em cada medida de vazão")
+    parser.add_argument("--saida", help="grava o resultado neste JSON")
+    parser.add_argument("--salvar-base", metavar="JSON", help="grava o resultado como referência")
+    parser.add_argument("--comparar", metavar="JSON", help="compara com uma referência salva")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="piora aceita na mediana (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.arquivo):
+        print(f"Banco não encontrado: {args.arquivo}", file=sys.stderr)
+        return 2
+    print(f"Medindo {args.arquivo} ...")
+    try:
+        resultado = rodar(args.arquivo, args.repeticoes, args.escritas)
+    except backend.ServiceError as exc:
+        print(exc, file=sys.stderr)
+        return 2
+    for destino in (args.saida, args.salvar_base):
+        if destino:
+            with open(destino, "w", encoding="utf-8") as arquivo:
+                json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+            print(f"Resultado gravado em {destino}.")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        linhas, regressoes = comparar(resultado, base, args.tolerancia)
+        print(f"Comparação com {args.comparar} (tolerância {args.tolerancia:.0%}):")
+        print("\n".join(linhas))
+        if regressoes:
+            print(f"{len(regressoes)} regressão(ões): {', '.join(regressoes)}")
+            return 1
+        print("Sem regressões.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
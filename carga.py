@@ -0,0 +1,372 @@
+# arquivo: carga.py
+# Simula a sexta à noite: vários caixas e o tablet do delivery gravando no
+# mesmo banco ao mesmo tempo, cada um no seu processo (como terminais de
+# verdade), seguindo uma curva de chegada de pedidos. Um processo de escritório
+# lança compras e abre relatórios no meio do movimento.
+# Mede vazão, latência (p50/p95/p99) e quantas operações esbarraram no lock do
+# SQLite (SQLITE_BUSY / "database is locked"), por operação e por degrau da
+# curva, para ver onde o sistema começa a engasgar e comparar ajustes de
+# journal e de lock (--pragma). Roda numa cópia do banco (--direto grava no
+# próprio arquivo).
+#   python carga.py bravus_teste.db --curva 2,5,10,20,30,10 --passo 20 --caixas 4 --delivery 1
+#   python carga.py bravus_teste.db --pragma busy_timeout=100 --pragma journal_mode=DELETE --saida carga.json
+
+# --- IMPORTAÇÕES ---
+# multiprocessing: um processo por terminal (cada um com a sua conexão, como no salão).
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import platform
+import argparse
+import tempfile
+import multiprocessing
+from datetime import datetime
+
+import backend
+from backend import (
+    usar_banco, init_db, resolve_pragmas, conferir_estoque, ServiceError,
+    registrar_venda, registrar_pedido, registrar_compra_db,
+    agg_relatorio_janelas, janelas_padrao, listar_vendas_pagina,
+)
+from benchmark import copiar_banco, percentil
+from gerar_dados import PESO_ITENS
+
+# Operações que contam como pedido (a curva é de pedidos por segundo).
+OPERACOES_PEDIDO = ("registrar_venda", "registrar_pedido", "registrar_pedido[delivery]")
+TAXA_DELIVERY = 0.12
+
+# --- CURVA DE CHEGADA ---
+# A curva é uma lista de taxas (pedidos por segundo), cada uma valendo por
+# 'passo' segundos: [2, 5, 10] com passo 20 = 1 minuto subindo de 2 a 10/s.
+def ler_curva(texto):
+    curva = [float(t) for t in texto.split(",") if t.strip()]
+    if not curva or any(t < 0 for t in curva):
+        raise ValueError("Curva inválida: use taxas separadas por vírgula (ex.: 2,5,10).")
+    return curva
+
+def _taxa(curva, passo, t):
+    degrau = int(t // passo)
+    return curva[degrau] if degrau < len(curva) else 0.0
+
+# Instantes de chegada (segundos desde o início) de um processo de Poisson com
+# a taxa da curva multiplicada por 'fracao' (a parte deste terminal), pelo
+# método da rejeição: sorteia na taxa máxima e aceita na proporção da taxa do momento.
+def chegadas(rng, curva, passo, fracao):
+    maxima = max(curva) * fracao
+    if maxima <= 0:
+        return []
+    duracao = passo * len(curva)
+    t, tempos = 0.0, []
+    while True:
+        t += rng.expovariate(maxima)
+        if t >= duracao:
+            return tempos
+        if rng.random() * maxima < _taxa(curva, passo, t) * fracao:
+            tempos.append(t)
+
+# --- TERMINAIS ---
+def _itens(rng, cardapio):
+    n = rng.choices(list(PESO_ITENS), weights=list(PESO_ITENS.values()))[0]
+    return [(r, 2 if rng.random() < 0.15 else 1, p) for r, p in rng.sample(cardapio, min(n, len(cardapio)))]
+
+# Agenda de um terminal: [(instante, operação, argumentos)].
+# "caixa" e "delivery" dividem a curva de pedidos; o "escritorio" faz compras e
+# relatórios num ritmo constante (por minuto) durante toda a simulação.
+def agenda(papel, indice, cfg):
+    rng = random.Random(cfg["semente"] * 1000 + indice)
+    curva, passo, cardapio = cfg["curva"], cfg["passo"], cfg["cardapio"]
+    eventos = []
+    if papel == "caixa":
+        fracao = (1 - cfg["fracao_delivery"]) / cfg["caixas"]
+        for t in chegadas(rng, curva, passo, fracao):
+            itens = _itens(rng, cardapio)
+            if len(itens) == 1:
+                eventos.append((t, "registrar_venda", (itens[0][0], itens[0][1], itens[0][2], 0.0)))
+            else:
+                eventos.append((t, "registrar_pedido", (itens,)))
+    elif papel == "delivery":
+        fracao = cfg["fracao_delivery"] / cfg["delivery"]
+        for n, t in enumerate(chegadas(rng, curva, passo, fracao)):
+            eventos.append((t, "registrar_pedido[delivery]", (_itens(rng, cardapio), TAXA_DELIVERY, "ifood",
+                                                              f"CARGA{indice}-{n + 1}")))
+    else:
+        constante = [1.0] * len(curva)
+        if cfg["insumos"]:
+            for t in chegadas(rng, constante, passo, cfg["compras_por_min"] / 60):
+                nome, custo = rng.choice(cfg["insumos"])
+                quantidade = round(rng.uniform(1, 20), 3)
+                preco = max(1, round(custo / backend.MICROS_POR_CENTAVO * rng.uniform(0.9, 1.1)))
+                eventos.append((t, "registrar_compra_db", (nome, quantidade, preco)))
+        for n, t in enumerate(chegadas(rng, constante, passo, cfg["relatorios_por_min"] / 60)):
+            # A aba de relatórios e a primeira página da aba de vendas, alternadas
+            if n % 2 == 0:
+                eventos.append((t, "agg_relatorio_janelas", ()))
+            else:
+                eventos.append((t, "listar_vendas_pagina", ()))
+    eventos.sort(key=lambda e: e[0])
+    return eventos
+
+def _executar(operacao, argumentos):
+    if operacao == "registrar_venda":
+        return registrar_venda(*argumentos)
+    if operacao in ("registrar_pedido", "registrar_pedido[delivery]"):
+        return registrar_pedido(*argumentos)
+    if operacao == "registrar_compra_db":
+        return registrar_compra_db(*argumentos)
+    if operacao == "agg_relatorio_janelas":
+        return agg_relatorio_janelas(janelas_padrao())
+    if operacao == "listar_vendas_pagina":
+        return listar_vendas_pagina(limite=200)
+    raise ValueError(f"Operação desconhecida: {operacao}")
+
+# Lock do SQLite (SQLITE_BUSY, SQLITE_LOCKED e variações) ou outro erro qualquer.
+def _classificar(exc):
+    if isinstance(exc, sqlite3.OperationalError):
+        nome = getattr(exc, "sqlite_errorname", "")
+        if nome.startswith(("SQLITE_BUSY", "SQLITE_LOCKED")) or "locked" in str(exc) or "busy" in str(exc):
+            return "busy"
+    return "erro"
+
+# Corpo de cada processo: abre as conexões, espera o início combinado e
+# segue a agenda. A latência é medida do início ao fim da chamada; o atraso é
+# quanto a operação começou depois do horário dela (o terminal ficou para trás).
+# Operações que nem começaram até 'folga' segundos depois do fim da curva
+# contam como perdidas. Devolve pela fila: [(operação, instante, atraso, latência, situação)].
+def terminal(papel, indice, cfg, inicio, fila):
+    registros, exemplos = [], {}
+    try:
+        usar_banco(cfg["banco"])
+        backend.db.pragmas = resolve_pragmas(cfg["perfil"], **cfg["pragmas"])
+        backend.report_db.pragmas = resolve_pragmas("reporting", **cfg["pragmas"])
+        backend.get_conn()
+        if papel == "escritorio":
+            backend.report_db.connection()
+        limite = inicio + cfg["passo"] * len(cfg["curva"]) + cfg["folga"]
+        for t, operacao, argumentos in agenda(papel, indice, cfg):
+            agendado = inicio + t
+            espera = agendado - time.time()
+            if espera > 0:
+                time.sleep(espera)
+            if time.time() > limite:
+                registros.append((operacao, t, None, None, "perdida"))
+                continue
+            atraso = time.time() - agendado
+            comeco = time.perf_counter()
+            try:
+                _executar(operacao, argumentos)
+                situacao = "ok"
+            except (sqlite3.Error, ServiceError) as e:
+                situacao = _classificar(e)
+                exemplos.setdefault(f"{operacao}: {situacao}", str(e))
+            registros.append((operacao, t, atraso, time.perf_counter() - comeco, situacao))
+    except Exception as e:
+        exemplos.setdefault(f"{papel} {indice}: falha", repr(e))
+    finally:
+        backend.db.close_all()
+        backend.report_db.close_all()
+        fila.put((papel, indice, registros, exemplos))
+
+# --- RESULTADO ---
+def _resumo(registros, duracao):
+    feitos = [r for r in registros if r[4] != "perdida"]
+    latencias = sorted(r[3] for r in feitos if r[4] == "ok")
+    atrasos = sorted(max(r[2], 0.0) for r in feitos)
+    resumo = {
+        "total": len(registros),
+        "ok": len(latencias),
+        "busy": sum(1 for r in feitos if r[4] == "busy"),
+        "erros": sum(1 for r in feitos if r[4] == "erro"),
+        "perdidas": len(registros) - len(feitos),
+        "ops_por_s": len(latencias) / duracao if duracao else 0.0,
+    }
+    if latencias:
+        resumo.update({f"p{p}_ms": percentil(latencias, p) * 1000 for p in (50, 95, 99)})
+        resumo["max_ms"] = latencias[-1] * 1000
+    if atrasos:
+        resumo["atraso_p95_ms"] = percentil(atrasos, 95) * 1000
+    return resumo
+
+# Por degrau da curva: pedidos chegados x atendidos, latência e locks. O degrau
+# "saturou" quando os terminais ficam para trás (atraso p95 acima de um
+# segundo) ou quando alguma operação falhou, esbarrou no lock ou se perdeu.
+def _degraus(registros, curva, passo):
+    degraus = []
+    for i, alvo in enumerate(curva):
+        do_degrau = [r for r in registros if i * passo <= r[1] < (i + 1) * passo]
+        pedidos = [r for r in do_degrau if r[0] in OPERACOES_PEDIDO]
+        resumo = _resumo(pedidos, passo)
+        resumo.update({"degrau": i + 1, "alvo_por_s": alvo,
+                       "busy_todas": sum(1 for r in do_degrau if r[4] == "busy")})
+        resumo["saturou"] = bool(resumo.get("atraso_p95_ms", 0) > 1000 or resumo["busy_todas"]
+                                 or resumo["erros"] or resumo["perdidas"])
+        degraus.append(resumo)
+    return degraus
+
+def rodar(cfg, progresso=print):
+    papeis = ([("caixa", i) for i in range(cfg["caixas"])]
+              + [("delivery", cfg["caixas"] + i) for i in range(cfg["delivery"])]
+              + ([("escritorio", cfg["caixas"] + cfg["delivery"])] if cfg["escritorio"] else []))
+    fila = multiprocessing.Queue()
+    # Folga para todos os processos subirem e abrirem as conexões antes do início
+    inicio = time.time() + 1.0 + 0.2 * len(papeis)
+    processos = [multiprocessing.Process(target=terminal, args=(papel, indice, cfg, inicio, fila), daemon=True)
+                 for papel, indice in papeis]
+    for p in processos:
+        p.start()
+    duracao = cfg["passo"] * len(cfg["curva"])
+    progresso(f"{len(processos)} processos, {duracao:.0f} s de simulação...")
+    # Lê a fila antes do join (um processo não termina com a fila cheia)
+    retornos = [fila.get() for _ in processos]
+    for p in processos:
+        p.join()
+
+    registros = [r for _, _, regs, _ in retornos for r in regs]
+    exemplos = {}
+    for _, _, _, ex in retornos:
+        for chave, mensagem in ex.items():
+            exemplos.setdefault(chave, mensagem)
+    operacoes = {}
+    for nome in sorted({r[0] for r in registros}):
+        operacoes[nome] = _resumo([r for r in registros if r[0] == nome], duracao)
+    return {
+        "operacoes": operacoes,
+        "pedidos": _resumo([r for r in registros if r[0] in OPERACOES_PEDIDO], duracao),
+        "degraus": _degraus(registros, cfg["curva"], cfg["passo"]),
+        "exemplos_erro": exemplos,
+    }
+
+def _ms(resumo, chave):
+    return f"{resumo[chave]:9.1f}" if chave in resumo else f"{'-':>9}"
+
+def relatorio(resultado):
+    linhas = [f"  {'operação':<28}{'ok':>7}{'busy':>6}{'erros':>6}{'perd.':>6}{'ops/s':>8}"
+              f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'máx ms':>9}{'atraso95':>9}"]
+    itens = list(resultado["operacoes"].items()) + [("(todos os pedidos)", resultado["pedidos"])]
+    for nome, r in itens:
+        linhas.append(f"  {nome:<28}{r['ok']:>7}{r['busy']:>6}{r['erros']:>6}{r['perdidas']:>6}"
+                      f"{r['ops_por_s']:8.1f}{_ms(r, 'p50_ms')}{_ms(r, 'p95_ms')}{_ms(r, 'p99_ms')}"
+                      f"{_ms(r, 'max_ms')}{_ms(r, 'atraso_p95_ms')}")
+    linhas.append("")
+    linhas.append(f"  {'degrau':<8}{'alvo/s':>8}{'feito/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                  f"{'atraso95':>9}{'busy':>6}{'erros':>6}{'perd.':>6}")
+    for d in resultado["degraus"]:
+        linhas.append(f"  {d['degrau']:<8}{d['alvo_por_s']:8.1f}{d['ops_por_s']:9.1f}{_ms(d, 'p50_ms')}"
+                      f"{_ms(d, 'p95_ms')}{_ms(d, 'p99_ms')}{_ms(d, 'atraso_p95_ms')}{d['busy_todas']:>6}"
+                      f"{d['erros']:>6}{d['perdidas']:>6}" + ("  <-- saturou" if d["saturou"] else ""))
+    return linhas
+
+# --- LINHA DE COMANDO ---
+def _ler_pragma(texto):
+    nome, _, valor = texto.partition("=")
+    if not nome or not valor:
+        raise argparse.ArgumentTypeError(f"Use nome=valor (ex.: busy_timeout=100), não {texto!r}.")
+    return nome.strip(), int(valor) if valor.strip().lstrip("-").isdigit() else valor.strip()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BRAV'US BURGUER - simulação de movimento com vários terminais")
+    parser.add_argument("arquivo", help="banco a usar (de preferência gerado por gerar_dados.py)")
+    parser.add_argument("--curva", type=ler_curva, default=ler_curva("2,5,10,15,20,10"),
+                        help="pedidos por segundo em cada degrau, separados por vírgula")
+    parser.add_argument("--passo", type=float, default=15.0, help="duração de cada degrau, em segundos")
+    parser.add_argument("--caixas", type=int, default=4, help="processos de caixa (balcão)")
+    parser.add_argument("--delivery", type=int, default=1, help="processos de tablet do delivery")
+    parser.add_argument("--fracao-delivery", type=float, default=0.4, help="parte dos pedidos que vem do delivery")
+    parser.add_argument("--compras-por-min", type=float, default=6.0, help="compras lançadas pelo escritório")
+    parser.add_argument("--relatorios-por-min", type=float, default=6.0, help="relatórios abertos pelo escritório")
+    parser.add_argument("--sem-escritorio", action="store_true", help="só caixas e delivery")
+    parser.add_argument("--perfil", default=backend.PRAGMA_PROFILE, choices=sorted(backend.PRAGMA_PROFILES),
+                        help="perfil de PRAGMA das conexões de escrita")
+    parser.add_argument("--pragma", type=_ler_pragma, action="append", default=[], metavar="NOME=VALOR",
+                        help="troca um PRAGMA em todas as conexões (pode repetir)")
+    parser.add_argument("--folga", type=float, default=10.0,
+                        help="segundos após o fim da curva em que ainda se atende o atrasado")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--direto", action="store_true", help="grava no próprio arquivo em vez de numa cópia")
+    parser.add_argument("--saida", help="grava o resultado neste JSON")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.arquivo):
+        print(f"Banco não encontrado: {args.arquivo} (crie um com gerar_dados.py)", file=sys.stderr)
+        return 2
+    if args.caixas < 0 or args.delivery < 0 or args.caixas + args.delivery == 0:
+        print("Informe pelo menos um caixa ou um delivery.", file=sys.stderr)
+        return 2
+    fracao_delivery = args.fracao_delivery if args.caixas else 1.0
+    fracao_delivery = fracao_delivery if args.delivery else 0.0
+
+    pasta = None
+    caminho = args.arquivo
+    if not args.direto:
+        pasta = tempfile.mkdtemp(prefix="bravus_carga_")
+        caminho = os.path.join(pasta, "carga.db")
+        copiar_banco(args.arquivo, caminho)
+    try:
+        pragmas = dict(args.pragma)
+        # Aplica o journal_mode pedido antes de os terminais abrirem o banco
+        # (sair do WAL exige que ninguém mais esteja conectado).
+        usar_banco(caminho)
+        backend.db.pragmas = resolve_pragmas(args.perfil, **pragmas)
+        init_db()
+        conn = backend.get_conn()
+        cardapio = conn.execute('''
+            SELECT r.id, r.preco_venda FROM receitas r
+            WHERE EXISTS (SELECT 1 FROM receita_itens ri WHERE ri.receita_id = r.id)
+        ''').fetchall() or conn.execute("SELECT id, preco_venda FROM receitas").fetchall()
+        insumos = conn.execute('''
+            SELECT nome, MAX(custo_medio, 10000) FROM insumos
+            WHERE id IN (SELECT insumo_id FROM receita_itens)
+        ''').fetchall()
+        journal = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        backend.db.close_all()
+        backend.report_db.close_all()
+        if not cardapio:
+            print("O banco não tem receitas (crie um com gerar_dados.py).", file=sys.stderr)
+            return 2
+
+        cfg = {
+            "banco": caminho, "curva": args.curva, "passo": args.passo,
+            "caixas": args.caixas, "delivery": args.delivery, "fracao_delivery": fracao_delivery,
+            "escritorio": not args.sem_escritorio, "compras_por_min": args.compras_por_min,
+            "relatorios_por_min": args.relatorios_por_min, "perfil": args.perfil, "pragmas": pragmas,
+            "folga": args.folga, "semente": args.semente,
+            "cardapio": [tuple(r) for r in cardapio], "insumos": [tuple(r) for r in insumos],
+        }
+        print(f"Carga em {args.arquivo}{'' if args.direto else ' (cópia)'}: {args.caixas} caixa(s), "
+              f"{args.delivery} delivery, curva {','.join(f'{t:g}' for t in args.curva)} pedidos/s "
+              f"a cada {args.passo:g} s, journal {journal}, pragmas {pragmas or 'do perfil ' + args.perfil}")
+        resultado = rodar(cfg)
+        usar_banco(caminho)
+        divergentes = conferir_estoque()
+        backend.db.close_all()
+        backend.report_db.close_all()
+    finally:
+        if pasta:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    print("\n".join(relatorio(resultado)))
+    for chave, mensagem in resultado["exemplos_erro"].items():
+        print(f"  [{chave}] {mensagem}")
+    print("Estoque confere com a razão." if not divergentes
+          else f"ATENÇÃO: {len(divergentes)} insumo(s) com estoque divergente da razão.")
+    if args.saida:
+        saida = {
+            "versao": 1,
+            "quando": datetime.now().isoformat(timespec="seconds"),
+            "banco": os.path.abspath(args.arquivo),
+            "config": {k: v for k, v in cfg.items() if k not in ("banco", "cardapio", "insumos")},
+            "ambiente": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                         "sistema": platform.platform(), "journal_mode": journal},
+            "estoque_divergente": len(divergentes),
+            **resultado,
+        }
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(saida, arquivo, indent=2, ensure_ascii=False)
+        print(f"Resultado gravado em {args.saida}.")
+    return 1 if divergentes else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
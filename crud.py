@@ -1,327 +1,281 @@
 # arquivo: berga_buerguers_with_login.py
+# Janelas do sistema (Tkinter). Banco de dados e regras de negócio ficam em
+# backend.py; aqui só se lê a tela, chama o backend e mostra o resultado.
 
 # --- IMPORTAÇÕES ---
 # Importa bibliotecas essenciais:
-# os: para lidar com caminhos de arquivos e sistema operacional.
-# sqlite3: para o banco de dados local.
-# hashlib: para criptografar as senhas (segurança).
+# sys/argparse: para os comandos de manutenção pela linha de comando.
+# concurrent.futures: para rodar consultas fora da thread da janela.
 # tkinter: biblioteca padrão do Python para criar as janelas visuais.
-# datetime/decimal: para lidar com datas e cálculos monetários precisos.
-import os
-import sqlite3
-import hashlib
+# backend: banco de dados, regras de negócio e formatação de valores.
+# importadores: importação de planilhas de compras.
+# diagnostico: cronômetro das consultas (aba escondida "Diagnóstico").
+# rastreio: rastro de cada ação da tela (banco, formatação e desenho).
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import *
-from tkinter import ttk, messagebox, simpledialog
-from datetime import datetime, timedelta
-from decimal import Decimal, InvalidOperation
-
-# --- CONFIGURAÇÃO DO BANCO DE DADOS ---
-# Define onde o arquivo do banco de dados (bravus.db) será salvo.
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "bravus.db")
-
-# --- FUNÇÕES DE BANCO DE DADOS (BACKEND) ---
-
-# Função para conectar ao banco. Ativa 'foreign_keys' para garantir integridade entre tabelas.
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
-
-# Função de Segurança: Transforma a senha digitada em um código hash (SHA256).
-# Isso evita salvar a senha pura no banco de dados.
-def _hash_pwd(pwd: str) -> str:
-    return hashlib.sha256(pwd.encode("utf-8")).hexdigest()
-
-# Inicializa o banco de dados. Cria as tabelas se elas não existirem.
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-
-    # Tabela de Insumos: Guarda o estoque e custo médio de cada item.
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS insumos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nome TEXT NOT NULL UNIQUE,
-        categoria TEXT,
-        unidade TEXT DEFAULT 'un',
-        estoque_qtd REAL DEFAULT 0,
-        custo_medio REAL DEFAULT 0
-    )
-    ''')
-
-    # Tabela de Receitas: Produtos que são vendidos (ex: X-Burguer).
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS receitas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nome TEXT NOT NULL UNIQUE,
-        preco_venda REAL NOT NULL DEFAULT 0
-    )
-    ''')
-
-    # Tabela de Vendas: Registro financeiro de cada venda.
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS vendas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        receita_id INTEGER NOT NULL,
-        quantidade INTEGER NOT NULL,
-        preco_unit REAL NOT NULL,
-        taxa_plataforma REAL NOT NULL DEFAULT 0,
-        total_bruto REAL NOT NULL,
-        custo_total REAL NOT NULL,
-        lucro_liquido REAL NOT NULL,
-        data TEXT DEFAULT (datetime('now','localtime')),
-        FOREIGN KEY (receita_id) REFERENCES receitas(id) ON DELETE CASCADE
-    )
-    ''')
-
-    # Tabela de Compras: Histórico de entrada de produtos.
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS compras (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nome TEXT NOT NULL,
-        quantidade REAL NOT NULL,
-        preco REAL NOT NULL,
-        data TEXT DEFAULT (datetime('now','localtime'))
-    )
-    ''')
-
-    # Tabela de Usuários: Para o sistema de Login.
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS usuarios (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT NOT NULL UNIQUE,
-        password_hash TEXT NOT NULL
-    )
-    ''')
-
-    # Cria um usuário padrão "admin" com senha "admin" se o banco estiver vazio.
-    cur.execute("SELECT COUNT(*) FROM usuarios")
-    if cur.fetchone()[0] == 0:
-        cur.execute("INSERT INTO usuarios (username, password_hash) VALUES (?, ?)",
-                    ("admin", _hash_pwd("admin")))
-    conn.commit()
-    conn.close()
-
-# Verifica se usuário e senha batem com o banco de dados.
-def verify_user(username, password):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT password_hash FROM usuarios WHERE username = ?", (username,))
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return False
-    return row[0] == _hash_pwd(password)
-
-# --- OPERAÇÕES CRUD (CREATE, READ, UPDATE, DELETE) ---
-
-# Adiciona um novo insumo ao banco.
-def add_produto(nome, categoria, unidade='un'):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "INSERT INTO insumos (nome, categoria, unidade) VALUES (?, ?, ?)",
-            (nome, categoria, unidade)
-        )
-        conn.commit()
-        messagebox.showinfo("Sucesso", "Insumo adicionado com sucesso!")
-    except sqlite3.IntegrityError:
-        messagebox.showwarning("Atenção", "Este insumo já existe.")
-    finally:
-        conn.close()
+from tkinter import ttk, messagebox, simpledialog, filedialog
+
+import backend
+from backend import (
+    ServiceError, Centavos, fmt_money, fmt_qty, custo_para_centavos,
+    db, report_db, init_db, verify_user,
+    listar_insumos, add_produto, update_insumo_db, delete_insumo_db,
+    listar_compras_pagina, contar_compras, registrar_compra_db, update_compra_db, delete_compra_db,
+    registrar_movimento, listar_compras_insumo, resumo_compras_insumo,
+    listar_receitas, add_receita, update_receita_db, delete_receita_db,
+    UNIDADES, listar_itens_receita, salvar_item_receita, remover_item_receita,
+    listar_vendas_pagina, contar_vendas, registrar_pedido, delete_venda_db,
+    janelas_padrao, agg_relatorio_janelas,
+)
+from importadores import (
+    importar_compras_csv, formatar_resumo, importar_nfe_pasta, formatar_resumo_nfe,
+    importar_pedidos, formatar_resumo_pedidos, ler_taxa,
+)
+import diagnostico
+import rastreio
 
-# Atualiza dados de um insumo existente.
-def update_insumo_db(insumo_id, nome, categoria, unidade):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute("UPDATE insumos SET nome=?, categoria=?, unidade=? WHERE id=?",
-                    (nome, categoria, unidade, insumo_id))
-        conn.commit()
-        messagebox.showinfo("Sucesso", "Insumo atualizado!")
-    except sqlite3.IntegrityError:
-        messagebox.showwarning("Atenção", "Já existe um insumo com esse nome.")
-    finally:
-        conn.close()
-
-# Remove um insumo.
-def delete_insumo_db(insumo_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM insumos WHERE id = ?", (insumo_id,))
-    conn.commit()
-    conn.close()
-    messagebox.showinfo("Sucesso", "Insumo removido.")
-
-# Lista todos os insumos para exibir na tabela.
-def listar_insumos():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM insumos ORDER BY nome")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
-
-# IMPORTANTE: Registra compra e calcula o CUSTO MÉDIO PONDERADO.
-# Se eu já tinha 10 itens a R$5 e compro 10 a R$10, o novo custo médio será R$7,50.
-def registrar_compra_db(nome, quantidade, preco_unit):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "INSERT INTO compras (nome, quantidade, preco) VALUES (?, ?, ?)",
-            (nome, quantidade, float(preco_unit))
-        )
-        # Verifica se o insumo já existe para atualizar o estoque/custo
-        cur.execute("SELECT id, estoque_qtd, custo_medio FROM insumos WHERE nome = ?", (nome,))
-        row = cur.fetchone()
-        if not row:
-            # Se não existe, cria um novo
-            cur.execute(
-                "INSERT INTO insumos (nome, categoria, unidade, estoque_qtd, custo_medio) VALUES (?, ?, ?, ?, ?)",
-                (nome, "", "un", float(quantidade), float(preco_unit))
-            )
+# --- INTERFACE GRÁFICA (TKINTER) ---
+# Executor de banco em segundo plano: as consultas rodam numa thread própria
+# (com a conexão dela, via ConnectionManager) e a janela nunca trava esperando
+# o SQLite. O resultado volta para a thread do Tk por polling com after(),
+# porque widgets só podem ser mexidos pela thread principal.
+#   submit(fn, *args, callback=..., key=...) -> Future
+# Um pedido novo com a mesma 'key' substitui o anterior: se o antigo ainda não
+# começou é cancelado, e se já estava rodando o resultado dele é descartado.
+# 'on_busy(True/False)' avisa quando há consultas em andamento.
+# A tarefa e o callback contam como parte da ação (rastreio) que os enviou.
+class DbExecutor:
+    def __init__(self, root, on_busy=None, intervalo_ms=30):
+        self.root = root
+        self.on_busy = on_busy
+        self.intervalo_ms = intervalo_ms
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bravus-db")
+        self._pendentes = []
+        self._ultimo = {}
+        self._polling = False
+
+    def submit(self, fn, *args, callback=None, on_error=None, key=None):
+        if key is not None:
+            anterior = self._ultimo.get(key)
+            if anterior is not None:
+                anterior.cancel()
+        acao = rastreio.atual()
+        if acao is not None:
+            acao.segurar()
+            fn = rastreio.na_thread(acao, fn)
+        fut = self._pool.submit(fn, *args)
+        if key is not None:
+            self._ultimo[key] = fut
+        self._pendentes.append((fut, callback, on_error, key, acao))
+        if not self._polling:
+            self._polling = True
+            if self.on_busy:
+                self.on_busy(True)
+            self.root.after(self.intervalo_ms, self._poll)
+        return fut
+
+    def _poll(self):
+        prontos = [p for p in self._pendentes if p[0].done()]
+        self._pendentes = [p for p in self._pendentes if not p[0].done()]
+        for fut, callback, on_error, key, acao in prontos:
+            try:
+                with rastreio.continuar(acao):
+                    self._entregar(fut, callback, on_error, key)
+            finally:
+                if acao is not None:
+                    acao.soltar()
+        if self._pendentes:
+            self.root.after(self.intervalo_ms, self._poll)
         else:
-            # Se existe, calcula a média ponderada do custo e soma o estoque
-            insumo_id, est_ant, custo_ant = row
-            est_ant = float(est_ant or 0)
-            custo_ant = float(custo_ant or 0)
-            qtd = float(quantidade)
-            custo_novo = float(preco_unit)
-            novo_estoque = est_ant + qtd
-            if novo_estoque > 0:
-                novo_custo_medio = (est_ant * custo_ant + qtd * custo_novo) / novo_estoque
-            else:
-                novo_custo_medio = custo_novo
-            cur.execute(
-                "UPDATE insumos SET estoque_qtd = ?, custo_medio = ? WHERE id = ?",
-                (novo_estoque, novo_custo_medio, insumo_id)
-            )
-        conn.commit()
-        messagebox.showinfo("Sucesso", "Compra registrada e estoque atualizado!")
-    finally:
-        conn.close()
-
-def listar_compras():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM compras ORDER BY id DESC")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
-
-def delete_compra_db(compra_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM compras WHERE id=?", (compra_id,))
-    conn.commit()
-    conn.close()
-    messagebox.showinfo("Sucesso", "Compra removida.")
-
-# --- CRUD RECEITAS ---
-def add_receita(nome, preco_venda):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "INSERT INTO receitas (nome, preco_venda) VALUES (?, ?)",
-            (nome, float(preco_venda))
-        )
-        conn.commit()
-        messagebox.showinfo("Sucesso", "Receita cadastrada!")
-    except sqlite3.IntegrityError:
-        messagebox.showwarning("Atenção", "Já existe uma receita com esse nome.")
-    finally:
-        conn.close()
-
-def update_receita_db(receita_id, nome, preco_venda):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute("UPDATE receitas SET nome=?, preco_venda=? WHERE id=?",
-                    (nome, float(preco_venda), receita_id))
-        conn.commit()
-        messagebox.showinfo("Sucesso", "Receita atualizada!")
-    except sqlite3.IntegrityError:
-        messagebox.showwarning("Atenção", "Já existe uma receita com esse nome.")
-    finally:
-        conn.close()
-
-def delete_receita_db(receita_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM receitas WHERE id = ?", (receita_id,))
-    conn.commit()
-    conn.close()
-    messagebox.showinfo("Sucesso", "Receita removida.")
-
-def listar_receitas():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, nome, preco_venda FROM receitas ORDER BY nome")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
-
-# --- LÓGICA DE VENDAS ---
-# Calcula o lucro líquido subtraindo taxas da plataforma (iFood, etc).
-def registrar_venda(receita_id, quantidade, preco_unit, taxa_plataforma):
-    conn = get_conn()
-    cur = conn.cursor()
-    total_bruto = float(preco_unit) * int(quantidade)
-    custo_total = 0.0 # Nota: O custo do insumo não está sendo descontado automaticamente aqui.
-    desp_plataforma = total_bruto * float(taxa_plataforma)
-    lucro_liquido = total_bruto - desp_plataforma - custo_total
-    
-    cur.execute('''
-        INSERT INTO vendas (receita_id, quantidade, preco_unit, taxa_plataforma, total_bruto, custo_total, lucro_liquido, data)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (receita_id, int(quantidade), float(preco_unit), float(taxa_plataforma),
-          total_bruto, custo_total, lucro_liquido, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-    conn.commit()
-    conn.close()
-    messagebox.showinfo("Sucesso", "Venda registrada com sucesso!")
-
-def listar_vendas():
-    conn = get_conn()
-    cur = conn.cursor()
-    # Faz um JOIN para pegar o nome da receita através do ID salvo na venda
-    cur.execute("""
-        SELECT v.id, r.nome, v.quantidade, v.preco_unit, v.taxa_plataforma,
-               v.total_bruto, v.custo_total, v.lucro_liquido, v.data
-        FROM vendas v
-        JOIN receitas r ON r.id = v.receita_id
-        ORDER BY v.id DESC
-    """)
-    rows = cur.fetchall()
-    conn.close()
-    return rows
-
-def delete_venda_db(venda_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM vendas WHERE id=?", (venda_id,))
-    conn.commit()
-    conn.close()
-    messagebox.showinfo("Sucesso", "Venda removida.")
-
-# --- FUNÇÕES UTILITÁRIAS ---
-# Formata números para o padrão brasileiro (R$ e vírgula)
-def fmt_money(val):
-    try:
-        return f"R$ {float(val):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    except Exception:
-        return f"R$ {val}"
-
-def fmt_qty(val):
-    try:
-        return f"{float(val):.3f}".replace(".", ",")
-    except Exception:
-        return f"{val}"
+            self._polling = False
+            if self.on_busy:
+                self.on_busy(False)
+
+    def _entregar(self, fut, callback, on_error, key):
+        if key is not None:
+            if self._ultimo.get(key) is not fut:
+                return  # substituído por um pedido mais novo
+            del self._ultimo[key]
+        if fut.cancelled():
+            return
+        exc = fut.exception()
+        if exc is not None:
+            (on_error or self._erro_padrao)(exc)
+        elif callback:
+            callback(fut.result())
+
+    @staticmethod
+    def _erro_padrao(exc):
+        messagebox.showerror("Erro no banco de dados", str(exc))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+# Tabela "virtual" para históricos grandes (vendas, compras): só mantém no
+# Treeview uma janela de até 'max_paginas' páginas. Ao rolar perto do fim busca
+# a próxima página (keyset) e descarta a primeira; perto do topo faz o inverso.
+# Assim abrir a aba custa uma página, não o histórico inteiro.
+#   buscar(antes_de, depois_de, limite) -> linhas (id na posição 0, id decrescente)
+#   formatar(linha) -> valores das colunas
+#   contar() -> total de linhas (consulta barata), mostrado no rodapé
+#   executor: DbExecutor opcional; sem ele as buscas rodam na hora (síncronas)
+class PagedTreeview(ttk.Frame):
+    def __init__(self, parent, headers, buscar, formatar, contar, tamanho_pagina=200, max_paginas=3,
+                 executor=None):
+        super().__init__(parent)
+        self.executor = executor
+        self.buscar = buscar
+        self.formatar = formatar
+        self.contar = contar
+        self.tamanho_pagina = tamanho_pagina
+        self.max_itens = tamanho_pagina * max_paginas
+        self._tem_acima = False   # existem linhas mais novas fora da janela
+        self._tem_abaixo = False  # existem linhas mais antigas fora da janela
+        self._pendente = False
+        self._total = 0
+
+        self.tree = ttk.Treeview(self, columns=[h[0] for h in headers], show="headings")
+        for c, txt, w in headers:
+            self.tree.heading(c, text=txt)
+            self.tree.column(c, width=w, anchor="w")
+        self.scroll = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscroll=self._on_scroll)
+        self.var_info = StringVar()
+        ttk.Label(self, textvariable=self.var_info).pack(side="bottom", anchor="w")
+        self.tree.pack(fill="both", expand=True, side="left")
+        self.scroll.pack(side="right", fill="y")
+
+    # Roda fn no executor (se houver) e entrega o resultado em 'callback'.
+    # Todas as buscas desta tabela usam a mesma chave: um reload descarta
+    # páginas que ainda estavam a caminho.
+    def _executar(self, fn, callback):
+        if self.executor is None:
+            with rastreio.fase("db"):
+                resultado = fn()
+            callback(resultado)
+            return
+        def erro(exc):
+            self._pendente = False
+            DbExecutor._erro_padrao(exc)
+        self.executor.submit(fn, callback=callback, on_error=erro, key=self)
+
+    # Recarrega do zero (primeira página, linhas mais recentes).
+    def reload(self):
+        self._pendente = False
+        self._executar(lambda: (self.buscar(None, None, self.tamanho_pagina), self.contar()),
+                       self._recebe_reload)
+
+    def _recebe_reload(self, resultado):
+        rows, total = resultado
+        with rastreio.fase("render"):
+            self.tree.delete(*self.tree.get_children())
+        self._inserir(rows, "end")
+        self._tem_acima = False
+        self._tem_abaixo = len(rows) == self.tamanho_pagina
+        self.tree.yview_moveto(0)
+        self._total = total
+        self._atualizar_info()
+
+    # Atualiza uma linha já exibida ou mostra uma linha nova no topo, sem
+    # recarregar. Se a janela não estiver no topo (linha nova ficaria fora
+    # dela) ou o id não se encaixar na ordem, recarrega tudo por segurança.
+    def upsert(self, row):
+        iid = str(row[0])
+        with rastreio.fase("format"):
+            valores = self.formatar(row)
+        if self.tree.exists(iid):
+            with rastreio.fase("render"):
+                self.tree.item(iid, values=valores)
+            return
+        itens = self.tree.get_children()
+        if self._tem_acima or (itens and row[0] < int(itens[0])):
+            self.reload()
+            return
+        with rastreio.fase("render"):
+            self.tree.insert("", 0, iid=iid, values=valores)
+        self._total += 1
+        self._aparar(do_topo=False)
+        self._atualizar_info()
+
+    # Tira uma linha removida do banco; se ela não estava na janela, recarrega.
+    def remove(self, row_id):
+        iid = str(row_id)
+        if not self.tree.exists(iid):
+            self.reload()
+            return
+        self.tree.delete(iid)
+        self._total -= 1
+        self._atualizar_info()
+
+    def _inserir(self, rows, pos):
+        with rastreio.fase("format", linhas=len(rows)):
+            valores = [(str(r[0]), self.formatar(r)) for r in (rows if pos == "end" else reversed(rows))]
+        with rastreio.fase("render", linhas=len(rows)):
+            for iid, v in valores:
+                self.tree.insert("", pos, iid=iid, values=v)
+
+    def _atualizar_info(self):
+        self.var_info.set(f"Exibindo {len(self.tree.get_children())} de {self._total} registro(s)")
+
+    # Chamado pelo Treeview sempre que a área visível muda (roda do mouse,
+    # teclado, barra de rolagem). Repassa para a barra e agenda mais dados.
+    def _on_scroll(self, first, last):
+        self.scroll.set(first, last)
+        if self._pendente:
+            return
+        first, last = float(first), float(last)
+        if (last > 0.9 and self._tem_abaixo) or (first < 0.1 and self._tem_acima):
+            self._pendente = True
+            self.after_idle(self._carregar_mais)
+
+    def _carregar_mais(self):
+        first, last = self.tree.yview()
+        itens = self.tree.get_children()
+        if itens and last > 0.9 and self._tem_abaixo:
+            antes_de = int(itens[-1])
+            self._executar(lambda: self.buscar(antes_de, None, self.tamanho_pagina), self._recebe_abaixo)
+        elif itens and first < 0.1 and self._tem_acima:
+            depois_de = int(itens[0])
+            self._executar(lambda: self.buscar(None, depois_de, self.tamanho_pagina), self._recebe_acima)
+        else:
+            self._pendente = False
+
+    def _recebe_abaixo(self, rows):
+        self._pendente = False
+        self._tem_abaixo = len(rows) == self.tamanho_pagina
+        self._inserir(rows, "end")
+        self._aparar(do_topo=True)
+        self._atualizar_info()
+
+    def _recebe_acima(self, rows):
+        self._pendente = False
+        self._tem_acima = len(rows) == self.tamanho_pagina
+        first = self.tree.yview()[0]
+        n = len(self.tree.get_children())
+        self._inserir(rows, 0)
+        # Mantém na tela as mesmas linhas que o usuário estava vendo
+        self.tree.yview_moveto((first * n + len(rows)) / (n + len(rows)))
+        self._aparar(do_topo=False)
+        self._atualizar_info()
+
+    # Descarta linhas do lado oposto à rolagem para manter a janela limitada.
+    def _aparar(self, do_topo):
+        itens = self.tree.get_children()
+        excesso = len(itens) - self.max_itens
+        if excesso <= 0:
+            return
+        if do_topo:
+            first = self.tree.yview()[0]
+            visivel = int(first * len(itens))
+            self.tree.delete(*itens[:excesso])
+            self._tem_acima = True
+            self.tree.yview_moveto(max(visivel - excesso, 0) / (len(itens) - excesso))
+        else:
+            self.tree.delete(*itens[-excesso:])
+            self._tem_abaixo = True
 
-# --- INTERFACE GRÁFICA (TKINTER) ---
 # Classe principal da aplicação
 class BravusApp(Tk):
     def __init__(self):
@@ -330,8 +284,14 @@ class BravusApp(Tk):
         self.geometry("1040x680") # Tamanho da janela
         self.minsize(960, 600)
 
+        # Barra de status com o aviso de "carregando" das consultas em segundo plano
+        self.var_status = StringVar()
+        ttk.Label(self, textvariable=self.var_status, anchor="w").pack(side="bottom", fill="x", padx=10)
+        self.executor = DbExecutor(self, on_busy=self._set_busy)
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
         # Criação das abas (Notebook)
-        nb = ttk.Notebook(self)
+        nb = self.nb = ttk.Notebook(self)
         nb.pack(fill="both", expand=True, padx=8, pady=8)
 
         self.tab_insumos = ttk.Frame(nb)
@@ -339,12 +299,17 @@ class BravusApp(Tk):
         self.tab_receitas = ttk.Frame(nb)
         self.tab_vendas = ttk.Frame(nb)
         self.tab_rel = ttk.Frame(nb)
+        self.tab_diag = ttk.Frame(nb)
 
         nb.add(self.tab_insumos, text="Insumos")
         nb.add(self.tab_compras, text="Compras")
         nb.add(self.tab_receitas, text="Receitas")
         nb.add(self.tab_vendas, text="Vendas")
         nb.add(self.tab_rel, text="Relatórios")
+        # Aba de suporte: fica escondida, Ctrl+Shift+D mostra/esconde
+        nb.add(self.tab_diag, text="Diagnóstico")
+        nb.hide(self.tab_diag)
+        self.bind_all("<Control-Shift-D>", self._alternar_diagnostico)
 
         # Constrói o conteúdo de cada aba
         self.build_insumos()
@@ -352,6 +317,54 @@ class BravusApp(Tk):
         self.build_receitas()
         self.build_vendas()
         self.build_relatorios()
+        self.build_diagnostico()
+
+    def _set_busy(self, ocupado):
+        self.var_status.set("Carregando dados..." if ocupado else "")
+        self.configure(cursor="watch" if ocupado else "")
+
+    def _on_close(self):
+        self.executor.shutdown()
+        self.destroy()
+
+    # Roda uma escrita do backend fora da thread da janela. Se der certo chama
+    # callback(resultado) e depois mostra 'sucesso' (a mensagem abre quando a
+    # tela já foi atualizada e não entra no tempo da ação); um ServiceError
+    # (nome repetido, registro removido, dado inválido) vira um aviso com a
+    # mensagem do backend.
+    def _executar_servico(self, fn, *args, sucesso=None, callback=None):
+        def ok(resultado):
+            if callback:
+                callback(resultado)
+            if sucesso:
+                self.after_idle(messagebox.showinfo, "Sucesso", sucesso)
+        self.executor.submit(fn, *args, callback=ok, on_error=self._erro_servico)
+
+    @staticmethod
+    def _erro_servico(exc):
+        if isinstance(exc, ServiceError):
+            messagebox.showwarning("Atenção", str(exc))
+        else:
+            DbExecutor._erro_padrao(exc)
+
+    # Insere ou atualiza um item (iid = id do banco) numa tabela ordenada pela
+    # coluna 'col', sem recarregar a tabela inteira. A posição é achada por
+    # busca binária nos itens já exibidos.
+    @staticmethod
+    def _upsert_ordenado(tree, iid, values, col="nome"):
+        iid = str(iid)
+        if tree.exists(iid):
+            tree.delete(iid)
+        itens = tree.get_children()
+        chave = str(values[list(tree["columns"]).index(col)])
+        lo, hi = 0, len(itens)
+        while lo < hi:
+            meio = (lo + hi) // 2
+            if tree.set(itens[meio], col) < chave:
+                lo = meio + 1
+            else:
+                hi = meio
+        tree.insert("", lo, iid=iid, values=values)
 
     # --- ABA DE INSUMOS ---
     def build_insumos(self):
@@ -400,30 +413,52 @@ class BravusApp(Tk):
         ttk.Button(btns, text="Recarregar", command=self.load_insumos).pack(side="left")
         ttk.Button(btns, text="Editar selecionado", command=self.edit_insumo_dialog).pack(side="left", padx=6)
         ttk.Button(btns, text="Excluir selecionado", command=self.delete_insumo_selected).pack(side="left", padx=6)
+        ttk.Button(btns, text="Ajustar estoque", command=lambda: self.movimento_insumo_dialog("ajuste")).pack(side="left", padx=6)
+        ttk.Button(btns, text="Registrar perda", command=lambda: self.movimento_insumo_dialog("perda")).pack(side="left", padx=6)
+        ttk.Button(btns, text="Histórico de compras", command=self.historico_compras_dialog).pack(side="left", padx=6)
 
         self.load_insumos()
 
+    @rastreio.rastreado("salvar_insumo")
     def salvar_insumo(self):
         nome = self.in_nome.get().strip()
         categoria = self.in_categoria.get().strip()
         unidade = self.in_unidade.get().strip()
-        if not nome:
-            messagebox.showwarning("Aviso", "Informe o nome do insumo.")
-            return
-        add_produto(nome, categoria, unidade)
-        self.in_nome.set("")
-        self.in_categoria.set("")
-        self.in_unidade.set("un")
-        self.load_insumos()
+
+        def ok(row):
+            self.in_nome.set("")
+            self.in_categoria.set("")
+            self.in_unidade.set("un")
+            self._upsert_insumo(row)
+        self._executar_servico(add_produto, nome, categoria, unidade,
+                               sucesso="Insumo adicionado com sucesso!", callback=ok)
 
     # Preenche a tabela com dados do banco
+    @rastreio.rastreado("load_insumos")
     def load_insumos(self):
-        for i in self.tree_insumos.get_children():
-            self.tree_insumos.delete(i)
-        for r in listar_insumos():
-            self.tree_insumos.insert("", "end", values=(r[0], r[1], r[2], r[3], fmt_qty(r[4]), fmt_money(r[5])))
+        self.executor.submit(listar_insumos, callback=self._mostrar_insumos, key="insumos")
+
+    def _mostrar_insumos(self, rows):
+        with rastreio.fase("format", linhas=len(rows)):
+            valores = [(str(r[0]), self._fmt_insumo(r)) for r in rows]
+        with rastreio.fase("render", linhas=len(rows)):
+            for i in self.tree_insumos.get_children():
+                self.tree_insumos.delete(i)
+            for iid, v in valores:
+                self.tree_insumos.insert("", "end", iid=iid, values=v)
+
+    @staticmethod
+    def _fmt_insumo(r):
+        return (r[0], r[1], r[2], r[3], fmt_qty(r[4]), fmt_money(custo_para_centavos(r[5])))
+
+    def _upsert_insumo(self, row):
+        with rastreio.fase("format"):
+            valores = self._fmt_insumo(row)
+        with rastreio.fase("render"):
+            self._upsert_ordenado(self.tree_insumos, row[0], valores)
 
     # Abre uma janela pop-up (Toplevel) para editar
+    @rastreio.rastreado("edit_insumo_dialog")
     def edit_insumo_dialog(self):
         sel = self.tree_insumos.selection()
         if not sel:
@@ -442,16 +477,18 @@ class BravusApp(Tk):
         Label(top, text="Unidade:").grid(row=2, column=0, padx=6, pady=6)
         e_un = Entry(top); e_un.grid(row=2, column=1, padx=6, pady=6); e_un.insert(0, vals[3])
 
+        @rastreio.rastreado("edit_insumo_dialog.salvar")
         def _save():
             nome_n = e_nome.get().strip()
             cat_n = e_cat.get().strip()
             un_n = e_un.get().strip() or "un"
-            if not nome_n:
-                messagebox.showwarning("Aviso", "Nome obrigatório.")
-                return
-            update_insumo_db(insumo_id, nome_n, cat_n, un_n)
-            top.destroy()
-            self.load_insumos()
+
+            def ok(row):
+                top.destroy()
+                self._upsert_insumo(row)
+                self.load_receitas()  # Trocar a unidade pode mudar o custo das receitas
+            self._executar_servico(update_insumo_db, insumo_id, nome_n, cat_n, un_n,
+                                   sucesso="Insumo atualizado!", callback=ok)
 
         ttk.Button(top, text="Salvar", command=_save).grid(row=3, column=0, columnspan=2, pady=8)
 
@@ -464,8 +501,56 @@ class BravusApp(Tk):
         vals = self.tree_insumos.item(iid, "values")
         insumo_id = int(vals[0])
         if messagebox.askyesno("Confirmar", f"Excluir insumo '{vals[1]}'?"):
-            delete_insumo_db(insumo_id)
-            self.load_insumos()
+            self._executar_servico(delete_insumo_db, insumo_id, sucesso="Insumo removido.",
+                                   callback=lambda _: self.tree_insumos.delete(iid))
+
+    # Ajuste de inventário (quantidade com sinal) ou perda (quantidade que saiu).
+    def movimento_insumo_dialog(self, tipo):
+        sel = self.tree_insumos.selection()
+        if not sel:
+            messagebox.showwarning("Aviso", "Selecione um insumo.")
+            return
+        vals = self.tree_insumos.item(sel[0], "values")
+        if tipo == "perda":
+            pergunta = f"Quantidade perdida de '{vals[1]}' ({vals[3]}):"
+        else:
+            pergunta = f"Ajuste de '{vals[1]}' ({vals[3]}), positivo entra e negativo sai:"
+        qtd = simpledialog.askfloat("Estoque", pergunta, parent=self)
+        if qtd is None:
+            return
+        self._executar_servico(registrar_movimento, int(vals[0]), tipo, qtd,
+                               sucesso="Estoque atualizado.", callback=self._upsert_insumo)
+
+    # Compras do insumo selecionado (pelo insumo_id: vale mesmo após renomear).
+    def historico_compras_dialog(self):
+        sel = self.tree_insumos.selection()
+        if not sel:
+            messagebox.showwarning("Aviso", "Selecione um insumo.")
+            return
+        vals = self.tree_insumos.item(sel[0], "values")
+        insumo_id = int(vals[0])
+
+        top = Toplevel(self)
+        top.title(f"Compras - {vals[1]}")
+        var_resumo = StringVar(value="Carregando...")
+        ttk.Label(top, textvariable=var_resumo, font=("TkDefaultFont", 10, "bold")).pack(fill="x", padx=8, pady=8)
+        cols = ("id", "qtd", "preco", "data")
+        tree = ttk.Treeview(top, columns=cols, show="headings", height=12)
+        for c, txt, w in [("id", "ID", 60), ("qtd", "Qtd", 90), ("preco", "Preço Unit.", 110), ("data", "Data", 160)]:
+            tree.heading(c, text=txt)
+            tree.column(c, width=w, anchor="w")
+        tree.pack(fill="both", expand=True, padx=8, pady=(0, 8))
+
+        def mostrar(resultado):
+            rows, (n, qtd, total) = resultado
+            if not top.winfo_exists():
+                return
+            var_resumo.set(f"Compras: {n}  |  Quantidade: {fmt_qty(qtd)}  |  Total: {fmt_money(total)}")
+            for r in rows:
+                tree.insert("", "end", iid=str(r[0]), values=(r[0], fmt_qty(r[2]), fmt_money(r[3]), r[4]))
+
+        self.executor.submit(lambda: (listar_compras_insumo(insumo_id), resumo_compras_insumo(insumo_id)),
+                             callback=mostrar, key="historico_compras")
 
     # --- ABA DE COMPRAS ---
     def build_compras(self):
@@ -491,49 +576,125 @@ class BravusApp(Tk):
         mid = ttk.LabelFrame(frm, text="Compras Recentes")
         mid.pack(fill="both", expand=True, padx=8, pady=8)
 
-        cols = ("id", "produto", "quantidade", "preco", "data")
-        self.tree_compras = ttk.Treeview(mid, columns=cols, show="headings")
-        for c, txt, w in [("id", "ID", 60), ("produto", "Produto", 220), ("quantidade", "Qtd", 100),
-                          ("preco", "Preço Unit.", 120), ("data", "Data", 160)]:
-            self.tree_compras.heading(c, text=txt)
-            self.tree_compras.column(c, width=w, anchor="w")
-        self.tree_compras.pack(fill="both", expand=True, side="left")
-        sb = ttk.Scrollbar(mid, orient="vertical", command=self.tree_compras.yview)
-        self.tree_compras.configure(yscroll=sb.set)
-        sb.pack(side="right", fill="y")
+        # Histórico paginado: carrega só as páginas perto da área visível
+        headers = [("id", "ID", 60), ("produto", "Produto", 220), ("quantidade", "Qtd", 100),
+                   ("preco", "Preço Unit.", 120), ("data", "Data", 160)]
+        self.pag_compras = PagedTreeview(mid, headers, listar_compras_pagina, self._fmt_compra, contar_compras,
+                                         executor=self.executor)
+        self.pag_compras.pack(fill="both", expand=True)
+        self.tree_compras = self.pag_compras.tree
 
         btns = ttk.Frame(frm)
         btns.pack(fill="x", padx=8, pady=4)
         ttk.Button(btns, text="Recarregar", command=self.load_compras).pack(side="left")
+        ttk.Button(btns, text="Corrigir selecionada", command=self.edit_compra_dialog).pack(side="left", padx=6)
         ttk.Button(btns, text="Excluir selecionado", command=self.delete_compra_selected).pack(side="left", padx=6)
+        ttk.Button(btns, text="Importar planilha (CSV)...", command=self.importar_compras_dialog).pack(side="left", padx=6)
+        ttk.Button(btns, text="Importar NF-e (pasta)...", command=self.importar_nfe_dialog).pack(side="left", padx=6)
 
         self.load_compras()
 
+    # Importa uma planilha de entrega inteira numa transação e mostra o resumo.
+    def importar_compras_dialog(self):
+        caminho = filedialog.askopenfilename(
+            parent=self, title="Importar compras",
+            filetypes=[("Planilhas CSV", "*.csv"), ("Todos os arquivos", "*.*")])
+        if not caminho:
+            return
+
+        def ok(resumo):
+            if resumo["gravado"]:
+                messagebox.showinfo("Importação", formatar_resumo(resumo))
+                self.load_compras()
+                self.load_insumos()
+                self.load_receitas()  # Custos médios novos mudam o custo das receitas
+            else:
+                messagebox.showwarning("Importação", formatar_resumo(resumo))
+        self._executar_servico(importar_compras_csv, caminho, callback=ok)
+
+    # Importa os XML de NF-e de uma pasta; notas já importadas são puladas.
+    def importar_nfe_dialog(self):
+        pasta = filedialog.askdirectory(parent=self, title="Pasta com as NF-e (XML)")
+        if not pasta:
+            return
+
+        def ok(resumo):
+            if resumo["gravado"]:
+                self.load_compras()
+                self.load_insumos()
+                self.load_receitas()
+            if resumo["erros"] or resumo["faltando"]:
+                messagebox.showwarning("Importação de NF-e", formatar_resumo_nfe(resumo))
+            else:
+                messagebox.showinfo("Importação de NF-e", formatar_resumo_nfe(resumo))
+        self._executar_servico(importar_nfe_pasta, pasta, callback=ok)
+
+    @rastreio.rastreado("_registrar_compra")
     def _registrar_compra(self):
         nome = self.comp_nome.get().strip()
         try:
             quantidade = float(self.comp_qtd.get().replace(",", "."))
-            preco = Decimal(self.comp_preco.get().replace(",", "."))
-        except (InvalidOperation, ValueError):
+            preco = Centavos.de_reais(self.comp_preco.get())
+        except ValueError:
             messagebox.showwarning("Aviso", "Quantidade e preço devem ser numéricos.")
             return
 
-        if not nome or quantidade <= 0 or preco <= 0:
-            messagebox.showwarning("Aviso", "Preencha todos os campos corretamente.")
+        def ok(resultado):
+            compra, insumo = resultado
+            self.comp_nome.set("")
+            self.comp_qtd.set("")
+            self.comp_preco.set("")
+            self.pag_compras.upsert(compra)
+            self._upsert_insumo(insumo)  # Atualiza o insumo para refletir novo estoque
+            self.load_receitas()  # O custo médio novo muda o custo das receitas que usam o insumo
+        self._executar_servico(registrar_compra_db, nome, quantidade, preco,
+                               sucesso="Compra registrada e estoque atualizado!", callback=ok)
+
+    @rastreio.rastreado("load_compras")
+    def load_compras(self):
+        self.pag_compras.reload()
+
+    @staticmethod
+    def _fmt_compra(r):
+        return (r[0], r[1], fmt_qty(r[2]), fmt_money(r[3]), r[4])
+
+    # Corrige quantidade e preço de uma compra; o backend refaz estoque e custo médio.
+    @rastreio.rastreado("edit_compra_dialog")
+    def edit_compra_dialog(self):
+        sel = self.tree_compras.selection()
+        if not sel:
+            messagebox.showwarning("Aviso", "Selecione uma compra para corrigir.")
             return
+        vals = self.tree_compras.item(sel[0], "values")
+        compra_id = int(vals[0])
 
-        registrar_compra_db(nome, quantidade, preco)
-        self.comp_nome.set("")
-        self.comp_qtd.set("")
-        self.comp_preco.set("")
-        self.load_compras()
-        self.load_insumos()  # Atualiza a tabela de insumos para refletir novo estoque
+        top = Toplevel(self)
+        top.title(f"Corrigir Compra {compra_id} - {vals[1]}")
+        Label(top, text="Quantidade:").grid(row=0, column=0, padx=6, pady=6)
+        e_qtd = Entry(top); e_qtd.grid(row=0, column=1, padx=6, pady=6); e_qtd.insert(0, vals[2])
+        Label(top, text="Preço unitário:").grid(row=1, column=0, padx=6, pady=6)
+        e_pre = Entry(top); e_pre.grid(row=1, column=1, padx=6, pady=6); e_pre.insert(0, vals[3].replace("R$ ", "").replace(".", ""))
 
-    def load_compras(self):
-        for i in self.tree_compras.get_children():
-            self.tree_compras.delete(i)
-        for r in listar_compras():
-            self.tree_compras.insert("", "end", values=(r[0], r[1], fmt_qty(r[2]), fmt_money(r[3]), r[4]))
+        @rastreio.rastreado("edit_compra_dialog.salvar")
+        def _save():
+            try:
+                qtd_n = float(e_qtd.get().replace(",", "."))
+                preco_n = Centavos.de_reais(e_pre.get())
+            except ValueError:
+                messagebox.showwarning("Aviso", "Quantidade e preço devem ser numéricos.", parent=top)
+                return
+
+            def ok(resultado):
+                compra, insumo = resultado
+                top.destroy()
+                self.pag_compras.upsert(compra)
+                if insumo:
+                    self._upsert_insumo(insumo)
+                self.load_receitas()  # O custo médio refeito muda o custo das receitas
+            self._executar_servico(update_compra_db, compra_id, qtd_n, preco_n,
+                                   sucesso="Compra corrigida!", callback=ok)
+
+        ttk.Button(top, text="Salvar", command=_save).grid(row=2, column=0, columnspan=2, pady=8)
 
     def delete_compra_selected(self):
         sel = self.tree_compras.selection()
@@ -544,9 +705,12 @@ class BravusApp(Tk):
         vals = self.tree_compras.item(iid, "values")
         compra_id = int(vals[0])
         if messagebox.askyesno("Confirmar", f"Excluir compra ID {compra_id}?"):
-            delete_compra_db(compra_id)
-            self.load_compras()
-            self.load_insumos()
+            def ok(insumo):
+                self.pag_compras.remove(compra_id)
+                if insumo:
+                    self._upsert_insumo(insumo)  # Estoque e custo médio sem a compra
+                    self.load_receitas()
+            self._executar_servico(delete_compra_db, compra_id, sucesso="Compra removida.", callback=ok)
 
     # --- ABA DE RECEITAS ---
     def build_receitas(self):
@@ -569,9 +733,10 @@ class BravusApp(Tk):
         mid = ttk.LabelFrame(frm, text="Receitas Cadastradas")
         mid.pack(fill="both", expand=True, padx=8, pady=8)
 
-        cols = ("id", "nome", "preco")
+        cols = ("id", "nome", "preco", "custo")
         self.tree_receitas = ttk.Treeview(mid, columns=cols, show="headings")
-        for c, txt, w in [("id", "ID", 60), ("nome", "Nome", 280), ("preco", "Preço Venda", 150)]:
+        for c, txt, w in [("id", "ID", 60), ("nome", "Nome", 280), ("preco", "Preço Venda", 150),
+                          ("custo", "Custo (ficha)", 150)]:
             self.tree_receitas.heading(c, text=txt)
             self.tree_receitas.column(c, width=w, anchor="w")
         self.tree_receitas.pack(fill="both", expand=True, side="left")
@@ -584,31 +749,50 @@ class BravusApp(Tk):
         ttk.Button(btns, text="Recarregar", command=self.load_receitas).pack(side="left")
         ttk.Button(btns, text="Editar selecionado", command=self.edit_receita_dialog).pack(side="left", padx=6)
         ttk.Button(btns, text="Excluir selecionado", command=self.delete_receita_selected).pack(side="left", padx=6)
+        ttk.Button(btns, text="Ficha técnica", command=self.ficha_tecnica_dialog).pack(side="left", padx=6)
 
         self.load_receitas()
 
+    @rastreio.rastreado("_salvar_receita")
     def _salvar_receita(self):
         nome = self.rec_nome.get().strip()
         try:
-            preco = float(self.rec_preco.get().replace(",", "."))
+            preco = Centavos.de_reais(self.rec_preco.get())
         except ValueError:
             messagebox.showwarning("Aviso", "Preço inválido.")
             return
-        if not nome or preco <= 0:
-            messagebox.showwarning("Aviso", "Preencha o nome e um preço válido.")
-            return
-        add_receita(nome, preco)
-        self.rec_nome.set("")
-        self.rec_preco.set("")
-        self.load_receitas()
-        self._reload_receitas_combo()  # Atualiza lista suspensa na aba vendas
 
-    def load_receitas(self):
-        for i in self.tree_receitas.get_children():
-            self.tree_receitas.delete(i)
-        for r in listar_receitas():
-            self.tree_receitas.insert("", "end", values=(r[0], r[1], fmt_money(r[2])))
+        def ok(row):
+            self.rec_nome.set("")
+            self.rec_preco.set("")
+            self._upsert_receita(row)
+            self._reload_receitas_combo()  # Atualiza lista suspensa na aba vendas
+        self._executar_servico(add_receita, nome, preco, sucesso="Receita cadastrada!", callback=ok)
 
+    @rastreio.rastreado("load_receitas")
+    def load_receitas(self):
+        self.executor.submit(listar_receitas, callback=self._mostrar_receitas, key="receitas")
+
+    def _mostrar_receitas(self, rows):
+        with rastreio.fase("format", linhas=len(rows)):
+            valores = [(str(r[0]), self._fmt_receita(r)) for r in rows]
+        with rastreio.fase("render", linhas=len(rows)):
+            for i in self.tree_receitas.get_children():
+                self.tree_receitas.delete(i)
+            for iid, v in valores:
+                self.tree_receitas.insert("", "end", iid=iid, values=v)
+
+    @staticmethod
+    def _fmt_receita(r):
+        return (r[0], r[1], fmt_money(r[2]), fmt_money(custo_para_centavos(r[3])))
+
+    def _upsert_receita(self, row):
+        with rastreio.fase("format"):
+            valores = self._fmt_receita(row)
+        with rastreio.fase("render"):
+            self._upsert_ordenado(self.tree_receitas, row[0], valores)
+
+    @rastreio.rastreado("edit_receita_dialog")
     def edit_receita_dialog(self):
         sel = self.tree_receitas.selection()
         if not sel:
@@ -623,25 +807,117 @@ class BravusApp(Tk):
         Label(top, text="Nome:").grid(row=0, column=0, padx=6, pady=6)
         e_nome = Entry(top); e_nome.grid(row=0, column=1, padx=6, pady=6); e_nome.insert(0, vals[1])
         Label(top, text="Preço:").grid(row=1, column=0, padx=6, pady=6)
-        e_pre = Entry(top); e_pre.grid(row=1, column=1, padx=6, pady=6); e_pre.insert(0, vals[2].replace("R$ ", "").replace(".", "").replace(",", "."))
+        e_pre = Entry(top); e_pre.grid(row=1, column=1, padx=6, pady=6); e_pre.insert(0, vals[2].replace("R$ ", "").replace(".", ""))
 
+        @rastreio.rastreado("edit_receita_dialog.salvar")
         def _save():
             nome_n = e_nome.get().strip()
             try:
-                preco_n = float(e_pre.get().replace(",", "."))
+                preco_n = Centavos.de_reais(e_pre.get())
             except ValueError:
                 messagebox.showwarning("Aviso", "Preço inválido.")
                 return
-            if not nome_n or preco_n <= 0:
-                messagebox.showwarning("Aviso", "Nome e preço válidos necessários.")
-                return
-            update_receita_db(receita_id, nome_n, preco_n)
-            top.destroy()
-            self.load_receitas()
-            self._reload_receitas_combo()
+
+            def ok(row):
+                top.destroy()
+                self._upsert_receita(row)
+                self._reload_receitas_combo()
+                if row[1] != vals[1]:
+                    self.load_vendas()  # o nome aparece em cada venda: recarrega
+            self._executar_servico(update_receita_db, receita_id, nome_n, preco_n,
+                                   sucesso="Receita atualizada!", callback=ok)
 
         ttk.Button(top, text="Salvar", command=_save).grid(row=2, column=0, columnspan=2, pady=8)
 
+    # Ficha técnica: insumos (e quantidades) que vão em uma unidade da receita.
+    # O banco recalcula o custo da receita a cada inclusão ou remoção.
+    def ficha_tecnica_dialog(self):
+        sel = self.tree_receitas.selection()
+        if not sel:
+            messagebox.showwarning("Aviso", "Selecione uma receita.")
+            return
+        vals = self.tree_receitas.item(sel[0], "values")
+        receita_id = int(vals[0])
+
+        top = Toplevel(self)
+        top.title(f"Ficha técnica - {vals[1]}")
+        var_insumo = StringVar()
+        var_qtd = StringVar()
+        var_un = StringVar()
+        var_custo = StringVar(value=f"Custo por unidade: {vals[3]}")
+        unidades_insumos = {}  # "id - nome" -> unidade do insumo
+
+        form = ttk.Frame(top)
+        form.pack(fill="x", padx=8, pady=8)
+        ttk.Label(form, text="Insumo:").grid(row=0, column=0, sticky="w", padx=4)
+        combo = ttk.Combobox(form, textvariable=var_insumo, width=28, state="readonly")
+        combo.grid(row=0, column=1, padx=4)
+        ttk.Label(form, text="Qtd:").grid(row=0, column=2, sticky="w", padx=4)
+        ttk.Entry(form, textvariable=var_qtd, width=10).grid(row=0, column=3, padx=4)
+        ttk.Combobox(form, textvariable=var_un, values=list(UNIDADES), width=5).grid(row=0, column=4, padx=4)
+
+        cols = ("insumo", "qtd", "unidade", "custo")
+        tree = ttk.Treeview(top, columns=cols, show="headings", height=8)
+        for c, txt, w in [("insumo", "Insumo", 200), ("qtd", "Qtd", 90),
+                          ("unidade", "Unidade", 70), ("custo", "Custo", 110)]:
+            tree.heading(c, text=txt)
+            tree.column(c, width=w, anchor="w")
+        tree.pack(fill="both", expand=True, padx=8)
+
+        def mostrar_insumos(rows):
+            if not top.winfo_exists():
+                return
+            unidades_insumos.clear()
+            unidades_insumos.update({f"{r[0]} - {r[1]}": r[3] for r in rows})
+            combo["values"] = list(unidades_insumos)
+
+        def mostrar_itens(rows):
+            if not top.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for r in rows:
+                tree.insert("", "end", iid=str(r[0]),
+                            values=(r[1], fmt_qty(r[2]), r[3], fmt_money(custo_para_centavos(r[6]))))
+
+        # Depois de cada alteração: atualiza a linha da receita e relê os itens.
+        def recarregar(receita=None):
+            if receita:
+                self._upsert_receita(receita)
+                var_custo.set(f"Custo por unidade: {fmt_money(custo_para_centavos(receita[3]))}")
+            self.executor.submit(listar_itens_receita, receita_id, callback=mostrar_itens, key="ficha_itens")
+
+        def on_insumo(*_):
+            var_un.set(unidades_insumos.get(var_insumo.get()) or "un")
+
+        def adicionar():
+            if not var_insumo.get():
+                messagebox.showwarning("Aviso", "Selecione um insumo.", parent=top)
+                return
+            try:
+                qtd = float(var_qtd.get().replace(",", "."))
+            except ValueError:
+                messagebox.showwarning("Aviso", "Quantidade inválida.", parent=top)
+                return
+            insumo_id = int(var_insumo.get().split(" - ")[0])
+            self._executar_servico(salvar_item_receita, receita_id, insumo_id, qtd, var_un.get(), callback=recarregar)
+
+        def remover():
+            sel_item = tree.selection()
+            if not sel_item:
+                messagebox.showwarning("Aviso", "Selecione um item para remover.", parent=top)
+                return
+            self._executar_servico(remover_item_receita, receita_id, int(sel_item[0]), callback=recarregar)
+
+        combo.bind("<<ComboboxSelected>>", on_insumo)
+        ttk.Button(form, text="Adicionar / atualizar", command=adicionar).grid(row=0, column=5, padx=8)
+        rodape = ttk.Frame(top)
+        rodape.pack(fill="x", padx=8, pady=8)
+        ttk.Button(rodape, text="Remover selecionado", command=remover).pack(side="left")
+        ttk.Label(rodape, textvariable=var_custo, font=("TkDefaultFont", 10, "bold")).pack(side="right")
+
+        self.executor.submit(listar_insumos, callback=mostrar_insumos, key="ficha_insumos")
+        recarregar()
+
     def delete_receita_selected(self):
         sel = self.tree_receitas.selection()
         if not sel:
@@ -651,21 +927,29 @@ class BravusApp(Tk):
         vals = self.tree_receitas.item(iid, "values")
         receita_id = int(vals[0])
         if messagebox.askyesno("Confirmar", f"Excluir receita '{vals[1]}'?"):
-            delete_receita_db(receita_id)
-            self.load_receitas()
-            self._reload_receitas_combo()
+            def ok(_):
+                self.tree_receitas.delete(iid)
+                self._reload_receitas_combo()
+                # As vendas da receita saem em cascata: recarrega vendas e relatórios
+                self.load_vendas()
+                self.load_relatorios_data()
+                self.load_insumos()  # Os insumos dessas vendas voltaram ao estoque
+            self._executar_servico(delete_receita_db, receita_id, sucesso="Receita removida.", callback=ok)
 
     # --- ABA DE VENDAS ---
     def build_vendas(self):
         frm = self.tab_vendas
 
-        top = ttk.LabelFrame(frm, text="Registrar Venda")
+        top = ttk.LabelFrame(frm, text="Novo Pedido")
         top.pack(fill="x", padx=8, pady=8)
 
         self.vnd_receita = StringVar()
         self.vnd_quantidade = StringVar(value="1")
         self.vnd_preco = StringVar()
         self.vnd_taxa = StringVar(value="0")
+        self.vnd_total = StringVar(value=fmt_money(0))
+        self._precos_receitas = {}  # id -> preço, preenchido junto com o combo
+        self._carrinho = []  # itens do pedido em montagem: (receita_id, nome, quantidade, preco_unit)
 
         ttk.Label(top, text="Receita:").grid(row=0, column=0, sticky="w", padx=4, pady=4)
         # Combobox (lista suspensa) para selecionar receitas
@@ -679,40 +963,56 @@ class BravusApp(Tk):
         ttk.Label(top, text="Preço unit.:").grid(row=0, column=4, sticky="w", padx=4, pady=4)
         ttk.Entry(top, textvariable=self.vnd_preco, width=12).grid(row=0, column=5, padx=4, pady=4)
 
-        ttk.Label(top, text="Taxa plataforma:").grid(row=0, column=6, sticky="w", padx=4, pady=4)
-        ttk.Entry(top, textvariable=self.vnd_taxa, width=8).grid(row=0, column=7, padx=4, pady=4)
-        ttk.Label(top, text="% ou fração").grid(row=0, column=8, sticky="w")
-
-        ttk.Button(top, text="Registrar", command=self._registrar_venda).grid(row=0, column=9, padx=8)
+        ttk.Button(top, text="Adicionar ao pedido", command=self._adicionar_item_pedido).grid(row=0, column=6, padx=8)
+
+        # Carrinho: os itens só vão para o banco juntos, ao fechar o pedido
+        self.tree_carrinho = ttk.Treeview(top, columns=("receita", "qtd", "preco", "subtotal"),
+                                          show="headings", height=4)
+        for c, txt, w in [("receita", "Receita", 260), ("qtd", "Qtd", 60),
+                          ("preco", "Preço Unit.", 110), ("subtotal", "Subtotal", 110)]:
+            self.tree_carrinho.heading(c, text=txt)
+            self.tree_carrinho.column(c, width=w, anchor="w")
+        self.tree_carrinho.grid(row=1, column=0, columnspan=7, sticky="we", padx=4, pady=4)
+
+        fechar = ttk.Frame(top)
+        fechar.grid(row=2, column=0, columnspan=7, sticky="we", padx=4, pady=4)
+        ttk.Button(fechar, text="Remover item", command=self._remover_item_pedido).pack(side="left")
+        ttk.Button(fechar, text="Limpar", command=self._limpar_pedido).pack(side="left", padx=6)
+        ttk.Label(fechar, text="Taxa plataforma:").pack(side="left", padx=(18, 4))
+        ttk.Entry(fechar, textvariable=self.vnd_taxa, width=8).pack(side="left")
+        ttk.Label(fechar, text="% ou fração").pack(side="left", padx=4)
+        ttk.Button(fechar, text="Fechar pedido", command=self._fechar_pedido).pack(side="right")
+        ttk.Label(fechar, textvariable=self.vnd_total, font=("TkDefaultFont", 11, "bold")).pack(side="right", padx=12)
+        ttk.Label(fechar, text="Total:").pack(side="right")
 
         mid = ttk.LabelFrame(frm, text="Vendas Recentes")
         mid.pack(fill="both", expand=True, padx=8, pady=8)
 
-        cols = ("id", "receita", "qtd", "preco_unit", "taxa", "bruto", "custo", "lucro", "data")
-        self.tree_vendas = ttk.Treeview(mid, columns=cols, show="headings")
         headers = [("id", "ID", 60), ("receita", "Receita", 200), ("qtd", "Qtd", 60),
                    ("preco_unit", "Preço Unit.", 110), ("taxa", "Taxa", 80),
                    ("bruto", "Total Bruto", 110), ("custo", "Custo", 100),
-                   ("lucro", "Lucro Líquido", 120), ("data", "Data", 160)]
-        for c, txt, w in headers:
-            self.tree_vendas.heading(c, text=txt)
-            self.tree_vendas.column(c, width=w, anchor="w")
-        self.tree_vendas.pack(fill="both", expand=True, side="left")
-        sb = ttk.Scrollbar(mid, orient="vertical", command=self.tree_vendas.yview)
-        self.tree_vendas.configure(yscroll=sb.set)
-        sb.pack(side="right", fill="y")
+                   ("lucro", "Lucro Líquido", 120), ("data", "Data", 160), ("pedido", "Pedido", 70)]
+        # Histórico paginado: carrega só as páginas perto da área visível
+        self.pag_vendas = PagedTreeview(mid, headers, listar_vendas_pagina, self._fmt_venda, contar_vendas,
+                                        executor=self.executor)
+        self.pag_vendas.pack(fill="both", expand=True)
+        self.tree_vendas = self.pag_vendas.tree
 
         btns = ttk.Frame(frm)
         btns.pack(fill="x", padx=8, pady=4)
         ttk.Button(btns, text="Recarregar", command=self.load_vendas).pack(side="left")
         ttk.Button(btns, text="Excluir selecionado", command=self.delete_venda_selected).pack(side="left", padx=6)
+        ttk.Button(btns, text="Importar pedidos (delivery)...", command=self.importar_pedidos_dialog).pack(side="left", padx=6)
 
         self._reload_receitas_combo()
         self.load_vendas()
 
-    # Atualiza o Combobox com as receitas cadastradas
+    # Atualiza o Combobox com as receitas cadastradas (e guarda os preços)
     def _reload_receitas_combo(self):
-        recs = listar_receitas()
+        self.executor.submit(listar_receitas, callback=self._mostrar_receitas_combo, key="combo_receitas")
+
+    def _mostrar_receitas_combo(self, recs):
+        self._precos_receitas = {r[0]: r[2] for r in recs}
         nomes = [f"{r[0]} - {r[1]}" for r in recs]
         self.combo_receitas["values"] = nomes
         if nomes and not self.vnd_receita.get():
@@ -726,14 +1026,13 @@ class BravusApp(Tk):
             if not sel:
                 return
             rec_id = int(sel.split(" - ")[0])
-            for r in listar_receitas():
-                if r[0] == rec_id:
-                    self.vnd_preco.set(str(r[2]).replace(".", ","))
-                    break
+            if rec_id in self._precos_receitas:
+                self.vnd_preco.set(Centavos(self._precos_receitas[rec_id]).em_texto())
         except Exception:
             pass
 
-    def _registrar_venda(self):
+    # Põe a receita selecionada no carrinho (a mesma receita e preço somam na quantidade)
+    def _adicionar_item_pedido(self):
         sel = self.vnd_receita.get().strip()
         if not sel:
             messagebox.showwarning("Aviso", "Selecione uma receita.")
@@ -741,30 +1040,109 @@ class BravusApp(Tk):
         try:
             receita_id = int(sel.split(" - ")[0])
             quantidade = int(self.vnd_quantidade.get())
-            preco_unit = float(self.vnd_preco.get().replace(",", "."))
+            preco_unit = Centavos.de_reais(self.vnd_preco.get())
+        except ValueError:
+            messagebox.showwarning("Aviso", "Verifique quantidade e preço.")
+            return
+        if quantidade <= 0 or preco_unit <= 0:
+            messagebox.showwarning("Aviso", "Quantidade e preço devem ser maiores que zero.")
+            return
+        nome = sel.split(" - ", 1)[1]
+        for i, (r, _, q, p) in enumerate(self._carrinho):
+            if r == receita_id and p == preco_unit:
+                self._carrinho[i] = (r, nome, q + quantidade, p)
+                break
+        else:
+            self._carrinho.append((receita_id, nome, quantidade, preco_unit))
+        self.vnd_quantidade.set("1")
+        self._mostrar_carrinho()
+
+    def _remover_item_pedido(self):
+        sel = self.tree_carrinho.selection()
+        if not sel:
+            messagebox.showwarning("Aviso", "Selecione um item do pedido.")
+            return
+        del self._carrinho[int(sel[0])]
+        self._mostrar_carrinho()
+
+    def _limpar_pedido(self):
+        self._carrinho = []
+        self._mostrar_carrinho()
+
+    def _mostrar_carrinho(self):
+        self.tree_carrinho.delete(*self.tree_carrinho.get_children())
+        for i, (_, nome, quantidade, preco) in enumerate(self._carrinho):
+            self.tree_carrinho.insert("", "end", iid=str(i),
+                                      values=(nome, quantidade, fmt_money(preco), fmt_money(quantidade * preco)))
+        self.vnd_total.set(fmt_money(sum(q * p for _, _, q, p in self._carrinho)))
+
+    # Grava o pedido inteiro de uma vez: uma transação, uma mensagem e uma
+    # atualização dos relatórios e dos insumos, não importa quantos itens.
+    @rastreio.rastreado("_fechar_pedido")
+    def _fechar_pedido(self):
+        if not self._carrinho:
+            messagebox.showwarning("Aviso", "Adicione ao menos um item ao pedido.")
+            return
+        try:
             taxa_in = self.vnd_taxa.get().replace("%", "").strip()
             taxa = float(taxa_in.replace(",", "."))
             if taxa > 1:
                 taxa = taxa / 100.0
-            if quantidade <= 0 or preco_unit <= 0 or taxa < 0:
-                raise ValueError
         except ValueError:
-            messagebox.showwarning("Aviso", "Verifique quantidade, preço e taxa.")
+            messagebox.showwarning("Aviso", "Verifique a taxa da plataforma.")
+            return
+        itens = [(r, q, p) for r, _, q, p in self._carrinho]
+
+        def ok(resultado):
+            _, vendas = resultado
+            for venda in vendas:
+                self.pag_vendas.upsert(venda)
+            self._limpar_pedido()
+            self.load_relatorios_data() # Atualiza os relatórios instantaneamente
+            self.load_insumos()  # O pedido deu baixa no estoque dos insumos
+        self._executar_servico(registrar_pedido, itens, taxa,
+                               sucesso="Pedido registrado com sucesso!", callback=ok)
+
+    # Importa a exportação de pedidos de um aplicativo (CSV ou JSON) com a taxa da plataforma.
+    def importar_pedidos_dialog(self):
+        caminho = filedialog.askopenfilename(
+            parent=self, title="Importar pedidos",
+            filetypes=[("Exportações de pedidos", "*.csv *.json"), ("Todos os arquivos", "*.*")])
+        if not caminho:
+            return
+        origem = simpledialog.askstring("Importar pedidos", "Plataforma (ex.: ifood):", parent=self)
+        if not origem or not origem.strip():
+            return
+        taxa_txt = simpledialog.askstring("Importar pedidos", "Taxa da plataforma (% ou fração):",
+                                          initialvalue=self.vnd_taxa.get(), parent=self)
+        if taxa_txt is None:
+            return
+        try:
+            taxa = ler_taxa(taxa_txt)
+        except ValueError:
+            messagebox.showwarning("Aviso", "Taxa inválida.")
             return
 
-        registrar_venda(receita_id, quantidade, preco_unit, taxa)
-        self.load_vendas()
-        self.load_relatorios_data() # Atualiza os relatórios instantaneamente
+        def ok(resumo):
+            if resumo["gravado"]:
+                self.load_vendas()
+                self.load_relatorios_data()
+                self.load_insumos()  # Os pedidos deram baixa no estoque
+            if resumo["erros"] or resumo["faltando"]:
+                messagebox.showwarning("Importação de pedidos", formatar_resumo_pedidos(resumo))
+            else:
+                messagebox.showinfo("Importação de pedidos", formatar_resumo_pedidos(resumo))
+        self._executar_servico(importar_pedidos, caminho, origem, taxa, callback=ok)
 
+    @rastreio.rastreado("load_vendas")
     def load_vendas(self):
-        for i in self.tree_vendas.get_children():
-            self.tree_vendas.delete(i)
-        for v in listar_vendas():
-            taxa_pct = f"{round(v[4]*100, 2)}%"
-            self.tree_vendas.insert("", "end", values=(
-                v[0], v[1], v[2], fmt_money(v[3]), taxa_pct, fmt_money(v[5]),
-                fmt_money(v[6]), fmt_money(v[7]), v[8]
-            ))
+        self.pag_vendas.reload()
+
+    @staticmethod
+    def _fmt_venda(v):
+        taxa_pct = f"{round(v[4]*100, 2)}%"
+        return (v[0], v[1], v[2], fmt_money(v[3]), taxa_pct, fmt_money(v[5]),
+                fmt_money(v[6]), fmt_money(v[7]), v[8], v[9] or "")
 
     def delete_venda_selected(self):
         sel = self.tree_vendas.selection()
@@ -775,9 +1153,11 @@ class BravusApp(Tk):
         vals = self.tree_vendas.item(iid, "values")
         venda_id = int(vals[0])
         if messagebox.askyesno("Confirmar", f"Excluir venda ID {venda_id}?"):
-            delete_venda_db(venda_id)
-            self.load_vendas()
-            self.load_relatorios_data()
+            def ok(_):
+                self.pag_vendas.remove(venda_id)
+                self.load_relatorios_data()
+                self.load_insumos()  # Os insumos da venda voltaram ao estoque
+            self._executar_servico(delete_venda_db, venda_id, sucesso="Venda removida.", callback=ok)
 
     # --- ABA DE RELATÓRIOS ---
     def build_relatorios(self):
@@ -785,29 +1165,27 @@ class BravusApp(Tk):
         self.cards = ttk.Frame(frm)
         self.cards.pack(fill="x", padx=8, pady=8)
 
-        self.var_card_hoje = StringVar()
-        self.var_card_7d = StringVar()
-        self.var_card_30d = StringVar()
-        self.var_card_all = StringVar()
+        # Um cartão por janela de janelas_padrao(); para criar outro cartão basta
+        # acrescentar uma janela lá, sem nova consulta ao banco.
+        self.var_cards = {}
 
         def card(parent, title, var):
             box = ttk.LabelFrame(parent, text=title)
             box.pack(side="left", expand=True, fill="x", padx=6)
             ttk.Label(box, textvariable=var, font=("TkDefaultFont", 12, "bold")).pack(padx=8, pady=8)
 
-        card(self.cards, "Hoje", self.var_card_hoje)
-        card(self.cards, "Últimos 7 dias", self.var_card_7d)
-        card(self.cards, "Últimos 30 dias", self.var_card_30d)
-        card(self.cards, "Geral", self.var_card_all)
+        for nome, _, _ in janelas_padrao():
+            self.var_cards[nome] = StringVar()
+            card(self.cards, nome, self.var_cards[nome])
 
         mid = ttk.LabelFrame(frm, text="Vendas (Geral)")
         mid.pack(fill="both", expand=True, padx=8, pady=8)
 
-        cols = ("periodo", "qtd_vendas", "qtd_itens", "faturamento", "lucro")
+        cols = ("periodo", "qtd_pedidos", "qtd_vendas", "qtd_itens", "faturamento", "ticket", "lucro")
         self.tree_rel = ttk.Treeview(mid, columns=cols, show="headings")
-        for c, txt, w in [("periodo", "Período", 160), ("qtd_vendas", "Vendas", 90),
+        for c, txt, w in [("periodo", "Período", 160), ("qtd_pedidos", "Pedidos", 90), ("qtd_vendas", "Vendas", 90),
                           ("qtd_itens", "Itens", 90), ("faturamento", "Faturamento", 140),
-                          ("lucro", "Lucro Líquido", 140)]:
+                          ("ticket", "Ticket Médio", 120), ("lucro", "Lucro Líquido", 140)]:
             self.tree_rel.heading(c, text=txt)
             self.tree_rel.column(c, width=w, anchor="w")
         self.tree_rel.pack(fill="both", expand=True, side="left")
@@ -817,47 +1195,134 @@ class BravusApp(Tk):
 
         self.load_relatorios_data()
 
-    # Agrega dados do banco por data para gerar os relatórios
-    def _agg_vendas(self, dt_ini=None, dt_fim=None):
-        conn = get_conn()
-        cur = conn.cursor()
-        sql = "SELECT COUNT(*), SUM(quantidade), SUM(total_bruto), SUM(lucro_liquido) FROM vendas WHERE 1=1"
-        params = []
-        if dt_ini:
-            sql += " AND datetime(data) >= datetime(?)"
-            params.append(dt_ini)
-        if dt_fim:
-            sql += " AND datetime(data) < datetime(?)"
-            params.append(dt_fim)
-        cur.execute(sql, params)
-        row = cur.fetchone()
-        conn.close()
-        if not row or row[0] is None:
-            return 0, 0, 0.0, 0.0
-        return row[0] or 0, row[1] or 0, float(row[2] or 0.0), float(row[3] or 0.0)
-
+    @rastreio.rastreado("load_relatorios_data")
     def load_relatorios_data(self):
-        hoje_ini = datetime.now().strftime("%Y-%m-%d 00:00:00")
-        amanha_ini = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d 00:00:00")
-        d7_ini = (datetime.now() - timedelta(days=6)).strftime("%Y-%m-%d 00:00:00")
-        d30_ini = (datetime.now() - timedelta(days=29)).strftime("%Y-%m-%d 00:00:00")
-
-        c_hoje = self._agg_vendas(hoje_ini, amanha_ini)
-        c_7 = self._agg_vendas(d7_ini, amanha_ini)
-        c_30 = self._agg_vendas(d30_ini, amanha_ini)
-        c_all = self._agg_vendas()
-
-        self.var_card_hoje.set(f"Vendas: {c_hoje[0]}  |  Itens: {c_hoje[1]}  |  Fat: {fmt_money(c_hoje[2])}  |  Lucro: {fmt_money(c_hoje[3])}")
-        self.var_card_7d.set(  f"Vendas: {c_7[0]}    |  Itens: {c_7[1]}    |  Fat: {fmt_money(c_7[2])}    |  Lucro: {fmt_money(c_7[3])}")
-        self.var_card_30d.set( f"Vendas: {c_30[0]}   |  Itens: {c_30[1]}   |  Fat: {fmt_money(c_30[2])}   |  Lucro: {fmt_money(c_30[3])}")
-        self.var_card_all.set( f"Vendas: {c_all[0]}  |  Itens: {c_all[1]}  |  Fat: {fmt_money(c_all[2])}  |  Lucro: {fmt_money(c_all[3])}")
-
-        for i in self.tree_rel.get_children():
-            self.tree_rel.delete(i)
-        self.tree_rel.insert("", "end", values=("Hoje", c_hoje[0], c_hoje[1], fmt_money(c_hoje[2]), fmt_money(c_hoje[3])))
-        self.tree_rel.insert("", "end", values=("Últimos 7 dias", c_7[0], c_7[1], fmt_money(c_7[2]), fmt_money(c_7[3])))
-        self.tree_rel.insert("", "end", values=("Últimos 30 dias", c_30[0], c_30[1], fmt_money(c_30[2]), fmt_money(c_30[3])))
-        self.tree_rel.insert("", "end", values=("Geral", c_all[0], c_all[1], fmt_money(c_all[2]), fmt_money(c_all[3])))
+        # Todas as janelas numa única consulta ao banco, fora da thread da janela
+        self.executor.submit(agg_relatorio_janelas, janelas_padrao(),
+                             callback=self._mostrar_relatorios, key="relatorios")
+
+    def _mostrar_relatorios(self, totais):
+        with rastreio.fase("format"):
+            cards = {nome: f"Pedidos: {c[4]}  |  Itens: {c[1]}  |  Fat: {fmt_money(c[2])}  |  "
+                           f"Ticket: {fmt_money(c[5])}  |  Lucro: {fmt_money(c[3])}" for nome, c in totais.items()}
+            linhas = [(nome, c[4], c[0], c[1], fmt_money(c[2]), fmt_money(c[5]), fmt_money(c[3]))
+                      for nome, c in totais.items()]
+        with rastreio.fase("render"):
+            for i in self.tree_rel.get_children():
+                self.tree_rel.delete(i)
+            for nome, texto in cards.items():
+                self.var_cards[nome].set(texto)
+            for valores in linhas:
+                self.tree_rel.insert("", "end", values=valores)
+
+    # --- ABA DE DIAGNÓSTICO (escondida) ---
+    # As consultas mais pesadas desde que o programa abriu (ou desde o "Zerar"),
+    # medidas pelo diagnostico.py, e as últimas ações da tela com o tempo de
+    # cada fase (rastreio.py). Os números ficam em memória; não vão ao banco.
+    ORDENS_DIAGNOSTICO = {"Tempo total": "total", "Média": "media", "Máximo": "maximo", "Execuções": "execucoes"}
+
+    def build_diagnostico(self):
+        frm = self.tab_diag
+        top = ttk.Frame(frm)
+        top.pack(fill="x", padx=8, pady=8)
+
+        self.diag_ordem = StringVar(value="Tempo total")
+        self.diag_info = StringVar()
+        ttk.Label(top, text="Ordenar por:").pack(side="left")
+        combo = ttk.Combobox(top, textvariable=self.diag_ordem, values=list(self.ORDENS_DIAGNOSTICO),
+                             width=14, state="readonly")
+        combo.pack(side="left", padx=4)
+        combo.bind("<<ComboboxSelected>>", lambda *_: self.load_diagnostico())
+        ttk.Button(top, text="Atualizar", command=self.load_diagnostico).pack(side="left", padx=6)
+        ttk.Button(top, text="Zerar", command=self._zerar_diagnostico).pack(side="left")
+        ttk.Button(top, text="Exportar rastro (Chrome)...", command=self._exportar_rastro).pack(side="right")
+        ttk.Label(top, textvariable=self.diag_info).pack(side="left", padx=12)
+
+        mid = ttk.LabelFrame(frm, text="Consultas mais pesadas")
+        mid.pack(fill="both", expand=True, padx=8, pady=8)
+        cols = ("consulta", "execucoes", "total", "media", "p95", "maximo", "linhas")
+        self.tree_diag = ttk.Treeview(mid, columns=cols, show="headings", selectmode="browse")
+        for c, txt, w, anchor in [("consulta", "Consulta", 430, "w"), ("execucoes", "Execuções", 80, "e"),
+                                  ("total", "Total (ms)", 90, "e"), ("media", "Média (ms)", 90, "e"),
+                                  ("p95", "p95 (ms)", 80, "e"), ("maximo", "Máx. (ms)", 80, "e"),
+                                  ("linhas", "Linhas", 90, "e")]:
+            self.tree_diag.heading(c, text=txt)
+            self.tree_diag.column(c, width=w, anchor=anchor)
+        self.tree_diag.pack(fill="both", expand=True, side="left")
+        sb = ttk.Scrollbar(mid, orient="vertical", command=self.tree_diag.yview)
+        self.tree_diag.configure(yscroll=sb.set)
+        sb.pack(side="right", fill="y")
+        self.tree_diag.bind("<<TreeviewSelect>>", self._mostrar_consulta_diag)
+
+        # SQL completo e histograma da consulta selecionada
+        self.txt_diag = Text(frm, height=6, wrap="word")
+        self.txt_diag.pack(fill="x", padx=8, pady=(0, 8))
+        self._formas_diag = {}
+
+        bottom = ttk.LabelFrame(frm, text="Ações recentes (ms)")
+        bottom.pack(fill="x", padx=8, pady=(0, 8))
+        cols = ("acao", "hora", "total") + rastreio.FASES
+        self.tree_acoes = ttk.Treeview(bottom, columns=cols, show="headings", height=7)
+        for c, txt, w in [("acao", "Ação", 300), ("hora", "Hora", 80), ("total", "Total", 90),
+                          ("espera", "Fila", 80), ("db", "Banco", 90), ("format", "Formatação", 90),
+                          ("render", "Tabela", 90)]:
+            self.tree_acoes.heading(c, text=txt)
+            self.tree_acoes.column(c, width=w, anchor="w" if c in ("acao", "hora") else "e")
+        self.tree_acoes.pack(fill="x")
+
+    def _alternar_diagnostico(self, *_):
+        if self.nb.tab(self.tab_diag, "state") == "hidden":
+            self.nb.add(self.tab_diag)  # volta para o mesmo lugar
+            self.nb.select(self.tab_diag)
+            self.load_diagnostico()
+        else:
+            self.nb.hide(self.tab_diag)
+
+    def load_diagnostico(self):
+        for i in self.tree_diag.get_children():
+            self.tree_diag.delete(i)
+        self._formas_diag = {}
+        for n, (forma, execucoes, total, media, p95, maximo, linhas) in enumerate(
+                diagnostico.mais_lentas(50, self.ORDENS_DIAGNOSTICO[self.diag_ordem.get()])):
+            self._formas_diag[str(n)] = forma
+            self.tree_diag.insert("", "end", iid=str(n), values=(
+                forma[:200], execucoes, f"{total:.1f}", f"{media:.2f}", f"{p95:.1f}", f"{maximo:.1f}", linhas))
+        self.tree_acoes.delete(*self.tree_acoes.get_children())
+        for nome, hora, total, fases in rastreio.acoes_recentes(50):
+            self.tree_acoes.insert("", "end", values=(nome, hora, f"{total:.1f}")
+                                   + tuple(f"{fases.get(f, 0):.1f}" for f in rastreio.FASES))
+        info = diagnostico.situacao()
+        self.diag_info.set(f"{info['formas']} consultas diferentes  |  lentas (>= {info['limite_ms']:g} ms): "
+                           f"{info['lentas']} em {info['arquivo']}")
+
+    def _mostrar_consulta_diag(self, *_):
+        sel = self.tree_diag.selection()
+        self.txt_diag.delete("1.0", "end")
+        if not sel or sel[0] not in self._formas_diag:
+            return
+        forma = self._formas_diag[sel[0]]
+        faixas = "  ".join(f"{rotulo}: {n}" for rotulo, n in diagnostico.histograma(forma))
+        self.txt_diag.insert("end", f"{forma}\n\n{faixas}")
+
+    def _zerar_diagnostico(self):
+        diagnostico.zerar()
+        rastreio.limpar()
+        self.txt_diag.delete("1.0", "end")
+        self.load_diagnostico()
+
+    # Grava o rastro no formato do Chrome (chrome://tracing ou ui.perfetto.dev).
+    def _exportar_rastro(self):
+        caminho = filedialog.asksaveasfilename(parent=self, title="Exportar rastro", defaultextension=".json",
+                                               initialfile="bravus_rastro.json",
+                                               filetypes=[("Trace do Chrome", "*.json")])
+        if not caminho:
+            return
+        try:
+            n = rastreio.exportar_chrome(caminho)
+        except OSError as e:
+            messagebox.showerror("Exportar rastro", str(e))
+            return
+        messagebox.showinfo("Exportar rastro", f"{n} evento(s) gravados em {caminho}.")
 
 # --- TELA DE LOGIN ---
 class LoginWindow(Tk):
@@ -896,6 +1361,26 @@ class LoginWindow(Tk):
             messagebox.showerror("Erro", "Usuário ou senha inválidos.")
 
 # --- PONTO DE PARTIDA ---
+# Sem argumentos abre o sistema; com um comando roda uma tarefa de manutenção
+# do backend (ver backend.main):
+#   python crud.py verificar-planos   -> confere se as consultas usam os índices
+#   python crud.py reconstruir-resumo -> recalcula vendas_diario a partir das vendas
+#   python crud.py migrar             -> só prepara/migra o banco, mostrando o progresso
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BRAV'US BURGUER - Sistema Restaurante")
+    parser.add_argument("comando", nargs="?", choices=backend.COMANDOS)
+    args = parser.parse_args(argv)
+    if args.comando:
+        return backend.main([args.comando])
+
+    diagnostico.instalar() # Mede as consultas desde a primeira conexão
+    init_db(progresso=backend.progresso_migracao) # Garante que o banco existe
+    try:
+        LoginWindow().mainloop() # Abre a tela de login
+        return 0
+    finally:
+        db.close_all()
+        report_db.close_all()
+
 if __name__ == "__main__":
-    init_db() # Garante que o banco existe
-    LoginWindow().mainloop() # Abre a tela de login
\ No newline at end of file
+    sys.exit(main())
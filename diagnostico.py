@@ -0,0 +1,361 @@
+# arquivo: diagnostico.py
+# Cronômetro de consultas: troca a classe das conexões do backend por uma que
+# mede cada comando SQL (do execute até a última linha lida) e conta as linhas
+# devolvidas (ou afetadas, nas escritas). Os tempos vão para um histograma por
+# "forma" da consulta (o SQL com os valores trocados por ?), em memória, e os
+# comandos acima do limite vão para um log rotativo com o EXPLAIN QUERY PLAN.
+# A aba escondida "Diagnóstico" (Ctrl+Shift+D) mostra as piores consultas.
+#   import diagnostico; diagnostico.instalar()   -> antes de abrir as conexões
+#   diagnostico.mais_lentas(10)                   -> [(forma, execuções, total ms, ...)]
+# Variáveis de ambiente: BRAVUS_LENTAS_MS (limite, padrão 100 ms) e
+# BRAVUS_LENTAS_ARQUIVO (padrão bravus_lentas.log ao lado do banco).
+
+# --- IMPORTAÇÕES ---
+# logging.handlers: o log de consultas lentas gira sozinho ao chegar no tamanho máximo.
+# queue/threading: o EXPLAIN e a escrita do log ficam numa thread à parte,
+# para não somar tempo à consulta que já estava lenta.
+import os
+import re
+import time
+import queue
+import bisect
+import sqlite3
+import logging
+import threading
+import logging.handlers
+from datetime import datetime
+
+import backend
+
+# --- CONFIGURAÇÃO ---
+LIMITE_LENTA_MS = float(os.environ.get("BRAVUS_LENTAS_MS", "100"))
+ARQUIVO_LENTAS = os.environ.get("BRAVUS_LENTAS_ARQUIVO", os.path.join(backend.BASE_DIR, "bravus_lentas.log"))
+TAMANHO_LOG = 1024 * 1024   # bytes por arquivo
+ARQUIVOS_LOG = 3            # bravus_lentas.log.1 .. .3
+# Limites (ms) das faixas do histograma; a última faixa é "acima de 10 s".
+FAIXAS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_ativo = True
+_lock = threading.Lock()
+_lock_log = threading.Lock()   # abre/fecha/escreve o arquivo de log
+_formas = {}
+_cache_formas = {}
+_fila_lentas = queue.Queue(maxsize=500)
+_gravador = None
+_contadores = {"lentas": 0, "descartadas": 0}
+
+# Liga ou desliga a medição (desligada, as conexões medidas custam quase nada a mais).
+def ativar(ligado=True):
+    global _ativo
+    _ativo = bool(ligado)
+
+def ativo():
+    return _ativo
+
+# Troca o limite do log de lentas e/ou o arquivo (o novo vale para as próximas).
+def configurar(limite_ms=None, arquivo=None):
+    global LIMITE_LENTA_MS, ARQUIVO_LENTAS
+    if limite_ms is not None:
+        LIMITE_LENTA_MS = float(limite_ms)
+    if arquivo is not None:
+        with _lock_log:
+            ARQUIVO_LENTAS = arquivo
+            _fechar_log()
+
+# --- FORMA DA CONSULTA ---
+# Mesma consulta com valores diferentes = mesma forma: textos e números viram ?,
+# listas "IN (?, ?, ?)" viram "IN (...)" e os espaços são normalizados.
+_RE_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_RE_ESPACOS = re.compile(r"\s+")
+_RE_PLANO = re.compile(r"^\s*(WITH|SELECT|INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+def forma_consulta(sql):
+    forma = _cache_formas.get(sql)
+    if forma is None:
+        forma = _RE_ESPACOS.sub(" ", sql).strip()
+        forma = _RE_NUMERO.sub("?", _RE_TEXTO.sub("?", forma))
+        forma = _RE_LISTA.sub("(...)", forma)
+        if len(_cache_formas) > 5000:
+            _cache_formas.clear()
+        _cache_formas[sql] = forma
+    return forma
+
+# Estatística de uma forma: execuções, tempo total e máximo (segundos), linhas
+# e quantas execuções caíram em cada faixa de FAIXAS_MS.
+class Forma:
+    __slots__ = ("execucoes", "total", "maximo", "linhas", "faixas")
+
+    def __init__(self):
+        self.execucoes = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.linhas = 0
+        self.faixas = [0] * (len(FAIXAS_MS) + 1)
+
+    # Percentil aproximado pelo histograma: o limite da faixa onde ele cai.
+    def percentil(self, p):
+        alvo = p / 100 * self.execucoes
+        acumulado = 0
+        for i, n in enumerate(self.faixas):
+            acumulado += n
+            if n and acumulado >= alvo:
+                return min(FAIXAS_MS[i], self.maximo * 1000) if i < len(FAIXAS_MS) else self.maximo * 1000
+        return 0.0
+
+def _registrar(sql, parametros, segundos, linhas, caminho):
+    forma = forma_consulta(sql)
+    with _lock:
+        f = _formas.get(forma)
+        if f is None:
+            f = _formas[forma] = Forma()
+        f.execucoes += 1
+        f.total += segundos
+        f.linhas += linhas
+        if segundos > f.maximo:
+            f.maximo = segundos
+        f.faixas[bisect.bisect_left(FAIXAS_MS, segundos * 1000)] += 1
+    if segundos * 1000 >= LIMITE_LENTA_MS:
+        _enfileirar_lenta(sql, parametros, segundos, linhas, caminho)
+
+# --- CONEXÃO E CURSOR MEDIDOS ---
+# O cursor guarda a medida da consulta em andamento [sql, parâmetros, segundos,
+# linhas] e soma o tempo de cada fetch. A medida é fechada quando as linhas
+# acabam, no próximo execute, no close() ou quando o cursor é descartado.
+class CursorMedido(sqlite3.Cursor):
+    _medida = None
+
+    def _fechar_medida(self):
+        medida = self._medida
+        if medida is not None:
+            self._medida = None
+            _registrar(medida[0], medida[1], medida[2], medida[3], getattr(self.connection, "caminho", None))
+
+    def _medir(self, fn, sql, parametros):
+        self._fechar_medida()
+        if not _ativo:
+            return fn()
+        inicio = time.perf_counter()
+        try:
+            fn()
+        except BaseException:
+            self._medida = [sql, parametros, time.perf_counter() - inicio, 0]
+            self._fechar_medida()
+            raise
+        self._medida = [sql, parametros, time.perf_counter() - inicio, 0]
+        if self.description is None:
+            # Escrita sem RETURNING: conta as linhas afetadas e fecha já
+            self._medida[3] = max(self.rowcount, 0)
+            self._fechar_medida()
+        return self
+
+    def execute(self, sql, parametros=()):
+        return self._medir(lambda: super(CursorMedido, self).execute(sql, parametros), sql, parametros)
+
+    def executemany(self, sql, parametros):
+        if not isinstance(parametros, (list, tuple)):
+            parametros = list(parametros)
+        return self._medir(lambda: super(CursorMedido, self).executemany(sql, parametros), sql,
+                           parametros[0] if parametros else ())
+
+    def executescript(self, script):
+        return self._medir(lambda: super(CursorMedido, self).executescript(script), script, None)
+
+    def _ler(self, fn):
+        medida = self._medida
+        if medida is None:
+            return fn()
+        inicio = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            medida[2] += time.perf_counter() - inicio
+
+    def fetchone(self):
+        linha = self._ler(super().fetchone)
+        if self._medida is not None:
+            if linha is None:
+                self._fechar_medida()
+            else:
+                self._medida[3] += 1
+        return linha
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        linhas = self._ler(lambda: super(CursorMedido, self).fetchmany(size))
+        if self._medida is not None:
+            self._medida[3] += len(linhas)
+            if len(linhas) < size:
+                self._fechar_medida()
+        return linhas
+
+    def fetchall(self):
+        linhas = self._ler(super().fetchall)
+        if self._medida is not None:
+            self._medida[3] += len(linhas)
+            self._fechar_medida()
+        return linhas
+
+    # Sem medida em andamento o for usa o próprio cursor (sem custo por linha).
+    def __iter__(self):
+        return self if self._medida is None else self._iterar()
+
+    def _iterar(self):
+        while True:
+            linha = self.fetchone()
+            if linha is None:
+                return
+            yield linha
+
+    def close(self):
+        self._fechar_medida()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._fechar_medida()
+        except Exception:
+            pass
+
+# Conexão que cria CursorMedido em todo comando (o execute direto da conexão
+# também passa por ele) e mede COMMIT/ROLLBACK, onde o disco é esperado.
+class ConexaoMedida(sqlite3.Connection):
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.caminho = database
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def _fim_transacao(self, fn, comando):
+        if not _ativo or not self.in_transaction:
+            return fn()
+        inicio = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            _registrar(comando, None, time.perf_counter() - inicio, 0, self.caminho)
+
+    def commit(self):
+        return self._fim_transacao(super().commit, "COMMIT")
+
+    def rollback(self):
+        return self._fim_transacao(super().rollback, "ROLLBACK")
+
+# Passa a medir todas as conexões do backend (db e report_db). As que já
+# estavam abertas são fechadas para reabrir medidas: chame na partida do
+# programa, antes de as threads começarem a usar o banco.
+def instalar(gerenciadores=None):
+    for gerenciador in gerenciadores or (backend.db, backend.report_db):
+        if gerenciador.factory is not ConexaoMedida:
+            gerenciador.close_all()
+            gerenciador.factory = ConexaoMedida
+
+# --- LOG DE CONSULTAS LENTAS ---
+_log = logging.getLogger("bravus.lentas")
+_log.propagate = False
+
+def _abrir_log():
+    if not _log.handlers:
+        handler = logging.handlers.RotatingFileHandler(ARQUIVO_LENTAS, maxBytes=TAMANHO_LOG,
+                                                       backupCount=ARQUIVOS_LOG, encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _log.addHandler(handler)
+        _log.setLevel(logging.INFO)
+
+def _fechar_log():
+    for handler in list(_log.handlers):
+        _log.removeHandler(handler)
+        handler.close()
+
+# A consulta lenta entra numa fila; se a fila estiver cheia (muitas lentas de
+# uma vez) ela só entra na contagem de descartadas, sem travar quem consultou.
+def _enfileirar_lenta(sql, parametros, segundos, linhas, caminho):
+    global _gravador
+    item = (datetime.now().isoformat(sep=" ", timespec="milliseconds"), threading.current_thread().name,
+            sql, parametros, segundos, linhas, caminho)
+    try:
+        _fila_lentas.put_nowait(item)
+    except queue.Full:
+        with _lock:
+            _contadores["descartadas"] += 1
+        return
+    with _lock:
+        if _gravador is None:
+            _gravador = threading.Thread(target=_gravar_lentas, name="bravus-lentas", daemon=True)
+            _gravador.start()
+
+# Plano da consulta numa conexão própria (sem medição e fora de qualquer
+# transação de quem consultou), com os mesmos parâmetros.
+def _plano(conexoes, sql, parametros, caminho):
+    if not caminho or not _RE_PLANO.match(sql):
+        return []
+    try:
+        conn = conexoes.get(caminho)
+        if conn is None:
+            conn = conexoes[caminho] = sqlite3.connect(caminho, isolation_level=None)
+        linhas = conn.execute("EXPLAIN QUERY PLAN " + sql, parametros or ()).fetchall()
+        return [r[3] for r in linhas]
+    except sqlite3.Error as e:
+        return [f"(plano indisponível: {e})"]
+
+def _gravar_lentas():
+    conexoes = {}
+    while True:
+        quando, thread, sql, parametros, segundos, linhas, caminho = _fila_lentas.get()
+        plano = _plano(conexoes, sql, parametros, caminho)
+        texto = [f"[{quando}] {segundos * 1000:.1f} ms, {linhas} linha(s), thread {thread}",
+                 "  " + _RE_ESPACOS.sub(" ", sql).strip()]
+        if parametros:
+            texto.append(f"  parâmetros: {str(parametros)[:300]}")
+        texto.extend(f"  plano: {p}" for p in plano)
+        with _lock_log:
+            _abrir_log()
+            _log.info("\n".join(texto))
+        with _lock:
+            _contadores["lentas"] += 1
+
+# --- RESULTADOS ---
+ORDENS = {
+    "total": lambda f: f.total,
+    "media": lambda f: f.total / f.execucoes,
+    "maximo": lambda f: f.maximo,
+    "execucoes": lambda f: f.execucoes,
+}
+
+# As 'n' piores formas pela 'ordem' (ver ORDENS). Cada item:
+# (forma, execuções, total ms, média ms, p95 ms, máximo ms, linhas).
+def mais_lentas(n=20, ordem="total"):
+    chave = ORDENS[ordem]
+    with _lock:
+        itens = sorted(_formas.items(), key=lambda i: chave(i[1]), reverse=True)[:n]
+        return [(forma, f.execucoes, f.total * 1000, f.total / f.execucoes * 1000, f.percentil(95),
+                 f.maximo * 1000, f.linhas) for forma, f in itens]
+
+# Histograma de uma forma: [(rótulo da faixa, execuções)], só as faixas usadas.
+def histograma(forma):
+    with _lock:
+        f = _formas.get(forma)
+        faixas = list(f.faixas) if f else []
+    rotulos = [f"até {limite:g} ms" for limite in FAIXAS_MS] + [f"acima de {FAIXAS_MS[-1]:g} ms"]
+    return [(rotulos[i], n) for i, n in enumerate(faixas) if n]
+
+def situacao():
+    with _lock:
+        return {"ativo": _ativo, "formas": len(_formas), "limite_ms": LIMITE_LENTA_MS,
+                "arquivo": ARQUIVO_LENTAS, **_contadores}
+
+def zerar():
+    with _lock:
+        _formas.clear()
+        _contadores["lentas"] = _contadores["descartadas"] = 0
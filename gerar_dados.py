@@ -0,0 +1,238 @@
+# arquivo: gerar_dados.py
+# Gera um banco de dados de teste com cara de movimento real, para medir o
+# sistema com um ano (ou mais) de vendas: insumos, receitas com ficha técnica,
+# compras diárias e pedidos de balcão e de aplicativo distribuídos pelos dias
+# da semana e pelos horários de almoço e jantar.
+# Tudo é gravado pelas funções do backend (compras e pedidos em lote, um dia
+# por transação), então estoque, custos, razão e resumos ficam consistentes.
+#   python gerar_dados.py bravus_teste.db --vendas 1000000 --compras 20000 --dias 365
+#   python benchmark.py bravus_teste.db
+
+# --- IMPORTAÇÕES ---
+# random: sorteios com semente fixa (o mesmo comando gera o mesmo banco).
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+import backend
+from backend import (
+    usar_banco, init_db, add_produto, add_receita, salvar_item_receita, obter_insumo_por_nome,
+    registrar_compras_lote, registrar_pedidos_lote, Centavos, fmt_money, db,
+)
+
+# --- CARDÁPIO BASE ---
+# (nome, categoria, unidade, preço de compra por unidade em reais)
+INSUMOS_BASE = [
+    ("Pão brioche", "Padaria", "un", "1.30"),
+    ("Pão australiano", "Padaria", "un", "1.60"),
+    ("Blend bovino", "Carnes", "kg", "42.00"),
+    ("Frango empanado", "Carnes", "kg", "28.00"),
+    ("Bacon", "Carnes", "kg", "38.00"),
+    ("Queijo cheddar", "Laticínios", "kg", "45.00"),
+    ("Queijo prato", "Laticínios", "kg", "39.00"),
+    ("Alface", "Hortifruti", "un", "2.50"),
+    ("Tomate", "Hortifruti", "kg", "7.00"),
+    ("Cebola roxa", "Hortifruti", "kg", "6.00"),
+    ("Picles", "Mercearia", "kg", "25.00"),
+    ("Molho especial", "Molhos", "l", "22.00"),
+    ("Maionese", "Molhos", "l", "15.00"),
+    ("Barbecue", "Molhos", "l", "18.00"),
+    ("Batata palito congelada", "Congelados", "kg", "14.00"),
+    ("Óleo de fritura", "Mercearia", "l", "9.00"),
+    ("Refrigerante lata", "Bebidas", "un", "2.90"),
+    ("Suco natural", "Bebidas", "l", "12.00"),
+    ("Cerveja long neck", "Bebidas", "un", "5.50"),
+    ("Embalagem delivery", "Descartáveis", "un", "0.60"),
+]
+
+# (nome, preço de venda, [(insumo, quantidade, unidade da ficha)])
+RECEITAS_BASE = [
+    ("X-Bravus", "32.90", [("Pão brioche", 1, "un"), ("Blend bovino", 160, "g"), ("Queijo cheddar", 30, "g"),
+                           ("Alface", 0.1, "un"), ("Tomate", 30, "g"), ("Molho especial", 20, "ml")]),
+    ("X-Bacon", "34.90", [("Pão brioche", 1, "un"), ("Blend bovino", 160, "g"), ("Bacon", 40, "g"),
+                          ("Queijo prato", 30, "g"), ("Maionese", 15, "ml")]),
+    ("Cheddar Duplo", "39.90", [("Pão australiano", 1, "un"), ("Blend bovino", 300, "g"),
+                                ("Queijo cheddar", 60, "g"), ("Cebola roxa", 20, "g"), ("Barbecue", 20, "ml")]),
+    ("Smash Clássico", "24.90", [("Pão brioche", 1, "un"), ("Blend bovino", 90, "g"), ("Queijo prato", 20, "g"),
+                                 ("Picles", 10, "g"), ("Molho especial", 15, "ml")]),
+    ("Chicken Crispy", "29.90", [("Pão brioche", 1, "un"), ("Frango empanado", 150, "g"), ("Alface", 0.1, "un"),
+                                 ("Maionese", 20, "ml")]),
+    ("Batata Frita", "14.90", [("Batata palito congelada", 250, "g"), ("Óleo de fritura", 40, "ml")]),
+    ("Batata Cheddar e Bacon", "22.90", [("Batata palito congelada", 250, "g"), ("Óleo de fritura", 40, "ml"),
+                                         ("Queijo cheddar", 50, "g"), ("Bacon", 30, "g")]),
+    ("Refrigerante", "7.00", [("Refrigerante lata", 1, "un")]),
+    ("Suco", "9.00", [("Suco natural", 300, "ml")]),
+    ("Cerveja", "12.00", [("Cerveja long neck", 1, "un")]),
+]
+
+# Movimento por hora do dia (peso relativo) e por dia da semana (segunda = 0).
+PESO_HORA = {11: 4, 12: 9, 13: 7, 14: 3, 15: 1, 16: 1, 17: 2, 18: 5, 19: 10, 20: 13, 21: 11, 22: 7, 23: 3}
+PESO_DIA_SEMANA = [0.6, 0.7, 0.8, 0.9, 1.3, 1.5, 1.2]
+# Itens por pedido: 1 a 4 (média ~2)
+PESO_ITENS = {1: 35, 2: 35, 3: 20, 4: 10}
+# Plataformas: (origem, fração dos pedidos, taxa)
+ORIGENS = [("balcao", 0.55, 0.0), ("ifood", 0.45, 0.12)]
+
+def _sorteio(rng, pesos):
+    return rng.choices(list(pesos), weights=list(pesos.values()))[0]
+
+# --- CADASTROS ---
+# Cria os insumos e receitas (os da base e, se pedir mais, genéricos).
+# Retorna ({nome do insumo: preço em centavos}, [(receita_id, preço, peso de popularidade)]).
+def gerar_cadastros(rng, n_insumos, n_receitas):
+    insumos = list(INSUMOS_BASE[:n_insumos])
+    for i in range(len(insumos), n_insumos):
+        insumos.append((f"Insumo {i + 1}", "Diversos", rng.choice(["un", "kg", "l"]), f"{rng.uniform(1, 40):.2f}"))
+    precos = {}
+    for nome, categoria, unidade, preco in insumos:
+        add_produto(nome, categoria, unidade)
+        precos[nome] = Centavos.de_reais(preco)
+
+    nomes = [i[0] for i in insumos]
+    receitas = [r for r in RECEITAS_BASE[:n_receitas] if all(item[0] in precos for item in r[2])]
+    for i in range(len(receitas), n_receitas):
+        ficha = []
+        for nome in rng.sample(nomes, min(len(nomes), rng.randint(2, 5))):
+            unidade = obter_insumo_por_nome(nome)[3]
+            ficha.append((nome, 1, "un") if unidade == "un"
+                         else (nome, rng.randint(10, 200), "g" if unidade == "kg" else "ml"))
+        receitas.append((f"Receita {i + 1}", f"{rng.uniform(8, 45):.2f}", ficha))
+
+    cardapio = []
+    for rank, (nome, preco, ficha) in enumerate(receitas):
+        receita = add_receita(nome, Centavos.de_reais(preco))
+        for insumo, quantidade, unidade in ficha:
+            salvar_item_receita(receita[0], obter_insumo_por_nome(insumo)[0], quantidade, unidade)
+        # Popularidade cai com a posição no cardápio (poucos campeões de venda)
+        cardapio.append((receita[0], receita[2], 1 / (rank + 1) ** 0.8))
+    return precos, cardapio
+
+# Quanto de cada insumo sai por item vendido, em média (para dimensionar as compras).
+def _consumo_por_item(cardapio):
+    total_peso = sum(p for _, _, p in cardapio)
+    consumo = {}
+    for receita_id, _, peso in cardapio:
+        for nome, qtd_base in backend.get_conn().execute('''
+            SELECT i.nome, ri.qtd_base FROM receita_itens ri JOIN insumos i ON i.id = ri.insumo_id
+            WHERE ri.receita_id = ?
+        ''', (receita_id,)):
+            consumo[nome] = consumo.get(nome, 0) + qtd_base * peso / total_peso
+    return consumo
+
+# --- MOVIMENTO ---
+# Pedidos de um dia: (hora, minuto, origem, itens), com o total do dia
+# proporcional ao peso do dia da semana e a um crescimento leve ao longo do período.
+def _pedidos_do_dia(rng, dia, n_pedidos, cardapio):
+    ids = [(r, p) for r, p, _ in cardapio]
+    pesos = [w for _, _, w in cardapio]
+    inicio = int(dia.timestamp())
+    por_origem = {origem: [] for origem, _, _ in ORIGENS}
+    for _ in range(n_pedidos):
+        hora = _sorteio(rng, PESO_HORA)
+        data = inicio + hora * 3600 + rng.randrange(3600)
+        origem = rng.choices([o[0] for o in ORIGENS], weights=[o[1] for o in ORIGENS])[0]
+        itens = {}
+        for receita_id, preco in rng.choices(ids, weights=pesos, k=_sorteio(rng, PESO_ITENS)):
+            itens[receita_id] = (preco, itens.get(receita_id, (0, 0))[1] + (2 if rng.random() < 0.15 else 1))
+        por_origem[origem].append((data, [(r, q, p) for r, (p, q) in itens.items()]))
+    return por_origem
+
+def gerar(caminho, n_insumos=20, n_receitas=10, n_vendas=100_000, n_compras=5_000, dias=365, semente=42,
+          progresso=None):
+    rng = random.Random(semente)
+    usar_banco(caminho)
+    init_db()
+    precos, cardapio = gerar_cadastros(rng, n_insumos, n_receitas)
+    consumo = _consumo_por_item(cardapio)
+
+    hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    datas = [hoje - timedelta(days=dias - 1 - i) for i in range(dias)]  # o último dia é hoje
+    pesos_dia = [PESO_DIA_SEMANA[d.weekday()] * (0.9 + 0.2 * i / max(dias - 1, 1)) for i, d in enumerate(datas)]
+    soma_pesos = sum(pesos_dia)
+    media_itens = sum(k * p for k, p in PESO_ITENS.items()) / sum(PESO_ITENS.values())
+    n_pedidos = n_vendas / media_itens
+
+    # Compras: os insumos que pesam mais no custo são comprados mais vezes, e a
+    # quantidade de cada compra cobre o consumo esperado (+5%).
+    nomes_consumo = [n for n in consumo if consumo[n] > 0]
+    valor_consumo = {n: consumo[n] * precos[n] for n in nomes_consumo}
+    soma_valor = sum(valor_consumo.values()) or 1
+    pesos_compra = [valor_consumo[n] / soma_valor for n in nomes_consumo]
+
+    totais = {"pedidos": 0, "vendas": 0, "compras": 0, "faturamento": 0}
+    numero_externo = 0
+    for i, dia in enumerate(datas):
+        fator = pesos_dia[i] / soma_pesos
+        # Unidades vendidas no dia (15% das linhas saem com 2 unidades)
+        unidades_dia = n_pedidos * fator * media_itens * 1.15
+        n_compras_dia = n_compras * fator
+        compras_dia = []
+        for _ in range(int(n_compras_dia + rng.random())):
+            nome = rng.choices(nomes_consumo, weights=pesos_compra)[0]
+            vezes = max(n_compras_dia * valor_consumo[nome] / soma_valor, 1e-9)
+            quantidade = round(max(unidades_dia * consumo[nome] / vezes * 1.05 * rng.uniform(0.8, 1.2), 0.001), 3)
+            preco = max(1, round(precos[nome] * rng.uniform(0.9, 1.15)))
+            compras_dia.append((nome, quantidade, preco))
+        if compras_dia:
+            totais["compras"] += registrar_compras_lote(compras_dia, data=int(dia.timestamp()) + 8 * 3600)["compras"]
+
+        por_origem = _pedidos_do_dia(rng, dia, int(n_pedidos * fator + rng.random()), cardapio)
+        for origem, _, taxa in ORIGENS:
+            pedidos = []
+            for data, itens in sorted(por_origem[origem], key=lambda p: p[0]):
+                externo = None
+                if origem != "balcao":
+                    numero_externo += 1
+                    externo = f"{origem.upper()[:2]}{numero_externo:09d}"
+                pedidos.append((externo, data, itens))
+            _, resumo = registrar_pedidos_lote(pedidos, taxa, origem)
+            totais["pedidos"] += resumo["pedidos"]
+            totais["vendas"] += resumo["vendas"]
+            totais["faturamento"] += resumo["total"]
+        if progresso:
+            progresso(i + 1, dias, totais)
+    backend.get_conn().execute("PRAGMA optimize;")
+    return totais
+
+# --- LINHA DE COMANDO ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BRAV'US BURGUER - gera um banco de dados de teste")
+    parser.add_argument("arquivo", help="banco a criar (ex.: bravus_teste.db)")
+    parser.add_argument("--insumos", type=int, default=20)
+    parser.add_argument("--receitas", type=int, default=10)
+    parser.add_argument("--vendas", type=int, default=100_000, help="itens vendidos (linhas de vendas), aproximado")
+    parser.add_argument("--compras", type=int, default=5_000, help="linhas de compras, aproximado")
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--substituir", action="store_true", help="apaga o arquivo se ele já existir")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.arquivo):
+        if not args.substituir:
+            print(f"{args.arquivo} já existe (use --substituir para recriar).", file=sys.stderr)
+            return 2
+        for sufixo in ("", "-wal", "-shm"):
+            if os.path.exists(args.arquivo + sufixo):
+                os.remove(args.arquivo + sufixo)
+
+    inicio = time.perf_counter()
+
+    def progresso(feitos, total, totais):
+        if feitos % 30 == 0 or feitos == total:
+            print(f"  dia {feitos}/{total}: {totais['pedidos']} pedidos, {totais['vendas']} vendas, "
+                  f"{totais['compras']} compras ({time.perf_counter() - inicio:.0f} s)", flush=True)
+    try:
+        totais = gerar(args.arquivo, args.insumos, args.receitas, args.vendas, args.compras, args.dias,
+                       args.semente, progresso)
+    finally:
+        db.close_all()
+        backend.report_db.close_all()
+    print(f"Pronto: {totais['pedidos']} pedidos, {totais['vendas']} vendas, {totais['compras']} compras, "
+          f"faturamento {fmt_money(totais['faturamento'])} em {time.perf_counter() - inicio:.1f} s.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
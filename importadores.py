@@ -0,0 +1,533 @@
+# arquivo: importadores.py
+# Importação em lote para o sistema, sem interface gráfica (usa só o backend).
+# Compras: planilha (CSV) de entrega do fornecedor, com uma linha por item.
+# O arquivo é lido aos poucos, cada linha é validada e, se estiver tudo certo,
+# as compras são gravadas numa transação só (registrar_compras_lote).
+# NF-e: pasta com os XML das notas de compra, lidos com iterparse (sem montar
+# a árvore inteira); notas já importadas são puladas lendo só o começo do arquivo.
+# Pedidos: exportação dos aplicativos de delivery (CSV ou JSON). Os itens viram
+# receitas pelo nome ou pelos apelidos da plataforma, e pedidos já importados
+# (mesmo número na mesma plataforma) são pulados.
+#   python importadores.py compras-csv entrega.csv [--simular]
+#   python importadores.py nfe pasta_das_notas [--simular]
+#   python importadores.py nfe-mapear CNPJ CODIGO INSUMO_ID [--fator 12]
+#   python importadores.py pedidos pedidos.json --origem ifood --taxa 12 [--simular]
+#   python importadores.py pedidos-mapear ifood "X-Bravus Duplo" RECEITA_ID
+
+# --- IMPORTAÇÕES ---
+# sys/argparse: para a linha de comando.
+# csv: leitura das planilhas exportadas (separador ; ou , detectado sozinho).
+# time: para medir quanto a importação levou.
+# unicodedata: para comparar cabeçalhos sem acento ("Preço" == "preco").
+# os/xml.etree: para varrer a pasta de notas e ler os XML aos poucos.
+# json/datetime: exportações de pedidos em JSON e as datas dos pedidos.
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import unicodedata
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from backend import (
+    Centavos, ServiceError, InvalidData, registrar_compras_lote, fmt_money, db, init_db,
+    MICROS_POR_CENTAVO, custo_de_reais, custo_para_centavos,
+    obter_insumo_por_nome, nfe_ja_importada, mapa_produtos_nfe, mapear_produto_nfe, registrar_notas_nfe,
+    listar_receitas, mapa_aliases_receitas, mapear_alias_receita, pedidos_ja_importados,
+    registrar_pedidos_importados,
+)
+
+# --- LEITURA DE CSV ---
+# Cabeçalhos aceitos para cada campo (já sem acento e em minúsculas).
+_COLUNAS_COMPRA = {
+    "nome": ("nome", "insumo", "produto", "descricao", "item"),
+    "quantidade": ("quantidade", "qtd", "quant", "qtde"),
+    "preco": ("preco", "preco_unit", "preco unitario", "valor", "valor_unit", "valor unitario"),
+}
+
+def _normalizar(txt):
+    txt = unicodedata.normalize("NFKD", txt or "").encode("ascii", "ignore").decode()
+    return txt.strip().lower()
+
+# Quantidade no formato brasileiro ou não: "1.234,5", "1234,5", "1234.5".
+def _ler_numero(txt):
+    txt = (txt or "").strip()
+    if "," in txt:
+        txt = txt.replace(".", "").replace(",", ".")
+    return float(txt)
+
+# Posição de cada campo no cabeçalho. Campos em 'opcionais' podem faltar (None).
+def _posicoes(cabecalho, colunas, opcionais=()):
+    cabecalho = [_normalizar(c) for c in cabecalho]
+    posicoes = {}
+    for campo, nomes in colunas.items():
+        achadas = [i for i, c in enumerate(cabecalho) if c in nomes]
+        if not achadas and campo not in opcionais:
+            raise InvalidData(f"Coluna '{campo}' não encontrada no cabeçalho do CSV.")
+        posicoes[campo] = achadas[0] if achadas else None
+    return posicoes
+
+# Abre o CSV detectando o separador pela primeira parte do arquivo.
+def _abrir_csv(arquivo):
+    amostra = arquivo.read(4096)
+    arquivo.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=";,\t")
+    except csv.Error:
+        dialeto = csv.excel
+    return csv.reader(arquivo, dialeto)
+
+# Lê as compras linha a linha. Para cada linha de dados devolve
+# (nº da linha no arquivo, (nome, quantidade, preco em centavos) ou None, erro ou None).
+def ler_compras_csv(caminho):
+    with open(caminho, newline="", encoding="utf-8-sig") as arquivo:
+        leitor = _abrir_csv(arquivo)
+        posicoes = _posicoes(next(leitor, []), _COLUNAS_COMPRA)
+        for linha in leitor:
+            n = leitor.line_num
+            if not any(c.strip() for c in linha):
+                continue  # linha em branco
+            try:
+                nome = linha[posicoes["nome"]].strip()
+                quantidade = _ler_numero(linha[posicoes["quantidade"]])
+                preco = Centavos.de_reais(linha[posicoes["preco"]])
+            except (IndexError, ValueError) as exc:
+                yield n, None, f"valor inválido ({exc})"
+                continue
+            if not nome:
+                yield n, None, "sem nome do insumo"
+            elif quantidade <= 0 or preco <= 0:
+                yield n, None, "quantidade e preço devem ser maiores que zero"
+            else:
+                yield n, (nome, quantidade, preco), None
+
+# --- IMPORTAÇÃO DE COMPRAS ---
+# Importa a planilha inteira ou nada: se alguma linha tiver erro, nada é gravado
+# (para a planilha corrigida poder ser importada de novo sem duplicar compras).
+# simular=True só valida e resume. Retorna um dicionário com o resumo.
+def importar_compras_csv(caminho, simular=False):
+    inicio = time.perf_counter()
+    itens, erros = [], []
+    for n, item, erro in ler_compras_csv(caminho):
+        if erro:
+            erros.append((n, erro))
+        else:
+            itens.append(item)
+    resumo = {"arquivo": caminho, "linhas": len(itens) + len(erros), "erros": erros,
+              "gravado": False, "compras": len(itens), "insumos": len({i[0] for i in itens}),
+              "novos": None, "total": sum(round(q * p) for _, q, p in itens)}
+    if itens and not erros and not simular:
+        resumo.update(registrar_compras_lote(itens))
+        resumo["gravado"] = True
+    resumo["segundos"] = time.perf_counter() - inicio
+    return resumo
+
+# Texto do resumo, para o terminal ou uma caixa de mensagem.
+def formatar_resumo(resumo, max_erros=15):
+    linhas = [
+        f"Arquivo: {resumo['arquivo']}",
+        f"Linhas lidas: {resumo['linhas']}  |  Com erro: {len(resumo['erros'])}",
+        f"Compras: {resumo['compras']}  |  Insumos: {resumo['insumos']}"
+        + (f" ({resumo['novos']} novos)" if resumo.get("novos") is not None else ""),
+        f"Total: {fmt_money(resumo['total'])}  |  Tempo: {resumo['segundos']:.3f} s",
+    ]
+    for n, erro in resumo["erros"][:max_erros]:
+        linhas.append(f"  linha {n}: {erro}")
+    if len(resumo["erros"]) > max_erros:
+        linhas.append(f"  ... e mais {len(resumo['erros']) - max_erros} linha(s) com erro")
+    if resumo["gravado"]:
+        linhas.append("Compras gravadas.")
+    elif resumo["erros"]:
+        linhas.append("Nada foi gravado: corrija as linhas acima e importe de novo.")
+    elif not resumo["compras"]:
+        linhas.append("Nenhuma compra encontrada no arquivo.")
+    else:
+        linhas.append("Simulação: nada foi gravado.")
+    return "\n".join(linhas)
+
+# --- LEITURA DE NF-e ---
+# Nome da tag sem o namespace ("{http://www.portalfiscal.inf.br/nfe}det" -> "det").
+def _tag(el):
+    return el.tag.rsplit("}", 1)[-1]
+
+def _filho(el, nome):
+    for f in el:
+        if _tag(f) == nome:
+            return (f.text or "").strip()
+    return ""
+
+# Chave de acesso da nota, lendo só até a tag infNFe (começo do arquivo).
+def ler_chave_nfe(caminho):
+    for _, el in ET.iterparse(caminho, events=("start",)):
+        if _tag(el) == "infNFe":
+            return (el.get("Id") or "").removeprefix("NFe")
+    raise ValueError("infNFe não encontrada")
+
+# Lê a nota toda com iterparse, limpando cada item depois de usado.
+# Retorna {"chave", "cnpj", "emitente", "itens": [(codigo, descricao, unidade, qtd, valor_total)]}.
+def ler_nfe(caminho):
+    nota = {"chave": None, "cnpj": "", "emitente": "", "itens": []}
+    for evento, el in ET.iterparse(caminho, events=("start", "end")):
+        tag = _tag(el)
+        if evento == "start":
+            if tag == "infNFe":
+                nota["chave"] = (el.get("Id") or "").removeprefix("NFe")
+            continue
+        if tag == "emit":
+            nota["cnpj"] = _filho(el, "CNPJ") or _filho(el, "CPF")
+            nota["emitente"] = _filho(el, "xNome")
+        elif tag == "prod":
+            nota["itens"].append((_filho(el, "cProd"), _filho(el, "xProd"), _filho(el, "uCom"),
+                                  Decimal(_filho(el, "qCom")), Decimal(_filho(el, "vProd"))))
+        elif tag == "det":
+            el.clear()
+    if not nota["chave"]:
+        raise ValueError("infNFe não encontrada")
+    return nota
+
+# --- IMPORTAÇÃO DE NF-e ---
+# Importa as notas de uma pasta. Cada item é ligado a um insumo pelo de-para
+# (nfe_produtos); se não houver de-para mas existir um insumo com o mesmo nome
+# do produto, o de-para é criado. Nota com item sem de-para não é importada
+# (aparece em "faltando"). As demais vão todas numa transação só.
+def importar_nfe_pasta(pasta, simular=False):
+    inicio = time.perf_counter()
+    resumo = {"pasta": pasta, "arquivos": 0, "ja_importadas": 0, "notas": [], "faltando": [],
+              "erros": [], "gravado": False, "compras": 0, "insumos": 0, "novos": None, "total": 0}
+    notas, mapas, vistas = [], {}, set()
+    arquivos = sorted(e.path for e in os.scandir(pasta) if e.is_file() and e.name.lower().endswith(".xml"))
+    for caminho in arquivos:
+        resumo["arquivos"] += 1
+        try:
+            if nfe_ja_importada(ler_chave_nfe(caminho)):
+                resumo["ja_importadas"] += 1
+                continue
+            nota = ler_nfe(caminho)
+        except (ET.ParseError, ValueError, InvalidOperation) as exc:
+            resumo["erros"].append((os.path.basename(caminho), str(exc) or "XML inválido"))
+            continue
+        if nota["chave"] in vistas:
+            resumo["ja_importadas"] += 1
+            continue
+        vistas.add(nota["chave"])
+        if nota["cnpj"] not in mapas:
+            mapas[nota["cnpj"]] = mapa_produtos_nfe(nota["cnpj"])
+        mapa = mapas[nota["cnpj"]]
+        itens, faltando = [], []
+        for codigo, descricao, unidade, qtd, valor in nota["itens"]:
+            if codigo not in mapa:
+                insumo = obter_insumo_por_nome(descricao)
+                if insumo and not simular:
+                    mapear_produto_nfe(nota["cnpj"], codigo, insumo[0], 1.0, descricao)
+                    mapa[codigo] = (insumo[0], insumo[1], 1.0)
+                elif insumo:
+                    mapa[codigo] = (insumo[0], insumo[1], 1.0)
+            if codigo not in mapa:
+                faltando.append((nota["cnpj"], codigo, descricao, unidade, os.path.basename(caminho)))
+                continue
+            _, nome, fator = mapa[codigo]
+            qtd_insumo = qtd * Decimal(str(fator))
+            # Custo por unidade do insumo com todas as casas do custo médio (ex.: R$ 0,0045
+            # por grama); o preço em centavos é só o arredondado, para exibir.
+            custo = custo_de_reais(valor / qtd_insumo) if qtd_insumo > 0 else 0
+            if custo <= 0:
+                faltando.append((nota["cnpj"], codigo, f"{descricao} (sem quantidade ou valor)",
+                                 unidade, os.path.basename(caminho)))
+                continue
+            itens.append((nome, float(qtd_insumo), custo_para_centavos(custo), custo))
+        if faltando:
+            resumo["faltando"].extend(faltando)
+        elif itens:
+            notas.append((nota["chave"], os.path.basename(caminho), nota["cnpj"], itens))
+    resumo["notas"] = [n[0] for n in notas]
+    resumo["compras"] = sum(len(n[3]) for n in notas)
+    resumo["insumos"] = len({i[0] for n in notas for i in n[3]})
+    resumo["total"] = sum(round(q * c / MICROS_POR_CENTAVO) for n in notas for _, q, _, c in n[3])
+    if notas and not simular:
+        resumo["notas"], lote = registrar_notas_nfe(notas)
+        resumo.update(lote)
+        resumo["gravado"] = True
+    resumo["segundos"] = time.perf_counter() - inicio
+    return resumo
+
+def formatar_resumo_nfe(resumo, max_linhas=15):
+    linhas = [
+        f"Pasta: {resumo['pasta']}",
+        f"Arquivos: {resumo['arquivos']}  |  Já importadas: {resumo['ja_importadas']}  |  "
+        f"Notas novas: {len(resumo['notas'])}  |  Com erro: {len(resumo['erros'])}",
+        f"Compras: {resumo['compras']}  |  Insumos: {resumo['insumos']}"
+        + (f" ({resumo['novos']} novos)" if resumo.get("novos") is not None else ""),
+        f"Total: {fmt_money(resumo['total'])}  |  Tempo: {resumo['segundos']:.3f} s",
+    ]
+    for arquivo, erro in resumo["erros"][:max_linhas]:
+        linhas.append(f"  {arquivo}: {erro}")
+    if resumo["faltando"]:
+        linhas.append("Produtos sem de-para (essas notas não foram importadas):")
+        for cnpj, codigo, descricao, unidade, arquivo in resumo["faltando"][:max_linhas]:
+            linhas.append(f"  {arquivo}: CNPJ {cnpj} código {codigo} - {descricao} ({unidade})")
+        if len(resumo["faltando"]) > max_linhas:
+            linhas.append(f"  ... e mais {len(resumo['faltando']) - max_linhas}")
+        linhas.append("Ligue cada código a um insumo: python importadores.py nfe-mapear CNPJ CODIGO INSUMO_ID")
+    if resumo["gravado"]:
+        linhas.append("Compras gravadas.")
+    elif resumo["notas"]:
+        linhas.append("Simulação: nada foi gravado.")
+    return "\n".join(linhas)
+
+# --- LEITURA DE PEDIDOS (delivery) ---
+# CSV: uma linha por item, com o número do pedido repetido em cada linha.
+# JSON: lista de pedidos (ou {"pedidos": [...]}), cada um com a lista de itens.
+# Preço e data são opcionais: sem preço vale o preço da receita; sem data, agora.
+_COLUNAS_PEDIDO = {
+    "pedido": ("pedido", "n pedido", "numero pedido", "numero do pedido", "id pedido", "id do pedido",
+               "order id", "order_id"),
+    "item": ("item", "produto", "nome", "descricao"),
+    "quantidade": ("quantidade", "qtd", "quant", "qtde"),
+    "preco": ("preco", "preco_unit", "preco unitario", "valor", "valor_unit", "valor unitario"),
+    "data": ("data", "data pedido", "data do pedido", "criado em", "created_at"),
+}
+_CHAVES_JSON = dict(_COLUNAS_PEDIDO, pedido=("id", "pedido", "numero", "order_id", "orderid"),
+                    item=("nome", "item", "produto", "descricao", "name"),
+                    quantidade=("quantidade", "qtd", "quantity"),
+                    preco=("preco", "preco_unit", "valor", "valor_unit", "unit_price", "unitprice", "price"),
+                    data=("data", "criado em", "created_at", "createdat", "date"),
+                    itens=("itens", "items"), lista=("pedidos", "orders"))
+_FORMATOS_DATA = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y")
+
+# Data do pedido em epoch: ISO ("2024-05-01T20:15:00-03:00") ou dd/mm/aaaa [hh:mm[:ss]].
+def _ler_data(txt):
+    txt = (txt or "").strip()
+    if not txt:
+        return None
+    try:
+        dt = datetime.fromisoformat(txt)
+    except ValueError:
+        for fmt in _FORMATOS_DATA:
+            try:
+                dt = datetime.strptime(txt, fmt)
+                break
+            except ValueError:
+                pass
+        else:
+            raise ValueError(f"data inválida: {txt!r}")
+    return int(dt.timestamp())
+
+# Taxa digitada como na aba de vendas: "12", "12%" ou "0,12" -> 0.12.
+def ler_taxa(txt):
+    taxa = _ler_numero(str(txt).replace("%", ""))
+    return taxa / 100.0 if taxa > 1 else taxa
+
+# Valor da primeira chave encontrada no objeto JSON (chaves comparadas sem acento).
+def _valor(obj, chaves):
+    achados = {_normalizar(str(k)): v for k, v in obj.items()}
+    for chave in chaves:
+        if chave in achados:
+            return achados[chave]
+    return None
+
+# Um item lido: (nome, quantidade inteira, preço em centavos ou None). ValueError se inválido.
+def _item_pedido(nome, quantidade, preco):
+    nome = (nome or "").strip()
+    quantidade = _ler_numero(str(quantidade))
+    if not nome:
+        raise ValueError("sem nome do item")
+    if quantidade <= 0 or quantidade != int(quantidade):
+        raise ValueError("quantidade deve ser um número inteiro maior que zero")
+    preco = Centavos.de_reais(preco) if str(preco or "").strip() else None
+    if preco is not None and preco <= 0:
+        raise ValueError("preço deve ser maior que zero")
+    return nome, int(quantidade), preco
+
+# Texto de uma coluna da linha ("" se a coluna não existe ou a linha é curta).
+def _campo(linha, posicao):
+    return linha[posicao].strip() if posicao is not None and posicao < len(linha) else ""
+
+# Os dois leitores devolvem, por item: (referência para o erro, número do
+# pedido, data epoch ou None, item ou None, erro ou None).
+def ler_pedidos_csv(caminho):
+    with open(caminho, newline="", encoding="utf-8-sig") as arquivo:
+        leitor = _abrir_csv(arquivo)
+        posicoes = _posicoes(next(leitor, []), _COLUNAS_PEDIDO, opcionais=("preco", "data"))
+        for linha in leitor:
+            n = leitor.line_num
+            if not any(c.strip() for c in linha):
+                continue  # linha em branco
+            campo = {c: _campo(linha, p) for c, p in posicoes.items()}
+            externo = campo["pedido"]
+            if not externo:
+                yield f"linha {n}", None, None, None, "sem número do pedido"
+                continue
+            try:
+                item = _item_pedido(campo["item"], campo["quantidade"], campo["preco"])
+                yield f"linha {n}", externo, _ler_data(campo["data"]), item, None
+            except ValueError as exc:
+                yield f"linha {n}", externo, None, None, str(exc)
+
+def ler_pedidos_json(caminho):
+    with open(caminho, encoding="utf-8-sig") as arquivo:
+        dados = json.load(arquivo)
+    if isinstance(dados, dict):
+        dados = _valor(dados, _CHAVES_JSON["lista"]) or []
+    for i, pedido in enumerate(dados, start=1):
+        if not isinstance(pedido, dict):
+            yield f"pedido nº {i} do arquivo", None, None, None, "pedido não é um objeto JSON"
+            continue
+        externo = str(_valor(pedido, _CHAVES_JSON["pedido"]) or "").strip()
+        if not externo:
+            yield f"pedido nº {i} do arquivo", None, None, None, "sem número do pedido"
+            continue
+        try:
+            data = _ler_data(str(_valor(pedido, _CHAVES_JSON["data"]) or ""))
+            itens = _valor(pedido, _CHAVES_JSON["itens"]) or []
+        except ValueError as exc:
+            yield f"pedido {externo}", externo, None, None, str(exc)
+            continue
+        for item in itens:
+            try:
+                item = _item_pedido(_valor(item, _CHAVES_JSON["item"]), _valor(item, _CHAVES_JSON["quantidade"]),
+                                    _valor(item, _CHAVES_JSON["preco"]))
+                yield f"pedido {externo}", externo, data, item, None
+            except (ValueError, AttributeError) as exc:
+                yield f"pedido {externo}", externo, None, None, str(exc) or "item inválido"
+
+# --- IMPORTAÇÃO DE PEDIDOS ---
+# Importa os pedidos de uma plataforma ('origem', ex.: "ifood") aplicando a taxa
+# da plataforma (fração) a todas as vendas. Pedido com erro ou com item que não
+# corresponde a nenhuma receita (nem pelo nome nem por apelido) não é gravado;
+# como os já importados são pulados, o arquivo pode ser importado de novo
+# depois de corrigir. Os demais vão numa transação só.
+# simular=True só lê e resume (inclusive os itens sem receita).
+def importar_pedidos(caminho, origem, taxa=0.0, simular=False):
+    inicio = time.perf_counter()
+    origem = _normalizar(origem)
+    ler = ler_pedidos_json if caminho.lower().endswith(".json") else ler_pedidos_csv
+    pedidos, erros, com_erro = {}, [], set()
+    for ref, externo, data, item, erro in ler(caminho):
+        if erro:
+            erros.append((ref, erro))
+            com_erro.add(externo)
+            continue
+        pedido = pedidos.setdefault(externo, {"data": data, "itens": []})
+        pedido["itens"].append(item)
+
+    # Receita pelo nome ou pelo apelido na plataforma, sem acento e sem maiúsculas.
+    receitas = {r[0]: r for r in listar_receitas()}
+    por_nome = {_normalizar(r[1]): r[0] for r in receitas.values()}
+    por_nome.update({_normalizar(a): r for a, r in mapa_aliases_receitas(origem).items()})
+    ja = pedidos_ja_importados(origem, pedidos) if pedidos else set()
+    prontos, faltando, sem_receita = [], {}, 0
+    agora = int(time.time())
+    for externo, pedido in pedidos.items():
+        if externo in ja or externo in com_erro:
+            continue
+        itens = []
+        for nome, quantidade, preco in pedido["itens"]:
+            receita_id = por_nome.get(_normalizar(nome))
+            if receita_id is None:
+                faltando[nome] = faltando.get(nome, 0) + 1
+            else:
+                itens.append((receita_id, quantidade, preco if preco is not None else receitas[receita_id][2]))
+        if len(itens) < len(pedido["itens"]):
+            sem_receita += 1
+        else:
+            prontos.append((externo, pedido["data"] or agora, itens))
+
+    resumo = {"arquivo": caminho, "origem": origem, "taxa": taxa, "pedidos": len(set(pedidos) | com_erro - {None}),
+              "ja_importados": len(ja), "com_erro": len(com_erro - {None}), "sem_receita": sem_receita,
+              "importados": [p[0] for p in prontos], "vendas": sum(len(p[2]) for p in prontos),
+              "total": sum(q * p for _, _, itens in prontos for _, q, p in itens), "lucro": None,
+              "faltando": sorted(faltando.items(), key=lambda f: -f[1]), "erros": erros, "gravado": False}
+    if prontos and not simular:
+        resumo["importados"], gravado = registrar_pedidos_importados(origem, prontos, taxa)
+        resumo.update(vendas=gravado["vendas"], total=gravado["total"], lucro=gravado["lucro"], gravado=True)
+    resumo["segundos"] = time.perf_counter() - inicio
+    return resumo
+
+def formatar_resumo_pedidos(resumo, max_linhas=15):
+    linhas = [
+        f"Arquivo: {resumo['arquivo']}  |  Plataforma: {resumo['origem']}  |  Taxa: {round(resumo['taxa'] * 100, 2)}%",
+        f"Pedidos no arquivo: {resumo['pedidos']}  |  Já importados: {resumo['ja_importados']}  |  "
+        f"Com erro: {resumo['com_erro']}  |  Com item sem receita: {resumo['sem_receita']}",
+        f"Pedidos novos: {len(resumo['importados'])}  |  Vendas: {resumo['vendas']}  |  "
+        f"Total: {fmt_money(resumo['total'])}"
+        + (f"  |  Lucro líquido: {fmt_money(resumo['lucro'])}" if resumo["lucro"] is not None else ""),
+        f"Tempo: {resumo['segundos']:.3f} s",
+    ]
+    for ref, erro in resumo["erros"][:max_linhas]:
+        linhas.append(f"  {ref}: {erro}")
+    if len(resumo["erros"]) > max_linhas:
+        linhas.append(f"  ... e mais {len(resumo['erros']) - max_linhas} erro(s)")
+    if resumo["faltando"]:
+        linhas.append("Itens sem receita (esses pedidos não foram importados):")
+        for nome, vezes in resumo["faltando"][:max_linhas]:
+            linhas.append(f"  {nome} ({vezes}x)")
+        if len(resumo["faltando"]) > max_linhas:
+            linhas.append(f"  ... e mais {len(resumo['faltando']) - max_linhas}")
+        linhas.append("Ligue cada item a uma receita: python importadores.py pedidos-mapear PLATAFORMA \"ITEM\" RECEITA_ID")
+    if resumo["gravado"]:
+        linhas.append("Vendas gravadas.")
+    elif resumo["importados"]:
+        linhas.append("Simulação: nada foi gravado.")
+    else:
+        linhas.append("Nenhum pedido novo para gravar.")
+    return "\n".join(linhas)
+
+# --- LINHA DE COMANDO ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BRAV'US BURGUER - importação em lote")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("compras-csv", help="importa compras de uma planilha CSV")
+    p.add_argument("arquivo")
+    p.add_argument("--simular", action="store_true", help="só valida, sem gravar")
+    p = sub.add_parser("nfe", help="importa as NF-e (XML) de uma pasta")
+    p.add_argument("pasta")
+    p.add_argument("--simular", action="store_true", help="só lê e mostra o de-para que falta")
+    p = sub.add_parser("nfe-mapear", help="liga o código de produto de um fornecedor a um insumo")
+    p.add_argument("cnpj")
+    p.add_argument("codigo")
+    p.add_argument("insumo_id", type=int)
+    p.add_argument("--fator", type=float, default=1.0, help="unidades do insumo por unidade da nota")
+    p = sub.add_parser("pedidos", help="importa pedidos exportados de um aplicativo de delivery (CSV ou JSON)")
+    p.add_argument("arquivo")
+    p.add_argument("--origem", required=True, help="plataforma, ex.: ifood")
+    p.add_argument("--taxa", type=ler_taxa, default=0.0, help="taxa da plataforma: 12, 12%% ou 0,12")
+    p.add_argument("--simular", action="store_true", help="só lê e mostra os itens sem receita")
+    p = sub.add_parser("pedidos-mapear", help="liga o nome de um item na plataforma a uma receita")
+    p.add_argument("origem")
+    p.add_argument("item")
+    p.add_argument("receita_id", type=int)
+    args = parser.parse_args(argv)
+
+    init_db()
+    try:
+        if args.comando == "compras-csv":
+            resumo = importar_compras_csv(args.arquivo, simular=args.simular)
+            print(formatar_resumo(resumo))
+            return 1 if resumo["erros"] else 0
+        if args.comando == "nfe":
+            resumo = importar_nfe_pasta(args.pasta, simular=args.simular)
+            print(formatar_resumo_nfe(resumo))
+            return 1 if resumo["erros"] or resumo["faltando"] else 0
+        if args.comando == "nfe-mapear":
+            mapear_produto_nfe(args.cnpj, args.codigo, args.insumo_id, args.fator)
+            print("De-para gravado.")
+            return 0
+        if args.comando == "pedidos":
+            resumo = importar_pedidos(args.arquivo, args.origem, taxa=args.taxa, simular=args.simular)
+            print(formatar_resumo_pedidos(resumo))
+            return 1 if resumo["erros"] or resumo["faltando"] else 0
+        if args.comando == "pedidos-mapear":
+            mapear_alias_receita(_normalizar(args.origem), args.item.strip(), args.receita_id)
+            print("Apelido gravado.")
+            return 0
+    except ServiceError as exc:
+        print(f"Erro: {exc}", file=sys.stderr)
+        return 2
+    finally:
+        db.close_all()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+# arquivo: rastreio.py
+# Rastro das ações da tela: do clique até as linhas aparecerem. Cada ação
+# (um handler da BravusApp, ex.: "_fechar_pedido") junta as fases por onde
+# passou, em qualquer thread:
+#   espera -> tempo na fila do DbExecutor até a consulta começar
+#   db     -> a chamada ao backend (SQLite), na thread do banco
+#   format -> montar os valores das colunas (fmt_money, fmt_qty...)
+#   render -> inserir/apagar linhas no Treeview
+# A ação termina quando o handler e tudo o que ele mandou para o executor (e
+# os callbacks) terminaram. Os eventos ficam num buffer circular em memória
+# (os mais antigos saem) e podem ser exportados no formato de trace do
+# Chrome (abrir em chrome://tracing ou https://ui.perfetto.dev).
+#   with rastreio.acao("load_vendas"): ...      (ou @rastreio.rastreado("load_vendas"))
+#   with rastreio.fase("format"): ...
+#   rastreio.exportar_chrome("rastro.json")
+
+# --- IMPORTAÇÕES ---
+import os
+import json
+import time
+import itertools
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+
+# Tamanho do buffer (eventos); pode ser trocado pela variável BRAVUS_RASTROS.
+MAX_EVENTOS = int(os.environ.get("BRAVUS_RASTROS", "20000"))
+FASES = ("espera", "db", "format", "render")
+
+_ativo = True
+_inicio = time.perf_counter()
+_eventos = deque(maxlen=MAX_EVENTOS)
+_threads = {}
+_local = threading.local()
+_ids = itertools.count(1)
+_lock = threading.Lock()
+
+def ativar(ligado=True):
+    global _ativo
+    _ativo = bool(ligado)
+
+# Microssegundos desde que o módulo foi carregado (a escala do trace do Chrome).
+def _agora_us():
+    return (time.perf_counter() - _inicio) * 1_000_000
+
+def _tid():
+    t = threading.current_thread()
+    _threads.setdefault(t.ident, t.name)
+    return t.ident
+
+# Uma ação do usuário. 'pendentes' conta o próprio handler mais cada tarefa
+# que ele (ou os callbacks dele) mandou para o executor; ao zerar, a ação
+# termina e vai para o buffer com a soma do tempo de cada fase.
+class Acao:
+    def __init__(self, nome, args=None):
+        self.id = next(_ids)
+        self.nome = nome
+        self.args = args or {}
+        self.quando = time.strftime("%H:%M:%S")
+        self.inicio = _agora_us()
+        self.tid = _tid()
+        self.fases = {}
+        self.pendentes = 1
+
+    def somar(self, fase, duracao_us):
+        with _lock:
+            self.fases[fase] = self.fases.get(fase, 0.0) + duracao_us
+
+    def segurar(self):
+        with _lock:
+            self.pendentes += 1
+
+    def soltar(self):
+        with _lock:
+            self.pendentes -= 1
+            terminou = self.pendentes == 0
+        if terminou:
+            _eventos.append(("acao", self.id, self.nome, self.inicio, _agora_us(), self.tid,
+                             self.args, dict(self.fases), self.quando))
+
+def atual():
+    return getattr(_local, "acao", None) if _ativo else None
+
+# Roda o bloco como parte de 'acao' (callbacks do executor, thread do banco).
+@contextmanager
+def continuar(acao):
+    anterior = getattr(_local, "acao", None)
+    _local.acao = acao
+    try:
+        yield acao
+    finally:
+        _local.acao = anterior
+
+# Abre uma ação. Dentro de outra ação (um handler chamando outro, ex.: fechar
+# o pedido recarrega os relatórios) vira só uma fase dela.
+@contextmanager
+def acao(nome, **args):
+    if not _ativo:
+        yield None
+        return
+    pai = atual()
+    if pai is not None:
+        with fase(nome, **args):
+            yield pai
+        return
+    nova = Acao(nome, args)
+    try:
+        with continuar(nova), fase(nome, **args):
+            yield nova
+    finally:
+        nova.soltar()
+
+# Decorador para handlers: @rastreado("load_vendas").
+def rastreado(nome):
+    def decorador(fn):
+        @functools.wraps(fn)
+        def envolvido(*args, **kwargs):
+            with acao(nome):
+                return fn(*args, **kwargs)
+        return envolvido
+    return decorador
+
+# Mede um trecho. Fora de uma ação o evento também é gravado (ex.: páginas
+# carregadas pela rolagem), só não soma em ação nenhuma.
+@contextmanager
+def fase(nome, **args):
+    if not _ativo:
+        yield
+        return
+    dono = atual()
+    inicio = _agora_us()
+    try:
+        yield
+    finally:
+        duracao = _agora_us() - inicio
+        _eventos.append(("fase", dono.id if dono else None, nome, inicio, duracao, _tid(), args))
+        if dono is not None:
+            dono.somar(nome, duracao)
+
+# Embrulha uma tarefa do executor: na thread do banco ela roda como fase "db"
+# da ação que a enviou, e o tempo que passou na fila conta como "espera".
+def na_thread(acao_, fn):
+    enviado = _agora_us()
+
+    def tarefa(*args, **kwargs):
+        acao_.somar("espera", _agora_us() - enviado)
+        with continuar(acao_), fase("db", funcao=getattr(fn, "__name__", "?")):
+            return fn(*args, **kwargs)
+    return tarefa
+
+# --- CONSULTA E EXPORTAÇÃO ---
+# Últimas ações terminadas, da mais nova para a mais antiga:
+# [(nome, hora, total ms, {fase: ms})].
+def acoes_recentes(n=50):
+    acoes = [e for e in list(_eventos) if e[0] == "acao"][-n:]
+    return [(e[2], e[8], (e[4] - e[3]) / 1000, {f: us / 1000 for f, us in e[7].items()})
+            for e in reversed(acoes)]
+
+# Formato "Trace Event" do Chrome: cada ação é um par de eventos assíncronos
+# (b/e, trilha própria) e cada fase um evento completo (X) na thread onde rodou.
+def eventos_chrome():
+    pid = os.getpid()
+    trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": nome}}
+             for tid, nome in list(_threads.items())]
+    for evento in list(_eventos):
+        if evento[0] == "acao":
+            _, acao_id, nome, inicio, fim, tid, args, fases, _ = evento
+            trace.append({"name": nome, "cat": "acao", "ph": "b", "id": acao_id, "ts": inicio,
+                          "pid": pid, "tid": tid, "args": args})
+            trace.append({"name": nome, "cat": "acao", "ph": "e", "id": acao_id, "ts": fim,
+                          "pid": pid, "tid": tid, "args": {f"{f}_ms": round(us / 1000, 3) for f, us in fases.items()}})
+        else:
+            _, acao_id, nome, inicio, duracao, tid, args = evento
+            trace.append({"name": nome, "cat": nome if nome in FASES else "ui", "ph": "X", "ts": inicio,
+                          "dur": duracao, "pid": pid, "tid": tid, "args": dict(args, acao=acao_id)})
+    return trace
+
+def exportar_chrome(caminho):
+    trace = eventos_chrome()
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, arquivo, ensure_ascii=False)
+    return len(trace)
+
+def limpar():
+    _eventos.clear()
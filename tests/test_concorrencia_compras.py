@@ -0,0 +1,91 @@
+# arquivo: tests/test_concorrencia_compras.py
+# Vários terminais comprando o mesmo insumo ao mesmo tempo: cada processo chama
+# registrar_compra_db em sequência, todos largando juntos. No fim nenhuma compra
+# pode ter se perdido (nem falhado com "database is locked") e o estoque e o
+# custo médio têm que ser os mesmos de lançar as compras uma a uma, na ordem em
+# que foram gravadas.
+#   python tests/test_concorrencia_compras.py      (ou pytest tests/)
+
+# --- IMPORTAÇÕES ---
+import os
+import sys
+import sqlite3
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import backend
+
+PROCESSOS = 8
+COMPRAS_POR_PROCESSO = 50
+INSUMO = "Queijo prato"
+
+# Quantidade e preço (centavos) conhecidos para cada compra de cada processo.
+def _compra(processo, n):
+    return 0.5 + (processo * 7 + n) % 9, 1990 + 137 * ((processo * 3 + n) % 11)
+
+# Processo filho: espera a largada e registra as compras; devolve pela fila
+# quantas gravou e os erros (SQLITE_BUSY aparece como OperationalError).
+def _terminal(caminho, processo, largada, fila):
+    backend.usar_banco(caminho)
+    gravadas, erros = 0, []
+    largada.wait()
+    for n in range(COMPRAS_POR_PROCESSO):
+        try:
+            backend.registrar_compra_db(INSUMO, *_compra(processo, n))
+            gravadas += 1
+        except (sqlite3.OperationalError, backend.ServiceError) as exc:
+            erros.append(str(exc))
+    backend.db.close_all()
+    fila.put((processo, gravadas, erros))
+
+def _estado(caminho):
+    backend.usar_banco(caminho)
+    return backend.get_conn().execute(
+        "SELECT estoque_qtd, custo_medio FROM insumos WHERE nome = ?", (INSUMO,)).fetchone()
+
+def test_compras_simultaneas_mesmo_insumo():
+    pasta = tempfile.mkdtemp(prefix="bravus_concorrencia_")
+    caminho = os.path.join(pasta, "concorrente.db")
+    backend.usar_banco(caminho)
+    backend.init_db()
+    backend.db.close_all()
+
+    ctx = multiprocessing.get_context("spawn")
+    largada, fila = ctx.Event(), ctx.Queue()
+    terminais = [ctx.Process(target=_terminal, args=(caminho, p, largada, fila)) for p in range(PROCESSOS)]
+    for t in terminais:
+        t.start()
+    largada.set()
+    resultados = [fila.get(timeout=120) for _ in terminais]
+    for t in terminais:
+        t.join(timeout=30)
+        assert t.exitcode == 0, f"processo terminou com código {t.exitcode}"
+
+    erros = [e for _, _, lista in resultados for e in lista]
+    assert not erros, f"compras perdidas: {erros[:3]}"
+    assert sum(g for _, g, _ in resultados) == PROCESSOS * COMPRAS_POR_PROCESSO
+
+    backend.usar_banco(caminho)
+    compras = backend.get_conn().execute("SELECT quantidade, preco FROM compras ORDER BY id").fetchall()
+    assert len(compras) == PROCESSOS * COMPRAS_POR_PROCESSO
+    esperadas = sorted(_compra(p, n) for p in range(PROCESSOS) for n in range(COMPRAS_POR_PROCESSO))
+    assert sorted(compras) == esperadas
+    assert backend.conferir_estoque() == []
+    concorrente = _estado(caminho)
+    backend.db.close_all()
+
+    # As mesmas compras, uma a uma, na ordem em que os terminais gravaram.
+    sequencial = os.path.join(pasta, "sequencial.db")
+    backend.usar_banco(sequencial)
+    backend.init_db()
+    for quantidade, preco in compras:
+        backend.registrar_compra_db(INSUMO, quantidade, preco)
+    esperado = _estado(sequencial)
+    backend.db.close_all()
+
+    assert concorrente == esperado, f"concorrente {concorrente} != sequencial {esperado}"
+
+if __name__ == "__main__":
+    test_compras_simultaneas_mesmo_insumo()
+    print(f"OK: {PROCESSOS} processos x {COMPRAS_POR_PROCESSO} compras, sem perdas e igual ao sequencial.")
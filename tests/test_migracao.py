@@ -0,0 +1,73 @@
+# arquivo: tests/test_migracao.py
+# Banco no formato antigo (dinheiro em REAL, datas em texto) passando por todas
+# as migrações: os valores viram centavos, as datas viram epoch e as linhas
+# gravadas depois têm data, mesmo quando o INSERT não informa a data (o
+# padrão da coluna tem que ter vindo junto na troca).
+#   python tests/test_migracao.py      (ou pytest tests/)
+
+# --- IMPORTAÇÕES ---
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import backend
+
+# Esquema e dados como o crud.py original gravava.
+BANCO_ANTIGO = '''
+    CREATE TABLE insumos (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL UNIQUE, categoria TEXT,
+        unidade TEXT DEFAULT 'un', estoque_qtd REAL DEFAULT 0, custo_medio REAL DEFAULT 0);
+    CREATE TABLE receitas (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL UNIQUE,
+        preco_venda REAL NOT NULL DEFAULT 0);
+    CREATE TABLE vendas (id INTEGER PRIMARY KEY AUTOINCREMENT, receita_id INTEGER NOT NULL,
+        quantidade INTEGER NOT NULL, preco_unit REAL NOT NULL, taxa_plataforma REAL NOT NULL DEFAULT 0,
+        total_bruto REAL NOT NULL, custo_total REAL NOT NULL, lucro_liquido REAL NOT NULL,
+        data TEXT DEFAULT (datetime('now','localtime')),
+        FOREIGN KEY (receita_id) REFERENCES receitas(id) ON DELETE CASCADE);
+    CREATE TABLE compras (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL, quantidade REAL NOT NULL,
+        preco REAL NOT NULL, data TEXT DEFAULT (datetime('now','localtime')));
+    CREATE TABLE usuarios (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL UNIQUE,
+        password_hash TEXT NOT NULL);
+    INSERT INTO insumos (nome, estoque_qtd, custo_medio) VALUES ('Pão', 10, 0.5);
+    INSERT INTO receitas (nome, preco_venda) VALUES ('X-Burguer', 20.5);
+    INSERT INTO vendas (receita_id, quantidade, preco_unit, taxa_plataforma, total_bruto, custo_total,
+        lucro_liquido, data) VALUES (1, 2, 20.5, 0, 41, 1, 40, '2024-05-01 12:30:00');
+    INSERT INTO compras (nome, quantidade, preco, data) VALUES ('Pão', 10, 0.5, '2024-04-30 08:00:00');
+'''
+
+def test_migra_banco_antigo_e_grava_compra():
+    pasta = tempfile.mkdtemp(prefix="bravus_migracao_")
+    caminho = os.path.join(pasta, "antigo.db")
+    conn = sqlite3.connect(caminho)
+    conn.executescript(BANCO_ANTIGO)
+    conn.close()
+
+    backend.usar_banco(caminho)
+    try:
+        backend.init_db()
+        assert backend.schema_version() == backend.SCHEMA_VERSION
+        conn = backend.get_conn()
+        assert conn.execute("SELECT data, typeof(data), preco FROM compras").fetchone() == (
+            int(time.mktime((2024, 4, 30, 8, 0, 0, 0, 0, -1))), "integer", 50)
+        assert conn.execute("SELECT datetime(data, 'unixepoch', 'localtime'), total_bruto FROM vendas").fetchone() == (
+            "2024-05-01 12:30:00", 4100)
+
+        antes = int(time.time())
+        compra, _ = backend.registrar_compra_db("Pão", 5, 60)
+        # Um INSERT sem data (outro terminal, script antigo) usa o padrão da coluna.
+        conn.execute("INSERT INTO compras (nome, quantidade, preco) VALUES ('Pão', 1, 60)")
+        for data, tipo, texto in conn.execute("SELECT data, typeof(data), data_texto FROM compras WHERE id > 1"):
+            assert tipo == "integer" and data >= antes, (data, tipo)
+            assert texto is None
+        assert compra[4] is not None
+        assert conn.execute("SELECT COUNT(*) FROM compras_texto WHERE data IS NULL").fetchone()[0] == 0
+        assert backend.verificar_planos() == []
+    finally:
+        backend.db.close_all()
+        backend.report_db.close_all()
+
+if __name__ == "__main__":
+    test_migra_banco_antigo_e_grava_compra()
+    print("OK: banco antigo migrado e compras novas com data.")
@@ -0,0 +1,29 @@
+# arquivo: tests/test_planos.py
+# Num banco criado do zero (todas as migrações), as consultas de
+# _consultas_indexadas têm que usar os índices esperados: verificar_planos()
+# não pode apontar nenhuma falha.
+#   python tests/test_planos.py      (ou pytest tests/)
+
+# --- IMPORTAÇÕES ---
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import backend
+
+def test_planos_banco_novo():
+    pasta = tempfile.mkdtemp(prefix="bravus_planos_")
+    backend.usar_banco(os.path.join(pasta, "planos.db"))
+    try:
+        backend.init_db()
+        falhas = backend.verificar_planos()
+        assert falhas == [], "consultas sem índice: " + "; ".join(
+            f"{nome}: {' | '.join(plano)}" for nome, plano in falhas)
+    finally:
+        backend.db.close_all()
+        backend.report_db.close_all()
+
+if __name__ == "__main__":
+    test_planos_banco_novo()
+    print(f"OK: {len(backend._consultas_indexadas())} consultas usam os índices esperados.")